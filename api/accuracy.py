@@ -0,0 +1,154 @@
+import logging
+import datetime
+import numpy as np
+import pandas as pd
+import yfinance as yf
+from django.utils import timezone
+from stocks.models import Stock, StockPrediction, PredictionAccuracy
+from stocks.prices import stored_closes, trading_dates
+
+logger = logging.getLogger(__name__)
+
+# Matured predictions are matched to the last close on or before their date,
+# so weekend and holiday predictions resolve to the previous session
+MAX_CLOSE_GAP = pd.Timedelta(days=4)
+
+def fetch_closes(symbols, start, end):
+    """
+    Download daily closes for all symbols in one batched request
+
+    Dates are each symbol's exchange trading dates, as stored_closes gives
+    them, so both sources score a prediction against the same close.
+    """
+    if not symbols:
+        return pd.DataFrame(columns=['symbol', 'date', 'close'])
+
+    data = yf.download(list(symbols), start=start, end=end + datetime.timedelta(days=1),
+                       interval='1d', group_by='column', progress=False, auto_adjust=False)
+    closes = data['Close']
+    if isinstance(closes, pd.Series):
+        closes = closes.to_frame(name=list(symbols)[0])
+
+    closes = closes.stack().reset_index()
+    closes.columns = ['date', 'symbol', 'close']
+    dates = pd.to_datetime(closes['date'])
+    if dates.dt.tz is None:
+        # Naive indexes are already in exchange wall time
+        closes['date'] = dates.dt.normalize()
+    else:
+        exchanges = dict(Stock.objects.filter(symbol__in=list(symbols)).values_list('symbol', 'exchange'))
+        closes['date'] = trading_dates(dates, closes['symbol'].map(exchanges)).values
+    return closes[['symbol', 'date', 'close']]
+
+def evaluate_predictions(closes=None, window_days=30, today=None):
+    """
+    Score all matured predictions against realized closes and refresh accuracy aggregates
+
+    Pending predictions and closes are joined as arrays in a single pass; the
+    error columns are then written back with one bulk update and the rolling
+    aggregates with one bulk upsert.
+
+    Args:
+        closes: DataFrame with symbol, date and close columns. Read from the
+            stored daily PriceBar table when omitted.
+        window_days: Number of days of evaluated predictions in the rolling aggregates
+        today: Evaluation date, defaults to the current date
+
+    Returns:
+        Dictionary with the number of predictions evaluated and aggregates written
+    """
+    today = today or timezone.now().date()
+    pending = pd.DataFrame(
+        StockPrediction.objects.filter(evaluated_at__isnull=True, prediction_date__lt=today)
+        .values_list('id', 'stock__symbol', 'prediction_date', 'predicted_price'),
+        columns=['id', 'symbol', 'date', 'predicted_price']
+    )
+
+    evaluated = 0
+    if not pending.empty:
+        pending['date'] = pd.to_datetime(pending['date']).astype('datetime64[ns]')
+        pending['predicted_price'] = pending['predicted_price'].astype(float)
+
+        if closes is None:
+            closes = stored_closes(set(pending['symbol']), (pending['date'].min() - MAX_CLOSE_GAP).date(), today)
+        closes = closes.assign(date=pd.to_datetime(closes['date']).astype('datetime64[ns]')).dropna(subset=['close'])
+
+        # Only resolve a prediction once closes cover its date, otherwise an
+        # as-of join would match a stale earlier close
+        last_close_date = closes.groupby('symbol')['date'].max().rename('last_close_date')
+        pending = pending.join(last_close_date, on='symbol')
+        pending = pending[pending['date'] <= pending['last_close_date']]
+
+        matched = pd.merge_asof(
+            pending.sort_values('date'), closes.sort_values('date'),
+            on='date', by='symbol', direction='backward', tolerance=MAX_CLOSE_GAP
+        ).dropna(subset=['close'])
+
+        if not matched.empty:
+            matched['error'] = matched['predicted_price'] - matched['close']
+            matched['abs_pct_error'] = (matched['error'].abs() / matched['close'] * 100)
+            now = timezone.now()
+            StockPrediction.objects.bulk_update([
+                StockPrediction(
+                    id=row.id,
+                    realized_price=round(row.close, 2),
+                    error=round(row.error, 2),
+                    abs_pct_error=round(row.abs_pct_error, 4),
+                    evaluated_at=now
+                )
+                for row in matched.itertuples()
+            ], ['realized_price', 'error', 'abs_pct_error', 'evaluated_at'], batch_size=500)
+            evaluated = len(matched)
+
+    return {'evaluated': evaluated, 'aggregates': refresh_accuracy(window_days, today)}
+
+def refresh_accuracy(window_days=30, today=None):
+    """
+    Recompute rolling accuracy per stock and model from the evaluated predictions
+
+    Aggregates of stock/model pairs with no evaluated predictions left in the
+    window are deleted rather than kept with their old figures.
+    """
+    today = today or timezone.now().date()
+    errors = pd.DataFrame(
+        StockPrediction.objects.filter(
+            evaluated_at__isnull=False,
+            prediction_date__gte=today - datetime.timedelta(days=window_days)
+        ).values_list('stock_id', 'model_type', 'error', 'abs_pct_error'),
+        columns=['stock_id', 'model_type', 'error', 'abs_pct_error']
+    )
+    if errors.empty:
+        PredictionAccuracy.objects.all().delete()
+        return 0
+
+    errors['error'] = errors['error'].astype(float)
+    errors['abs_pct_error'] = errors['abs_pct_error'].astype(float)
+    errors['abs_error'] = errors['error'].abs()
+    errors['sq_error'] = errors['error'] ** 2
+    stats = errors.groupby(['stock_id', 'model_type']).agg(
+        sample_count=('error', 'size'),
+        mae=('abs_error', 'mean'),
+        mse=('sq_error', 'mean'),
+        mape=('abs_pct_error', 'mean'),
+    ).reset_index()
+
+    current = set(zip(stats['stock_id'], stats['model_type']))
+    stale = [pk for pk, stock_id, model_type in PredictionAccuracy.objects.values_list('pk', 'stock_id', 'model_type')
+             if (stock_id, model_type) not in current]
+    PredictionAccuracy.objects.filter(pk__in=stale).delete()
+
+    PredictionAccuracy.objects.bulk_create([
+        PredictionAccuracy(
+            stock_id=row.stock_id,
+            model_type=row.model_type,
+            window_days=window_days,
+            sample_count=row.sample_count,
+            mae=round(row.mae, 2),
+            rmse=round(float(np.sqrt(row.mse)), 2),
+            mape=round(row.mape, 4)
+        )
+        for row in stats.itertuples()
+    ], update_conflicts=True, unique_fields=['stock', 'model_type'],
+       update_fields=['window_days', 'sample_count', 'mae', 'rmse', 'mape', 'updated_at'])
+
+    return len(stats)
@@ -0,0 +1,84 @@
+import datetime
+import math
+import pandas as pd
+from django.db.models import Count, Q
+from django.utils import timezone
+from stocks.models import Stock, StockPrediction
+from stocks.prices import price_frame
+from .strategy import enhanced_pullback_strategy
+from .prediction import predict_stock_price, predict_stock_price_online
+from .pooled_prediction import predict_stock_price_pooled
+
+# Fewer stored daily bars than this and the analyses use the demo series
+MIN_STORED_BARS = 250
+
+def load_history(symbol, days=365):
+    """Daily OHLCV history for symbol from stored price bars, or a demo series if too few are stored"""
+    stock = Stock.objects.filter(symbol=symbol).first()
+    if stock:
+        df = price_frame(stock, '1d', start=timezone.now() - datetime.timedelta(days=days))
+        if len(df) >= MIN_STORED_BARS:
+            return df
+
+    # Demo data for symbols without stored history
+    end_date = datetime.datetime.now()
+    start_date = end_date - datetime.timedelta(days=days)
+
+    dates = pd.date_range(start=start_date, end=end_date, freq='D')
+    data = {
+        'open': [100 + i * 0.1 + (i % 10) for i in range(len(dates))],
+        'high': [105 + i * 0.1 + (i % 10) for i in range(len(dates))],
+        'low': [95 + i * 0.1 + (i % 10) for i in range(len(dates))],
+        'close': [102 + i * 0.1 + (i % 10) for i in range(len(dates))],
+        'volume': [1000000 + i * 1000 for i in range(len(dates))]
+    }
+    return pd.DataFrame(data, index=dates)
+
+def universe_histories(symbol, days=365):
+    """Daily history of symbol and of every other stock with enough stored bars"""
+    start = timezone.now() - datetime.timedelta(days=days)
+    histories = {symbol: load_history(symbol, days)}
+    stocks = Stock.objects.exclude(symbol=symbol).annotate(
+        stored_bars=Count('bars', filter=Q(bars__interval='1d', bars__timestamp__gte=start))
+    ).filter(stored_bars__gte=MIN_STORED_BARS)
+    for stock in stocks:
+        histories[stock.symbol] = price_frame(stock, '1d', start=start)
+    return histories
+
+def strategy_analysis(symbol, long_ma=50, short_ma=20, stop_loss_pct=0.02):
+    """Pullback strategy backtest over a year of daily history"""
+    df = load_history(symbol)
+    return enhanced_pullback_strategy(df, long_ma, short_ma, stop_loss_pct)
+
+def prediction_analysis(symbol, days_ahead=5, model_type='linear'):
+    """
+    Price predictions over a year of daily history, stored for accuracy tracking
+
+    The 'pooled' model is fit once over every stored stock and predicts
+    only the next close. Raises ValueError for unusable parameters or
+    history and Stock.DoesNotExist when symbol is not a known stock.
+    """
+    if model_type == 'pooled':
+        prediction_results = predict_stock_price_pooled(universe_histories(symbol), symbol)
+    elif model_type == 'online':
+        df = load_history(symbol)
+        prediction_results = predict_stock_price_online(df, symbol, days_ahead)
+    else:
+        df = load_history(symbol)
+        prediction_results = predict_stock_price(df, days_ahead, model_type)
+
+    # Store predictions in database
+    stock = Stock.objects.get(symbol=symbol)
+    confidence = prediction_results['model_performance'].get('confidence')
+    # A degenerate fit can report NaN or infinite confidence, which the column cannot store
+    confidence = min(max(confidence, 0), 100) if confidence is not None and math.isfinite(confidence) else 0
+    for pred in prediction_results['predictions']:
+        StockPrediction.objects.create(
+            stock=stock,
+            model_type=prediction_results.get('model_type', model_type),
+            prediction_date=pred['date'],
+            predicted_price=pred['predicted_price'],
+            confidence=confidence
+        )
+
+    return prediction_results
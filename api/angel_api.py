@@ -3,6 +3,7 @@ import pandas as pd
 import logging
 import yfinance as yf
 from datetime import datetime, timedelta
+from .upstream import call_upstream
 
 logger = logging.getLogger(__name__)
 
@@ -72,7 +73,7 @@ class AngelBrokingAPI:
                 "fromdate": from_date,
                 "todate": to_date
             }
-            history_data = self.smart_api.getCandleData(historic_param)
+            history_data = call_upstream('smartapi', self.smart_api.getCandleData, historic_param)
             if history_data and 'data' in history_data:
                 df = pd.DataFrame(history_data['data'], 
                                  columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
@@ -100,7 +101,7 @@ class AngelBrokingAPI:
                 "tradingsymbol": symbol,
                 "symboltoken": self.get_token(symbol, exchange)
             }
-            return self.smart_api.ltpData(param)
+            return call_upstream('smartapi', self.smart_api.ltpData, param)
         except Exception as e:
             logger.error(f"Error getting LTP: {str(e)}")
             return None
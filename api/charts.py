@@ -0,0 +1,117 @@
+import datetime
+from django.core.cache import cache
+from django.db.models import Subquery
+from stocks.models import PriceBar, Stock
+from stocks.prices import price_arrays
+from .columnar import SeriesFrame
+from .downsample import lttb
+from .http_cache import market_max_age
+
+# Window of each chart range and the bar intervals it can be drawn from, finest first
+CHART_RANGES = {
+    '1d': (datetime.timedelta(days=1), ['1m', '5m', '1h']),
+    '1w': (datetime.timedelta(weeks=1), ['5m', '1h', '1d']),
+    '1m': (datetime.timedelta(days=31), ['1h', '1d']),
+    '3m': (datetime.timedelta(days=92), ['1d']),
+    '1y': (datetime.timedelta(days=366), ['1d']),
+    '5y': (datetime.timedelta(days=5 * 366), ['1d', '1wk']),
+}
+DEFAULT_CHART_RANGE = '1y'
+# Target point counts are rounded down to a multiple of WIDTH_STEP so chart
+# widths map to a small set of cache entries
+DEFAULT_CHART_WIDTH = 500
+MIN_CHART_WIDTH = 50
+MAX_CHART_WIDTH = 2000
+WIDTH_STEP = 50
+
+def chart_width(value):
+    """Clamp a requested point count to the supported range; ValueError if not an integer"""
+    width = int(value) if value not in (None, '') else DEFAULT_CHART_WIDTH
+    width = min(MAX_CHART_WIDTH, max(MIN_CHART_WIDTH, width))
+    return width - width % WIDTH_STEP
+
+def bar_coverage(stock, intervals):
+    """
+    First and last timestamp of the stored bars of each interval
+
+    One query of LIMIT 1 subqueries, each a single probe at one end of the
+    (stock, interval, timestamp) index, so the cost does not grow with the
+    number of stored bars.
+    """
+    bars = PriceBar.objects.filter(stock_id=stock.pk)
+    ends = {}
+    for interval in intervals:
+        timestamps = bars.filter(interval=interval).values('timestamp')
+        ends[f'first_{interval}'] = Subquery(timestamps.order_by('timestamp')[:1])
+        ends[f'last_{interval}'] = Subquery(timestamps.order_by('-timestamp')[:1])
+    row = Stock.objects.filter(pk=stock.pk).values(**ends).first() or {}
+    return {
+        interval: {'first': row[f'first_{interval}'], 'last': row[f'last_{interval}']}
+        for interval in intervals if row.get(f'first_{interval}') is not None
+    }
+
+def choose_interval(chart_range, coverage):
+    """
+    Finest stored interval whose bars span the whole window, else the coarsest with any bars
+
+    The window ends at the interval's latest bar rather than now, so a 1d
+    chart on a weekend shows the last session.
+
+    Returns:
+        (interval, window start), or (None, None) if no bars are stored
+    """
+    span, intervals = CHART_RANGES[chart_range]
+    stored = [interval for interval in intervals if interval in coverage]
+    for interval in stored:
+        start = coverage[interval]['last'] - span
+        if coverage[interval]['first'] <= start:
+            return interval, start
+    if not stored:
+        return None, None
+    interval = stored[-1]
+    return interval, coverage[interval]['last'] - span
+
+def chart_series(stock, chart_range=DEFAULT_CHART_RANGE, width=DEFAULT_CHART_WIDTH):
+    """
+    Closes and volumes for one chart range, downsampled to at most width points
+
+    Results are cached per (symbol, range, width) together with the version
+    of the stored bars they were built from; a bar added or removed at either
+    end of an interval changes the version, and the market-hours lifetime
+    bounds staleness from other changes.
+
+    Returns:
+        Dictionary with 'interval', 'version', 'last_modified', 'source_points' and a
+        'historical_data' SeriesFrame (dates, close, volume), or None if the
+        stock has no stored bars for the range
+    """
+    coverage = bar_coverage(stock, CHART_RANGES[chart_range][1])
+    interval, start = choose_interval(chart_range, coverage)
+    if interval is None:
+        return None
+    version = '-'.join(
+        f"{name}.{int(row['first'].timestamp())}.{int(row['last'].timestamp())}" for name, row in sorted(coverage.items())
+    )
+
+    cache_key = f'chart_{stock.symbol}_{chart_range}_{width}'
+    cached = cache.get(cache_key)
+    if cached and cached['version'] == version:
+        return cached
+
+    # Exchange-local timestamps, so daily points are labelled with their trading
+    # date (as /api/stocks/<symbol>/ labels them) when SeriesFrame truncates to days
+    arrays = price_arrays(stock, interval, start=start, fields=('close', 'volume'))
+    timestamps = arrays['timestamp']
+    keep = lttb(timestamps.astype('int64'), arrays['close'], width)
+    chart = {
+        'interval': interval,
+        'version': version,
+        'last_modified': max(row['last'] for row in coverage.values()),
+        'source_points': len(timestamps),
+        'historical_data': SeriesFrame(
+            timestamps[keep], unit='D' if interval in ('1d', '1wk') else 'm',
+            close=arrays['close'][keep], volume=arrays['volume'][keep]
+        ),
+    }
+    cache.set(cache_key, chart, market_max_age(exchange=stock.exchange))
+    return chart
@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+@register(Tags.caches)
+def shared_cache_check(app_configs, **kwargs):
+    """Warn when a production deployment keeps its cache per process"""
+    backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+    if settings.DEBUG or not backend.endswith('LocMemCache'):
+        return []
+    return [Warning(
+        'The default cache is local to each process.',
+        hint='Set REDIS_URL so workers and management commands share quotes, circuit breakers, '
+             'movers and dashboard fragment generations.',
+        id='api.W001',
+    )]
@@ -0,0 +1,118 @@
+import math
+import numpy as np
+import pandas as pd
+
+EPOCH = np.datetime64('1970-01-01')
+
+class SeriesFrame:
+    """
+    Date-indexed numeric columns kept as arrays until a renderer encodes them
+
+    JSON renders the familiar {'dates': [...], column: [...]} lists with NaN as
+    null; the binary renderer sends each column as one packed buffer (see
+    to_binary). unit is the NumPy datetime resolution of the dates: 'D' for
+    daily series, 'm' for intraday ones.
+    """
+
+    def __init__(self, dates, unit='D', **columns):
+        index = pd.DatetimeIndex(dates)
+        if index.tz is not None:
+            index = index.tz_localize(None)
+        self.unit = unit
+        self.dates = index.values.astype(f'datetime64[{unit}]')
+        self.columns = {name: np.asarray(values) for name, values in columns.items()}
+
+    def __len__(self):
+        return len(self.dates)
+
+    def to_json(self):
+        data = {'dates': np.datetime_as_string(self.dates, unit=self.unit).tolist()}
+        for name, values in self.columns.items():
+            data[name] = json_column(values)
+        return data
+
+    def to_binary(self):
+        """
+        Compact encoding: epoch-offset dates and little-endian column buffers
+
+        Returns a dictionary with 'length', 'dates' ({'encoding': 'delta',
+        'unit', 'start': first date in units since the epoch, 'dtype', 'data':
+        int deltas from the previous date}) and 'columns' mapping each name to {'dtype', 'data'}. Float
+        columns are float32 (NaN preserved); integer columns use the narrowest
+        integer type that holds them.
+        """
+        offsets = (self.dates - EPOCH.astype(self.dates.dtype)).astype(np.int64)
+        deltas = np.diff(offsets, prepend=offsets[:1])
+        return {
+            'encoding': 'columnar-v1',
+            'length': len(self),
+            'dates': {
+                'encoding': 'delta',
+                'unit': self.unit,
+                'start': int(offsets[0]) if len(offsets) else 0,
+                **pack_integers(deltas),
+            },
+            'columns': {name: pack_column(values) for name, values in self.columns.items()},
+        }
+
+def json_column(values):
+    if values.dtype.kind in 'iub':
+        return values.tolist()
+    values = values.astype(np.float64)
+    missing = ~np.isfinite(values)
+    if not missing.any():
+        return values.tolist()
+    column = values.astype(object)
+    column[missing] = None
+    return column.tolist()
+
+def pack_integers(values):
+    values = values.astype(np.int64)
+    low, high = (int(values.min()), int(values.max())) if len(values) else (0, 0)
+    for dtype in ['<i1', '<i2', '<i4']:
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            break
+    else:
+        dtype = '<i8'
+    return {'dtype': dtype, 'data': values.astype(dtype).tobytes()}
+
+def pack_column(values):
+    if values.dtype.kind in 'iub':
+        return pack_integers(values)
+    values = values.astype(np.float64)
+    finite = values[np.isfinite(values)]
+    # Whole-number float columns such as volumes are sent as integers when complete
+    if len(finite) == len(values) and np.array_equal(finite, np.rint(finite)) and np.abs(finite).max(initial=0) < 2 ** 53:
+        return pack_integers(values)
+    return {'dtype': '<f4', 'data': values.astype('<f4').tobytes()}
+
+def to_json_data(data):
+    """Replace frames, NumPy values and non-finite floats with JSON-safe equivalents"""
+    if isinstance(data, SeriesFrame):
+        return data.to_json()
+    if isinstance(data, dict):
+        return {key: to_json_data(value) for key, value in data.items()}
+    if isinstance(data, (list, tuple)):
+        return [to_json_data(value) for value in data]
+    if isinstance(data, np.ndarray):
+        return json_column(data)
+    if isinstance(data, np.generic):
+        data = data.item()
+    if isinstance(data, float) and not math.isfinite(data):
+        return None
+    return data
+
+def to_binary_data(data):
+    """Replace frames with their packed encoding and NumPy scalars with Python values"""
+    if isinstance(data, SeriesFrame):
+        return data.to_binary()
+    if isinstance(data, dict):
+        return {key: to_binary_data(value) for key, value in data.items()}
+    if isinstance(data, (list, tuple)):
+        return [to_binary_data(value) for value in data]
+    if isinstance(data, np.ndarray):
+        return pack_column(data)
+    if isinstance(data, np.generic):
+        return data.item()
+    return data
@@ -0,0 +1,212 @@
+import os
+import json
+from contextlib import contextmanager
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from .prediction import FEATURES, AR_FEATURES, FEATURE_WINDOW, add_indicators, create_features
+
+try:
+    import fcntl
+except ImportError:
+    # Windows development machines: appends are not serialised between processes
+    fcntl = None
+
+STORE_COLUMNS = FEATURES + [column for column in AR_FEATURES if column not in FEATURES]
+MACD_COLUMNS = [STORE_COLUMNS.index('macd'), STORE_COLUMNS.index('signal_line')]
+
+def _ema_alpha(span):
+    return 2 / (span + 1)
+
+class StoredFeatures:
+    """Read-only, memory-mapped view of one symbol's feature store"""
+
+    def __init__(self, index, close, features, version):
+        self.index = index
+        self.close = close
+        self.features = features
+        self.version = version
+        self.columns = STORE_COLUMNS
+
+    def __len__(self):
+        return len(self.close)
+
+    @property
+    def first_valid(self):
+        """First row where every feature is populated (after the 200-bar warm-up)"""
+        valid = ~np.isnan(self.features).any(axis=1)
+        return int(valid.argmax()) if valid.any() else len(self)
+
+    def training_arrays(self, start=None, columns=None):
+        """
+        Feature and target slices for all rows with a known next close
+
+        The slices are zero-copy views unless some rows after the warm-up
+        hold non-finite values (a flat stretch leaves RSI undefined); those
+        rows are dropped, as prepare_features does, into a copy.
+
+        Args:
+            start: First row to include, defaults to the first fully valid row
+            columns: Feature columns to select, defaults to FEATURES
+        """
+        start = self.first_valid if start is None else max(start, self.first_valid)
+        X = self.features[start:len(self) - 1]
+        if columns is None:
+            # FEATURES lead the stored columns, so this stays a view
+            X = X[:, :len(FEATURES)]
+        else:
+            X = X[:, [STORE_COLUMNS.index(column) for column in columns]]
+        y = self.close[start + 1:]
+        finite = np.isfinite(X).all(axis=1) & np.isfinite(y)
+        if not finite.all():
+            X, y = X[finite], y[finite]
+        return X, y
+
+class FeatureStore:
+    """
+    Persistent per-symbol feature arrays updated incrementally as bars arrive
+
+    Each symbol directory holds append-only binary columns (timestamps, closes and
+    float32 features) plus a meta.json with the row count, a version stamp that
+    increases on every append, and the EMA state needed to extend MACD without
+    revisiting old bars. Readers bound the memory maps by the row count in the
+    metadata, which is replaced atomically after the data files are appended.
+    Appends to one symbol hold a file lock and first cut the data files back
+    to that row count, so a crashed append never misaligns later rows.
+    """
+
+    def __init__(self, root=None):
+        self._root = root
+
+    @property
+    def root(self):
+        return Path(self._root or settings.FEATURE_STORE_DIR)
+
+    def _dir(self, symbol):
+        return self.root / symbol.upper()
+
+    def _read_meta(self, symbol):
+        path = self._dir(symbol) / 'meta.json'
+        if not path.exists():
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def _write_meta(self, symbol, meta):
+        path = self._dir(symbol) / 'meta.json'
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, path)
+
+    @contextmanager
+    def _locked(self, symbol):
+        directory = self._dir(symbol)
+        directory.mkdir(parents=True, exist_ok=True)
+        with open(directory / '.lock', 'a') as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _truncate(self, symbol, rows):
+        """Drop data written past the committed row count by an append that did not finish"""
+        directory = self._dir(symbol)
+        for name, row_size in [('index.i64', 8), ('close.f64', 8), ('features.f32', 4 * len(STORE_COLUMNS))]:
+            path = directory / name
+            if path.exists() and path.stat().st_size > rows * row_size:
+                os.truncate(path, rows * row_size)
+
+    def version(self, symbol):
+        meta = self._read_meta(symbol)
+        return meta['version'] if meta else 0
+
+    def load(self, symbol):
+        meta = self._read_meta(symbol)
+        if not meta or not meta['rows']:
+            return None
+
+        directory = self._dir(symbol)
+        rows = meta['rows']
+        index = np.memmap(directory / 'index.i64', dtype=np.int64, mode='r', shape=(rows,))
+        close = np.memmap(directory / 'close.f64', dtype=np.float64, mode='r', shape=(rows,))
+        features = np.memmap(directory / 'features.f32', dtype=np.float32, mode='r',
+                             shape=(rows, len(STORE_COLUMNS)))
+        return StoredFeatures(index.view('datetime64[ns]'), close, features, meta['version'])
+
+    def append(self, symbol, history):
+        """
+        Append bars newer than the last stored one, computing features only for them
+
+        Args:
+            symbol: Stock symbol
+            history: DataFrame with a close column indexed by timestamp
+
+        Returns:
+            The store version after the append
+        """
+        with self._locked(symbol):
+            return self._append(symbol, history)
+
+    def _append(self, symbol, history):
+        meta = self._read_meta(symbol)
+        closes = history['close'].astype(float)
+        closes.index = pd.DatetimeIndex(closes.index).tz_localize(None)
+
+        if meta:
+            last_timestamp = pd.Timestamp(meta['last_timestamp'])
+            new_closes = closes[closes.index > last_timestamp]
+            if new_closes.empty:
+                return meta['version']
+            stored = self.load(symbol)
+            context = pd.Series(stored.close[-FEATURE_WINDOW:], index=stored.index[-FEATURE_WINDOW:])
+            rows, state = self._feature_rows(pd.concat([context, new_closes]), len(new_closes), meta)
+        else:
+            new_closes = closes
+            if new_closes.empty:
+                return 0
+            meta = {'version': 0, 'rows': 0, 'columns': STORE_COLUMNS}
+            rows, state = self._feature_rows(new_closes, len(new_closes), None)
+
+        directory = self._dir(symbol)
+        self._truncate(symbol, meta['rows'])
+        with open(directory / 'index.i64', 'ab') as f:
+            f.write(new_closes.index.values.astype('datetime64[ns]').astype(np.int64).tobytes())
+        with open(directory / 'close.f64', 'ab') as f:
+            f.write(new_closes.values.astype(np.float64).tobytes())
+        with open(directory / 'features.f32', 'ab') as f:
+            f.write(rows.astype(np.float32).tobytes())
+
+        meta.update(state)
+        meta['rows'] += len(new_closes)
+        meta['version'] += 1
+        meta['last_timestamp'] = new_closes.index[-1].isoformat()
+        self._write_meta(symbol, meta)
+        return meta['version']
+
+    def _feature_rows(self, closes, n_new, state):
+        frame = add_indicators(create_features(closes.to_frame(name='close'), dropna=False))
+        rows = frame[STORE_COLUMNS].iloc[-n_new:].to_numpy(dtype=np.float64)
+
+        if state is None:
+            return rows, {
+                'ema12': float(closes.ewm(span=12, adjust=False).mean().iloc[-1]),
+                'ema26': float(closes.ewm(span=26, adjust=False).mean().iloc[-1]),
+                'signal': float(frame['signal_line'].iloc[-1])
+            }
+
+        # Continue the stored EMA recursion rather than restarting it at the context window
+        ema12, ema26, signal = state['ema12'], state['ema26'], state['signal']
+        for i, close in enumerate(closes.values[-n_new:]):
+            ema12 += _ema_alpha(12) * (close - ema12)
+            ema26 += _ema_alpha(26) * (close - ema26)
+            signal += _ema_alpha(9) * ((ema12 - ema26) - signal)
+            rows[i, MACD_COLUMNS] = [ema12 - ema26, signal]
+
+        return rows, {'ema12': ema12, 'ema26': ema26, 'signal': signal}
+
+feature_store = FeatureStore()
@@ -0,0 +1,165 @@
+import time
+import logging
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from scipy.optimize import nnls
+from sklearn.ensemble import HistGradientBoostingRegressor
+from sklearn.linear_model import LinearRegression, Ridge
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import MinMaxScaler, StandardScaler
+from .prediction import FEATURES, AR_FEATURES
+
+logger = logging.getLogger(__name__)
+
+# Shared pool for training and scoring ensemble members in parallel
+executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='forecaster')
+
+class Forecaster:
+    """
+    Base class for prediction models
+
+    Models consume the shared frame built by prepare_features: they read their
+    own columns from it and predict the next day's close for every row.
+    """
+    name = 'base'
+    columns = FEATURES
+    # 'price' models regress the next close directly, 'return' models the next-day return
+    target = 'price'
+
+    def __init__(self, latency_budget=1.0):
+        # Seconds allowed for predict() before an ensemble drops this member
+        self.latency_budget = latency_budget
+        self.model = None
+
+    def build_model(self):
+        raise NotImplementedError
+
+    def fit(self, frame):
+        y = frame['target'].values
+        if self.target == 'return':
+            y = y / frame['close'].values - 1
+        self.model = self.build_model()
+        self.model.fit(frame[self.columns].values, y)
+        return self
+
+    def predict(self, frame):
+        pred = self.model.predict(frame[self.columns].values)
+        if self.target == 'return':
+            pred = frame['close'].values * (1 + pred)
+        return pred
+
+class LinearForecaster(Forecaster):
+    name = 'linear'
+
+    def build_model(self):
+        return make_pipeline(MinMaxScaler(), LinearRegression())
+
+class RidgeForecaster(Forecaster):
+    name = 'ridge'
+
+    def __init__(self, alpha=1.0, **kwargs):
+        super().__init__(**kwargs)
+        self.alpha = alpha
+
+    def build_model(self):
+        return make_pipeline(StandardScaler(), Ridge(alpha=self.alpha))
+
+class GradientBoostingForecaster(Forecaster):
+    name = 'gbm'
+    # Trees cannot extrapolate price levels, so boost on returns instead
+    target = 'return'
+
+    def __init__(self, max_iter=200, **kwargs):
+        super().__init__(**kwargs)
+        self.max_iter = max_iter
+
+    def build_model(self):
+        return HistGradientBoostingRegressor(max_iter=self.max_iter, random_state=42)
+
+class AutoRegressiveForecaster(Forecaster):
+    name = 'ar'
+    columns = AR_FEATURES
+    target = 'return'
+
+    def build_model(self):
+        return LinearRegression()
+
+class EnsembleForecaster(Forecaster):
+    """
+    Blends member forecasts with non-negative weights learned on a validation fold
+
+    Members are trained in parallel. At predict time every member runs
+    concurrently and any member that misses its latency budget is dropped, with
+    the remaining weights renormalized.
+    """
+    name = 'ensemble'
+
+    def __init__(self, members=None, validation_fraction=0.2, **kwargs):
+        super().__init__(**kwargs)
+        self.members = members if members is not None else [
+            RidgeForecaster(), GradientBoostingForecaster(), AutoRegressiveForecaster()
+        ]
+        self.validation_fraction = validation_fraction
+        self.weights = None
+
+    def _fit_members(self, frame):
+        for future in [executor.submit(member.fit, frame) for member in self.members]:
+            future.result()
+
+    def fit(self, frame):
+        # Chronological split: weights are learned on the most recent rows
+        split = int(len(frame) * (1 - self.validation_fraction))
+        train, validation = frame.iloc[:split], frame.iloc[split:]
+
+        self._fit_members(train)
+        member_predictions = np.column_stack([member.predict(validation) for member in self.members])
+        weights, _ = nnls(member_predictions, validation['target'].values)
+        if weights.sum() == 0:
+            weights = np.ones(len(self.members))
+        self.weights = weights / weights.sum()
+
+        # Refit on the full history with the learned blend
+        self._fit_members(frame)
+        return self
+
+    def predict(self, frame):
+        start = time.perf_counter()
+        futures = [executor.submit(member.predict, frame) for member in self.members]
+        blended = np.zeros(len(frame))
+        total_weight = 0.0
+
+        for member, weight, future in zip(self.members, self.weights, futures):
+            if weight == 0:
+                continue
+            remaining = member.latency_budget - (time.perf_counter() - start)
+            try:
+                prediction = future.result(timeout=max(remaining, 0))
+            except TimeoutError:
+                logger.warning(f"Dropping {member.name} from ensemble: exceeded {member.latency_budget}s budget")
+                continue
+            blended += weight * prediction
+            total_weight += weight
+
+        if total_weight == 0:
+            raise TimeoutError('No ensemble member finished within its latency budget')
+        return blended / total_weight
+
+MODEL_REGISTRY = {
+    forecaster.name: forecaster
+    for forecaster in [LinearForecaster, RidgeForecaster, GradientBoostingForecaster,
+                       AutoRegressiveForecaster, EnsembleForecaster]
+}
+
+# Model names accepted by the prediction API mapped to their CPU-friendly stand-ins
+MODEL_ALIASES = {
+    'lstm': 'gbm',
+    'arima': 'ar',
+    'prophet': 'ridge',
+}
+
+def get_forecaster(model_type, **kwargs):
+    """Instantiate the forecaster registered for model_type"""
+    name = MODEL_ALIASES.get(model_type, model_type)
+    if name not in MODEL_REGISTRY:
+        raise ValueError(f"Unknown model type: {model_type}")
+    return MODEL_REGISTRY[name](**kwargs)
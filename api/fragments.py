@@ -0,0 +1,54 @@
+import time
+from django.core.cache import cache
+from stocks.models import Portfolio, Watchlist
+
+# Lifetime of a cached dashboard panel; invalidation normally comes sooner,
+# from a generation bump
+FRAGMENT_CACHE_TIMEOUT = 5 * 60
+
+# Panels shared by every user, and panels cached per user
+SHARED_PANELS = ['news', 'movers']
+USER_PANELS = ['portfolio', 'watchlists']
+
+def generation_key(panel, user_id=None):
+    return f'fragment_gen_{panel}' if user_id is None else f'fragment_gen_{panel}_{user_id}'
+
+def panel_generations(user_id):
+    """
+    Current generation of every dashboard panel for a user, from one cache round trip
+
+    Cached fragments are keyed by these, so bumping a generation invalidates
+    the panel without deleting anything. Missing generations start from the
+    clock rather than 1, so an evicted counter never revives an old fragment.
+    """
+    keys = {panel: generation_key(panel) for panel in SHARED_PANELS}
+    keys.update({panel: generation_key(panel, user_id) for panel in USER_PANELS})
+    found = cache.get_many(keys.values())
+    generations = {}
+    for panel, key in keys.items():
+        if key not in found:
+            cache.add(key, time.time_ns(), None)
+            found[key] = cache.get(key)
+        generations[panel] = found[key]
+    return generations
+
+def bump_generations(keys):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Not cached: the next read starts a fresh generation anyway
+            pass
+
+def invalidate_shared(panel):
+    bump_generations([generation_key(panel)])
+
+def invalidate_users(panel, user_ids):
+    bump_generations([generation_key(panel, user_id) for user_id in set(user_ids)])
+
+def invalidate_quote_panels(stock_ids):
+    """Invalidate the portfolio and watchlist panels of users holding or watching the stocks"""
+    invalidate_users('portfolio', Portfolio.objects.filter(stock_id__in=stock_ids)
+                     .values_list('user_id', flat=True).distinct())
+    invalidate_users('watchlists', Watchlist.objects.filter(stocks__in=stock_ids)
+                     .values_list('user_id', flat=True).distinct())
@@ -0,0 +1,123 @@
+import datetime
+from functools import wraps
+from django.db.models import Max, Q
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from stocks.exchanges import exchange_session
+from stocks.models import Stock
+
+# While the market is open a stored quote is served for this long before
+# the upstream provider is asked again
+QUOTE_TTL_OPEN = 60
+MAX_AGE_OPEN = 15
+MAX_AGE_CLOSED = 60 * 60
+
+def market_is_open(now=None, exchange=None):
+    """Whether exchange (the default exchange if None) is in its weekday session"""
+    session = exchange_session(exchange)
+    local = (now or timezone.now()).astimezone(session['tz'])
+    return local.weekday() < 5 and session['open'] <= local.time() < session['close']
+
+def last_market_close(now=None, exchange=None):
+    """Most recent weekday close of exchange at or before now"""
+    session = exchange_session(exchange)
+    local = (now or timezone.now()).astimezone(session['tz'])
+    close = datetime.datetime.combine(local.date(), session['close'], tzinfo=session['tz'])
+    if local < close:
+        close -= datetime.timedelta(days=1)
+    while close.weekday() >= 5:
+        close -= datetime.timedelta(days=1)
+    return close
+
+def next_market_open(now=None, exchange=None):
+    session = exchange_session(exchange)
+    local = (now or timezone.now()).astimezone(session['tz'])
+    opening = datetime.datetime.combine(local.date(), session['open'], tzinfo=session['tz'])
+    if local >= opening:
+        opening += datetime.timedelta(days=1)
+    while opening.weekday() >= 5:
+        opening += datetime.timedelta(days=1)
+    return opening
+
+def market_max_age(now=None, exchange=None):
+    """Cache lifetime for quote data: short in session, until the next open (capped) otherwise"""
+    now = now or timezone.now()
+    if market_is_open(now, exchange):
+        return MAX_AGE_OPEN
+    return int(min(MAX_AGE_CLOSED, (next_market_open(now, exchange) - now).total_seconds()))
+
+def quote_is_fresh(updated_at, now=None, exchange=None):
+    """Whether a stored quote can be served without asking the upstream provider"""
+    now = now or timezone.now()
+    if market_is_open(now, exchange):
+        return (now - updated_at).total_seconds() < QUOTE_TTL_OPEN
+    return updated_at >= last_market_close(now, exchange)
+
+def stock_validator(symbol, variant=''):
+    """
+    ETag and Last-Modified for a stock's quote and history, from one indexed query
+
+    Combines the quote version (Stock.updated_at) with the latest daily bar.
+    variant distinguishes representations of the same data, e.g. the range.
+
+    Returns:
+        (etag, last_modified, updated_at, exchange), or None if the stock is not stored
+    """
+    row = (Stock.objects.filter(symbol=symbol)
+           .annotate(last_bar=Max('bars__timestamp', filter=Q(bars__interval='1d')))
+           .values_list('updated_at', 'last_bar', 'exchange').first())
+    if row is None:
+        return None
+    updated_at, last_bar, exchange = row
+    last_modified = max(filter(None, [updated_at, last_bar]))
+    bar_stamp = int(last_bar.timestamp()) if last_bar else 0
+    etag = f'"{symbol}-{int(updated_at.timestamp() * 1e6)}-{bar_stamp}{"-" + variant if variant else ""}"'
+    return etag, last_modified, updated_at, exchange
+
+def set_cache_headers(response, etag, last_modified, exchange=None):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified.timestamp())
+    # The endpoints require authentication, so only the client's own cache may
+    # keep a copy; a shared cache would serve it without checking credentials
+    max_age = market_max_age(exchange=exchange)
+    patch_cache_control(response, private=True, max_age=max_age, stale_while_revalidate=max_age)
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+def conditional_quote(variant=None):
+    """
+    Answer conditional GETs for a symbol view before doing any work
+
+    A request whose If-None-Match / If-Modified-Since matches the stored stock
+    gets a 304 while the stored quote is fresh for its exchange's session. Other
+    requests run the view, and successful responses get the validator of
+    the data as stored after the view ran, plus market-hours Cache-Control,
+    unless the view set Cache-Control itself.
+
+    Args:
+        variant: Optional function of the request returning a representation key
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, symbol, *args, **kwargs):
+            key = variant(request) if variant else ''
+            if request.method in ('GET', 'HEAD'):
+                validator = stock_validator(symbol, key)
+                if validator and quote_is_fresh(validator[2], exchange=validator[3]):
+                    etag, last_modified, _, exchange = validator
+                    not_modified = get_conditional_response(
+                        request, etag=etag, last_modified=int(last_modified.timestamp())
+                    )
+                    if not_modified is not None:
+                        return set_cache_headers(not_modified, etag, last_modified, exchange)
+
+            response = view_func(request, symbol, *args, **kwargs)
+            # Views that set their own Cache-Control keep it
+            if request.method in ('GET', 'HEAD') and response.status_code == 200 and not response.has_header('Cache-Control'):
+                validator = stock_validator(symbol, key)
+                if validator:
+                    set_cache_headers(response, validator[0], validator[1], validator[3])
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,14 @@
+"""Entry points of job pool worker processes, importable before Django is set up"""
+import django
+
+def setup():
+    django.setup()
+
+def run(job_id):
+    from django.db import close_old_connections
+    from .jobs import execute_job
+    close_old_connections()
+    try:
+        execute_job(job_id)
+    finally:
+        close_old_connections()
@@ -0,0 +1,254 @@
+import asyncio
+import datetime
+import hashlib
+import json
+import logging
+import multiprocessing
+import threading
+import time
+from functools import partial
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from stocks.models import Job
+from .analysis import prediction_analysis, strategy_analysis
+from .columnar import to_json_data
+from .live import live_setting, sse_event
+
+logger = logging.getLogger(__name__)
+
+# Defaults for settings.JOBS
+JOBS = {
+    # 'process' runs jobs in a local worker pool, 'inline' inside the submitting request
+    'MODE': 'process',
+    'WORKERS': 2,
+    # Queued or running jobs one user may own at a time
+    'MAX_ACTIVE_PER_USER': 2,
+    # Seconds after which a running job is presumed lost with its worker and requeued
+    'STALE_AFTER': 15 * 60,
+    # Seconds after which a queued job is presumed lost in dispatch and handed out again
+    'REDISPATCH_AFTER': 60,
+    # Claims by a worker before a job that keeps getting lost is failed
+    'MAX_ATTEMPTS': 3,
+    # Seconds between job status checks of a result stream
+    'STREAM_POLL': 0.5,
+}
+
+def job_setting(name):
+    return getattr(settings, 'JOBS', {}).get(name, JOBS[name])
+
+# Job kind -> function called with the job params, returning its result
+JOB_HANDLERS = {
+    'strategy': strategy_analysis,
+    'prediction': prediction_analysis,
+}
+
+class JobLimitExceeded(Exception):
+    """The user already has the maximum number of active jobs"""
+
+def params_hash(kind, params):
+    """Deduplication key of a job: identical requests hash alike regardless of key order"""
+    return hashlib.sha256(json.dumps([kind, params], sort_keys=True).encode('utf-8')).hexdigest()
+
+def job_state(job):
+    return {
+        'job_id': str(job.id),
+        'kind': job.kind,
+        'params': job.params,
+        'status': job.status,
+        'result': job.result,
+        'error': job.error or None,
+        'created_at': job.created_at.isoformat(),
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+def active_job(kind, key):
+    return Job.objects.filter(kind=kind, params_hash=key, status__in=Job.ACTIVE_STATUSES).first()
+
+def submit_job(user, kind, params, start=True):
+    """
+    Queue a job, or join the identical one already queued or running
+
+    A joined job is shared with whoever submitted it and does not count
+    towards the user's limit. The limit check and insert are not one
+    transaction, so concurrent submissions may briefly exceed it by one.
+    Lost jobs that would block the deduplication slot or the user's limit
+    are recovered first. With start=False the new job is left for the
+    caller to run with execute_job.
+
+    Returns:
+        (job, created)
+    """
+    key = params_hash(kind, params)
+    recover_stale_jobs(Job.objects.filter(Q(kind=kind, params_hash=key) | Q(user=user)))
+    job = active_job(kind, key)
+    if job is not None:
+        return job, False
+
+    limit = job_setting('MAX_ACTIVE_PER_USER')
+    if Job.objects.filter(user=user, status__in=Job.ACTIVE_STATUSES).count() >= limit:
+        raise JobLimitExceeded(f'At most {limit} jobs may be queued or running at once')
+
+    try:
+        with transaction.atomic():
+            job = Job.objects.create(user=user, kind=kind, params=params, params_hash=key)
+    except IntegrityError:
+        # The same job was submitted concurrently
+        job = active_job(kind, key)
+        if job is None:
+            raise
+        return job, False
+
+    if start:
+        dispatch(job.id)
+    return job, True
+
+def execute_job(job_id, reraise=False):
+    """
+    Run a queued job, store its result or error and return the result
+
+    The job is claimed with a conditional update, so a job picked up twice
+    (by the pool and the run_jobs command, say) still runs once; the second
+    call returns None. With reraise the error of a failed job propagates
+    after it is stored.
+    """
+    claimed = Job.objects.filter(pk=job_id, status='queued').update(
+        status='running', started_at=timezone.now(), attempts=F('attempts') + 1
+    )
+    if not claimed:
+        return None
+    job = Job.objects.get(pk=job_id)
+    try:
+        result = JOB_HANDLERS[job.kind](**job.params)
+    except Exception as e:
+        logger.error(f"Job {job_id} ({job.kind}) failed: {str(e)}")
+        Job.objects.filter(pk=job_id).update(status='failed', error=str(e) or type(e).__name__,
+                                             finished_at=timezone.now())
+        if reraise:
+            raise
+        return None
+    Job.objects.filter(pk=job_id).update(status='succeeded', result=to_json_data(result), finished_at=timezone.now())
+    return result
+
+def recover_jobs(lost, redispatch=True):
+    """
+    Queue lost jobs again, or fail those a worker already claimed MAX_ATTEMPTS times
+
+    Returns:
+        (failed count, ids of the requeued jobs)
+    """
+    now = timezone.now()
+    max_attempts = job_setting('MAX_ATTEMPTS')
+    lost = lost.filter(status__in=Job.ACTIVE_STATUSES)
+    failed = lost.filter(attempts__gte=max_attempts).update(
+        status='failed', error=f'Lost by its worker {max_attempts} times', finished_at=now
+    )
+    requeued = list(lost.filter(attempts__lt=max_attempts).values_list('id', flat=True))
+    if requeued:
+        Job.objects.filter(pk__in=requeued, status__in=Job.ACTIVE_STATUSES).update(
+            status='queued', started_at=None, dispatched_at=now
+        )
+        logger.warning(f"Requeued {len(requeued)} lost jobs")
+    if redispatch:
+        for job_id in requeued:
+            dispatch(job_id)
+    return failed, requeued
+
+def recover_stale_jobs(jobs=None, redispatch=True):
+    """
+    Recover jobs running for longer than STALE_AFTER, presumably lost with
+    their worker, and jobs queued REDISPATCH_AFTER ago that no worker claimed
+    """
+    now = timezone.now()
+    jobs = Job.objects.all() if jobs is None else jobs
+    return recover_jobs(jobs.filter(
+        Q(status='running', started_at__lt=now - datetime.timedelta(seconds=job_setting('STALE_AFTER')))
+        | Q(status='queued', dispatched_at__lt=now - datetime.timedelta(seconds=job_setting('REDISPATCH_AFTER')))
+    ), redispatch)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def job_executor():
+    """
+    The process pool running jobs for this web process, started on first use
+
+    Workers are spawned rather than forked so they do not inherit the
+    parent's threads and open database connections.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # The worker entry points live in a module importable before django.setup()
+            from . import job_worker
+            _executor = ProcessPoolExecutor(max_workers=job_setting('WORKERS'),
+                                            mp_context=multiprocessing.get_context('spawn'),
+                                            initializer=job_worker.setup)
+        return _executor
+
+def reset_executor():
+    """Drop a broken pool; the next dispatch starts a new one"""
+    global _executor
+    with _executor_lock:
+        _executor = None
+
+def pool_finished(job_id, future):
+    error = future.exception()
+    if error is None:
+        return
+    logger.error(f"Job worker failed on job {job_id}: {str(error)}")
+    if isinstance(error, BrokenExecutor):
+        reset_executor()
+    # A claimed job died with its worker: retry it now rather than once it looks
+    # stale. Unclaimed jobs wait for REDISPATCH_AFTER, so a pool that cannot
+    # start is not respawned in a loop. Runs on a pool thread.
+    try:
+        recover_jobs(Job.objects.filter(pk=job_id, status='running'))
+    finally:
+        close_old_connections()
+
+def dispatch(job_id):
+    """Start a queued job: inline, or in the pool once the submitting transaction commits"""
+    if job_setting('MODE') == 'inline':
+        execute_job(job_id)
+        return
+    from . import job_worker
+
+    def submit():
+        try:
+            job_executor().submit(job_worker.run, str(job_id)).add_done_callback(partial(pool_finished, job_id))
+        except RuntimeError as e:
+            # A broken or shut down pool; the job is redispatched once it looks lost
+            logger.error(f"Could not dispatch job {job_id}: {str(e)}")
+            reset_executor()
+    transaction.on_commit(submit)
+
+async def job_events(job_id, poll=None, heartbeat=None):
+    """
+    Server-sent event stream of a job
+
+    Sends a 'job' event with the job state whenever its status changes, the
+    last one carrying the result or error, and keepalive comments while it
+    waits. Job status is read from the database, so jobs finished by any
+    worker process are seen.
+    """
+    poll = job_setting('STREAM_POLL') if poll is None else poll
+    heartbeat = live_setting('HEARTBEAT') if heartbeat is None else heartbeat
+    yield 'retry: 5000\n\n'
+    status = None
+    last_sent = time.monotonic()
+    while True:
+        job = await Job.objects.aget(pk=job_id)
+        if job.status != status:
+            status = job.status
+            last_sent = time.monotonic()
+            yield sse_event('job', job_state(job))
+            if status not in Job.ACTIVE_STATUSES:
+                return
+        elif time.monotonic() - last_sent >= heartbeat:
+            last_sent = time.monotonic()
+            yield ': keepalive\n\n'
+        await asyncio.sleep(poll)
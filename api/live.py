@@ -0,0 +1,186 @@
+import asyncio
+import json
+import logging
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+from stocks.models import Stock
+
+logger = logging.getLogger(__name__)
+
+# Defaults for settings.LIVE_QUOTES
+LIVE_QUOTES = {
+    # Seconds between two batches sent to one client; updates in between are coalesced
+    'MIN_INTERVAL': 1.0,
+    # Seconds between checks for quotes written by other processes
+    'POLL_INTERVAL': 2.0,
+    # Seconds of silence before a keepalive comment is sent
+    'HEARTBEAT': 15.0,
+}
+
+def live_setting(name):
+    return getattr(settings, 'LIVE_QUOTES', {}).get(name, LIVE_QUOTES[name])
+
+def quote_payload(symbol, price, change, change_percent, updated_at):
+    as_float = lambda value: float(value) if value is not None else None
+    return {
+        'symbol': symbol,
+        'price': as_float(price),
+        'change': as_float(change),
+        'change_percent': as_float(change_percent),
+        'updated_at': updated_at.timestamp(),
+    }
+
+def stock_payload(stock):
+    return quote_payload(stock.symbol, stock.current_price, stock.change, stock.change_percent, stock.updated_at)
+
+def sse_event(event, data):
+    return f'event: {event}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'
+
+class Subscription:
+    """
+    One client's symbols and the updates waiting to be sent to it
+
+    Only the newest quote per symbol is kept, so a client that is sent at most
+    one batch per min_interval never falls behind a fast-moving symbol.
+    Lives on its event loop; other threads reach it through the broadcaster.
+    """
+
+    def __init__(self, symbols, min_interval):
+        self.symbols = frozenset(symbols)
+        self.min_interval = min_interval
+        self.pending = {}
+        self.sent = {}
+        self.ready = asyncio.Event()
+        self.last_batch = 0.0
+
+    def offer(self, quote):
+        symbol = quote['symbol']
+        if quote['updated_at'] <= self.sent.get(symbol, 0):
+            return
+        self.pending[symbol] = quote
+        self.ready.set()
+
+    async def next_batch(self, timeout):
+        """Pending quotes once the rate limit allows, or [] if none arrive within timeout"""
+        delay = self.last_batch + self.min_interval - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        self.ready.clear()
+        batch, self.pending = list(self.pending.values()), {}
+        self.sent.update((quote['symbol'], quote['updated_at']) for quote in batch)
+        self.last_batch = time.monotonic()
+        return batch
+
+class QuoteBroadcaster:
+    """
+    In-process fan-out of quote updates to subscribed clients
+
+    Each update is published once and handed to the subscribers of its
+    symbol on their event loop. Quotes saved in this process arrive through
+    the Stock signals; one poller task per loop picks up quotes written by
+    other processes with a single query for all subscribed symbols.
+    """
+
+    def __init__(self):
+        # loop -> symbol -> set of subscriptions on that loop
+        self.loops = {}
+        self.pollers = {}
+
+    def subscribe(self, symbols, min_interval=None):
+        loop = asyncio.get_running_loop()
+        # Forget subscriptions left behind by event loops that have since closed
+        for closed in [other for other in list(self.loops) if other.is_closed()]:
+            self.loops.pop(closed, None)
+            self.pollers.pop(closed, None)
+        subscription = Subscription(symbols, live_setting('MIN_INTERVAL') if min_interval is None else min_interval)
+        by_symbol = self.loops.setdefault(loop, {})
+        for symbol in subscription.symbols:
+            by_symbol.setdefault(symbol, set()).add(subscription)
+        if loop not in self.pollers:
+            self.pollers[loop] = loop.create_task(self.poll(loop))
+        return subscription
+
+    def unsubscribe(self, subscription):
+        loop = asyncio.get_running_loop()
+        by_symbol = self.loops.get(loop, {})
+        for symbol in subscription.symbols:
+            subscribers = by_symbol.get(symbol)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del by_symbol[symbol]
+        if not by_symbol:
+            self.loops.pop(loop, None)
+            poller = self.pollers.pop(loop, None)
+            if poller is not None:
+                poller.cancel()
+
+    def subscribers(self):
+        return sum(len(set().union(*by_symbol.values()))
+                   for loop, by_symbol in list(self.loops.items()) if by_symbol and not loop.is_closed())
+
+    def publish(self, quote):
+        """Deliver a quote to its symbol's subscribers; callable from any thread"""
+        try:
+            current = asyncio.get_running_loop()
+        except RuntimeError:
+            current = None
+        for loop, by_symbol in list(self.loops.items()):
+            if quote['symbol'] not in by_symbol:
+                continue
+            if loop is current:
+                self.deliver(loop, quote)
+            elif not loop.is_closed():
+                loop.call_soon_threadsafe(self.deliver, loop, quote)
+
+    def deliver(self, loop, quote):
+        for subscription in list(self.loops.get(loop, {}).get(quote['symbol'], ())):
+            subscription.offer(quote)
+
+    async def poll(self, loop):
+        since = timezone.now()
+        while True:
+            await asyncio.sleep(live_setting('POLL_INTERVAL'))
+            symbols = list(self.loops.get(loop, {}))
+            if not symbols:
+                continue
+            try:
+                rows = await sync_to_async(list)(
+                    Stock.objects.filter(symbol__in=symbols, updated_at__gt=since)
+                    .values_list('symbol', 'current_price', 'change', 'change_percent', 'updated_at')
+                )
+            except Exception as e:
+                logger.error(f"Error polling live quotes: {str(e)}")
+                continue
+            for row in rows:
+                since = max(since, row[-1])
+                self.deliver(loop, quote_payload(*row))
+
+broadcaster = QuoteBroadcaster()
+
+async def quote_events(symbols, initial=(), heartbeat=None):
+    """
+    Server-sent event stream of quote batches for symbols
+
+    Starts with the stored quotes in initial, then sends one 'quotes' event
+    per coalesced batch and a keepalive comment after heartbeat seconds
+    without updates. The subscription ends when the client disconnects.
+    """
+    heartbeat = live_setting('HEARTBEAT') if heartbeat is None else heartbeat
+    subscription = broadcaster.subscribe(symbols)
+    try:
+        yield 'retry: 5000\n\n'
+        if initial:
+            subscription.sent.update((quote['symbol'], quote['updated_at']) for quote in initial)
+            yield sse_event('quotes', list(initial))
+        while True:
+            batch = await subscription.next_batch(heartbeat)
+            yield sse_event('quotes', batch) if batch else ': keepalive\n\n'
+    finally:
+        broadcaster.unsubscribe(subscription)
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from api.retention import run_retention
+
+class Command(BaseCommand):
+    help = 'Roll up old bars and predictions, then archive and delete rows past their retention period'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pause', type=float, default=0,
+                            help='Seconds to sleep between delete batches')
+
+    def handle(self, *args, **options):
+        for report in run_retention(pause=options['pause']):
+            self.stdout.write(str(report))
@@ -0,0 +1,47 @@
+import time
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand
+from sklearn.linear_model import LinearRegression
+from api.prediction import FEATURES, prepare_features
+from api.pooled_prediction import PooledLinearModel, build_pooled_design
+
+class Command(BaseCommand):
+    help = 'Benchmark the pooled universe model against one LinearRegression fit per symbol'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--symbols', type=int, default=500)
+        parser.add_argument('--bars', type=int, default=500)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        dates = pd.date_range(end=pd.Timestamp.today().normalize(), periods=options['bars'], freq='D')
+        histories = {
+            f'SYM{i}': pd.DataFrame(
+                {'close': 100 * np.exp(np.cumsum(rng.normal(0, 0.02, options['bars'])))},
+                index=dates
+            )
+            for i in range(options['symbols'])
+        }
+
+        start = time.perf_counter()
+        frames = {symbol: prepare_features(df) for symbol, df in histories.items()}
+        features_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for df in frames.values():
+            LinearRegression().fit(df[FEATURES].values, df['target'].values)
+        per_symbol_time = time.perf_counter() - start
+
+        design = build_pooled_design(histories)
+        start = time.perf_counter()
+        model = PooledLinearModel(per_symbol_intercepts=True).fit(design['X'], design['y'], design['groups'])
+        model.predict(design['latest_X'], np.arange(len(design['symbols'])))
+        pooled_time = time.perf_counter() - start
+
+        self.stdout.write(f"Universe: {options['symbols']} symbols x {options['bars']} bars")
+        self.stdout.write(f"Feature building (shared): {features_time:.3f}s")
+        self.stdout.write(f"Per-symbol LinearRegression fits: {per_symbol_time:.3f}s")
+        self.stdout.write(f"Pooled fit + universe inference: {pooled_time:.3f}s")
+        self.stdout.write(f"Speedup: {per_symbol_time / pooled_time:.1f}x")
@@ -0,0 +1,98 @@
+import time
+import random
+import threading
+import numpy as np
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import connection, OperationalError
+from stocks.models import Stock
+
+BENCH_PREFIX = 'BENCH'
+
+class Command(BaseCommand):
+    help = 'Measure read/write throughput of the configured database under concurrent quote-refresh load'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--duration', type=float, default=5.0, help='Seconds to run')
+        parser.add_argument('--write-ratio', type=float, default=0.2,
+                            help='Fraction of operations that update a quote')
+        parser.add_argument('--stocks', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        symbols = [f'{BENCH_PREFIX}{i:04d}' for i in range(options['stocks'])]
+        Stock.objects.bulk_create(
+            [Stock(symbol=symbol, name=f'Benchmark {symbol}', current_price=Decimal('100.00')) for symbol in symbols],
+            ignore_conflicts=True
+        )
+
+        self.describe_connection()
+        results = []
+        deadline = time.perf_counter() + options['duration']
+        threads = [
+            threading.Thread(target=self.worker, args=(
+                symbols, deadline, options['write_ratio'], random.Random(options['seed'] + i), results
+            ))
+            for i in range(options['threads'])
+        ]
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            Stock.objects.filter(symbol__startswith=BENCH_PREFIX).delete()
+
+        self.report(results, options['duration'])
+
+    def describe_connection(self):
+        settings_dict = connection.settings_dict
+        self.stdout.write(f"Backend: {connection.vendor}, CONN_MAX_AGE={settings_dict['CONN_MAX_AGE']}, "
+                          f"health checks={settings_dict['CONN_HEALTH_CHECKS']}")
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                pragmas = {}
+                for pragma in ['journal_mode', 'synchronous', 'mmap_size', 'busy_timeout']:
+                    cursor.execute(f'PRAGMA {pragma}')
+                    pragmas[pragma] = cursor.fetchone()[0]
+            self.stdout.write('SQLite: ' + ', '.join(f'{key}={value}' for key, value in pragmas.items()))
+
+    def worker(self, symbols, deadline, write_ratio, rng, results):
+        # Each thread gets its own connection, closed when the thread is done
+        samples = {'read': [], 'write': [], 'errors': 0}
+        try:
+            while time.perf_counter() < deadline:
+                symbol = rng.choice(symbols)
+                is_write = rng.random() < write_ratio
+                start = time.perf_counter()
+                try:
+                    if is_write:
+                        price = Decimal(f'{rng.uniform(50, 150):.2f}')
+                        Stock.objects.filter(symbol=symbol).update(
+                            current_price=price, change=price - 100, change_percent=price - 100
+                        )
+                    else:
+                        Stock.objects.get(symbol=symbol)
+                        list(Stock.objects.filter(symbol__startswith=BENCH_PREFIX)
+                             .order_by('-change_percent').values_list('symbol', 'change_percent')[:10])
+                except OperationalError:
+                    samples['errors'] += 1
+                    continue
+                samples['write' if is_write else 'read'].append(time.perf_counter() - start)
+        finally:
+            connection.close()
+            results.append(samples)
+
+    def report(self, results, duration):
+        errors = sum(samples['errors'] for samples in results)
+        for kind in ['read', 'write']:
+            latencies = np.array([latency for samples in results for latency in samples[kind]]) * 1000
+            if not len(latencies):
+                self.stdout.write(f"{kind.title()}s: none completed")
+                continue
+            self.stdout.write(
+                f"{kind.title()}s: {len(latencies) / duration:.0f} ops/s, "
+                f"p50 {np.percentile(latencies, 50):.2f}ms, p99 {np.percentile(latencies, 99):.2f}ms"
+            )
+        self.stdout.write(f"Errors (locked/busy): {errors}")
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+import datetime
+from django.utils import timezone
+from stocks.models import StockPrediction
+from api.accuracy import evaluate_predictions, fetch_closes
+
+class Command(BaseCommand):
+    help = 'Score matured predictions against realized closes and refresh rolling accuracy'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--window-days', type=int, default=30)
+        parser.add_argument('--fetch', action='store_true',
+                            help='Download closes from Yahoo Finance instead of using stored price bars')
+
+    def handle(self, *args, **options):
+        closes = None
+        if options['fetch']:
+            pending = StockPrediction.objects.filter(evaluated_at__isnull=True)
+            symbols = set(pending.values_list('stock__symbol', flat=True))
+            first_date = pending.order_by('prediction_date').values_list('prediction_date', flat=True).first()
+            if first_date:
+                closes = fetch_closes(symbols, first_date - datetime.timedelta(days=7), timezone.now().date())
+
+        result = evaluate_predictions(closes, window_days=options['window_days'])
+        self.stdout.write(f"Evaluated {result['evaluated']} predictions, "
+                          f"refreshed {result['aggregates']} accuracy aggregates")
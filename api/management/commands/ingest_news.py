@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from stocks.models import Stock
+from api.news import ingest_news
+
+class Command(BaseCommand):
+    help = 'Fetch news for tracked stocks in batched NewsAPI queries and store new articles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--symbols', nargs='*',
+                            help='Symbols to fetch news for (defaults to stocks in watchlists or portfolios)')
+
+    def handle(self, *args, **options):
+        stocks = None
+        if options['symbols']:
+            stocks = Stock.objects.filter(symbol__in=[symbol.upper() for symbol in options['symbols']])
+
+        result = ingest_news(stocks)
+        self.stdout.write(f"Made {result['requests']} requests, fetched {result['fetched']} articles, "
+                          f"stored {result['stored']} new articles")
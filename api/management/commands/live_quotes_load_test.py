@@ -0,0 +1,126 @@
+import asyncio
+import json
+import random
+import time
+from decimal import Decimal
+from urllib.parse import urlsplit
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from stocks.models import Stock
+from api.live import broadcaster, quote_events, quote_payload
+
+class Command(BaseCommand):
+    help = ('Open many concurrent live quote subscriptions, publish quote updates and report '
+            'delivery, coalescing and latency')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=2000)
+        parser.add_argument('--symbols', default='AAPL,MSFT,GOOGL,AMZN,TSLA',
+                            help='Comma-separated symbols; each client subscribes to all of them')
+        parser.add_argument('--rate', type=float, default=20.0, help='Quote updates published per second')
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds to publish for')
+        parser.add_argument('--url', help='Stream URL of a running ASGI server, e.g. '
+                                          'http://localhost:8000/api/quotes/stream/; '
+                                          'without it the clients subscribe in this process')
+        parser.add_argument('--cookie', default='', help='Cookie header for --url, e.g. sessionid=...')
+
+    def handle(self, *args, **options):
+        asyncio.run(self.run(options))
+
+    async def run(self, options):
+        symbols = [symbol.strip().upper() for symbol in options['symbols'].split(',') if symbol.strip()]
+        stats = {'connected': 0, 'failed': 0, 'events': 0, 'quotes': 0, 'latencies': []}
+        stop = asyncio.Event()
+        if options['url']:
+            client = lambda: self.http_client(options['url'], options['cookie'], symbols, stats, stop)
+        else:
+            client = lambda: self.local_client(symbols, stats, stop)
+        clients = [asyncio.create_task(client()) for _ in range(options['connections'])]
+
+        # Let the clients connect before publishing
+        await asyncio.sleep(1)
+        published = await self.publish(symbols, options, bool(options['url']))
+        await asyncio.sleep(2)
+        stop.set()
+        for task in clients:
+            task.cancel()
+        await asyncio.gather(*clients, return_exceptions=True)
+        self.report(stats, published, options)
+
+    async def publish(self, symbols, options, to_database):
+        """Publish updates round-robin over symbols; through the database when a server is under test"""
+        rng = random.Random(42)
+        interval = 1 / options['rate']
+        published = 0
+        deadline = time.perf_counter() + options['duration']
+        while time.perf_counter() < deadline:
+            symbol = symbols[published % len(symbols)]
+            price = round(rng.uniform(50, 150), 2)
+            if to_database:
+                await sync_to_async(Stock.objects.filter(symbol=symbol).update)(
+                    current_price=Decimal(str(price)), updated_at=timezone.now()
+                )
+            else:
+                broadcaster.publish(quote_payload(symbol, price, price - 100, price - 100, timezone.now()))
+            published += 1
+            await asyncio.sleep(interval)
+        return published
+
+    def record(self, line, stats):
+        if not line.startswith('data:'):
+            return
+        received = time.time()
+        quotes = json.loads(line[5:])
+        stats['events'] += 1
+        stats['quotes'] += len(quotes)
+        stats['latencies'].extend(received - quote['updated_at'] for quote in quotes)
+
+    async def local_client(self, symbols, stats, stop):
+        stats['connected'] += 1
+        async for chunk in quote_events(symbols):
+            for line in chunk.splitlines():
+                self.record(line, stats)
+
+    async def http_client(self, url, cookie, symbols, stats, stop):
+        parts = urlsplit(url)
+        path = f"{parts.path}?symbols={','.join(symbols)}"
+        try:
+            reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+            writer.write((f'GET {path} HTTP/1.1\r\nHost: {parts.netloc}\r\n'
+                          f'Accept: text/event-stream\r\nCookie: {cookie}\r\n\r\n').encode())
+            await writer.drain()
+            status_line = await reader.readline()
+            if b' 200 ' not in status_line:
+                raise ConnectionError(status_line.decode(errors='replace').strip())
+        except (OSError, ConnectionError) as e:
+            if stats['failed'] == 0:
+                self.stderr.write(f"Connection failed: {e}")
+            stats['failed'] += 1
+            return
+
+        stats['connected'] += 1
+        try:
+            while not stop.is_set():
+                line = await reader.readline()
+                if not line:
+                    break
+                self.record(line.decode().strip(), stats)
+        finally:
+            writer.close()
+
+    def report(self, stats, published, options):
+        self.stdout.write(f"Connections: {stats['connected']} open, {stats['failed']} failed")
+        self.stdout.write(f"Published: {published} updates ({published / options['duration']:.1f}/s)")
+        if not stats['connected']:
+            return
+        per_client = stats['quotes'] / stats['connected']
+        self.stdout.write(f"Delivered: {stats['events']} events, {stats['quotes']} quotes, "
+                          f"{per_client:.1f} quotes and {stats['events'] / stats['connected']:.1f} events per client")
+        if published:
+            self.stdout.write(f"Coalesced: {max(0.0, 1 - per_client / published):.0%} of updates per client")
+        if stats['latencies']:
+            latencies = np.array(stats['latencies']) * 1000
+            self.stdout.write(f"Latency: p50 {np.percentile(latencies, 50):.0f}ms, "
+                              f"p99 {np.percentile(latencies, 99):.0f}ms")
@@ -0,0 +1,40 @@
+import time
+import sqlite3
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+class Command(BaseCommand):
+    help = 'Copy the primary SQLite database to the replica files (a local stand-in for streaming replication)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Repeat every INTERVAL seconds instead of copying once')
+
+    def handle(self, *args, **options):
+        if connections['default'].vendor != 'sqlite':
+            raise CommandError('replicate_sqlite only supports the SQLite profile')
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('No replicas configured, set DATABASE_REPLICA_NAMES')
+
+        while True:
+            start = time.perf_counter()
+            self.replicate()
+            self.stdout.write(f"Replicated to {len(settings.DATABASE_REPLICAS)} replicas "
+                              f"in {time.perf_counter() - start:.3f}s")
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def replicate(self):
+        source = sqlite3.connect(settings.DATABASES['default']['NAME'])
+        try:
+            for alias in settings.DATABASE_REPLICAS:
+                # The backup API copies a consistent snapshot while writers continue
+                target = sqlite3.connect(settings.DATABASES[alias]['NAME'])
+                try:
+                    source.backup(target)
+                finally:
+                    target.close()
+        finally:
+            source.close()
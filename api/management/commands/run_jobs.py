@@ -0,0 +1,26 @@
+import time
+from django.core.management.base import BaseCommand
+from stocks.models import Job
+from api.jobs import execute_job, recover_stale_jobs
+
+class Command(BaseCommand):
+    help = ('Run queued background jobs in this process, after recovering jobs whose worker '
+            'was lost; a fallback for the web process pool')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--watch', type=float, metavar='SECONDS',
+                            help='Keep running, checking for queued jobs every SECONDS')
+
+    def handle(self, *args, **options):
+        while True:
+            failed, requeued = recover_stale_jobs(redispatch=False)
+            if failed or requeued:
+                self.stdout.write(f"Requeued {len(requeued)} and failed {failed} lost jobs")
+            job_ids = list(Job.objects.filter(status='queued').order_by('created_at').values_list('id', flat=True))
+            for job_id in job_ids:
+                execute_job(job_id)
+            if job_ids:
+                self.stdout.write(f"Ran {len(job_ids)} jobs")
+            if options['watch'] is None:
+                return
+            time.sleep(options['watch'])
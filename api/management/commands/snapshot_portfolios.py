@@ -0,0 +1,16 @@
+import datetime
+from django.core.management.base import BaseCommand
+from api.snapshots import snapshot_portfolios
+
+class Command(BaseCommand):
+    help = "Store end-of-day portfolio value snapshots, backfilling users without history"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=datetime.date.fromisoformat,
+                            help='Last date to snapshot (YYYY-MM-DD), defaults to today')
+        parser.add_argument('--since', type=datetime.date.fromisoformat,
+                            help='Recompute snapshots from this date (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        written = snapshot_portfolios(end=options['date'], since=options['since'])
+        self.stdout.write(f"Wrote {written} portfolio snapshots")
@@ -0,0 +1,125 @@
+import heapq
+import time
+import uuid
+from contextlib import contextmanager
+from django.core.cache import cache
+from stocks.models import Stock
+from .fragments import invalidate_shared
+
+MOVERS_CACHE_KEY = 'top_movers'
+MOVERS_CACHE_TIMEOUT = 60 * 60
+# Entries shown per list, plus a reserve so a leader falling back can be
+# replaced without going to the database
+TOP_MOVERS_SIZE = 10
+TOP_MOVERS_RESERVE = 10
+# Writers of the cached lists take this lock; it expires after LOCK_TIMEOUT
+# seconds should its holder die, and is waited for up to LOCK_WAIT seconds
+MOVERS_LOCK_KEY = 'top_movers_lock'
+MOVERS_LOCK_TIMEOUT = 10
+MOVERS_LOCK_WAIT = 2.0
+
+def mover_entry(stock):
+    return {
+        'id': stock.id,
+        'symbol': stock.symbol,
+        'name': stock.name,
+        'current_price': stock.current_price,
+        'change_percent': stock.change_percent,
+    }
+
+def is_quoted(stock):
+    return stock.current_price is not None and stock.change_percent is not None
+
+@contextmanager
+def movers_lock():
+    """
+    Serialise read-modify-write cycles of the cached lists across workers
+
+    Yields whether the lock was taken within MOVERS_LOCK_WAIT.
+    """
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + MOVERS_LOCK_WAIT
+    acquired = cache.add(MOVERS_LOCK_KEY, token, MOVERS_LOCK_TIMEOUT)
+    while not acquired and time.monotonic() < deadline:
+        time.sleep(0.01)
+        acquired = cache.add(MOVERS_LOCK_KEY, token, MOVERS_LOCK_TIMEOUT)
+    try:
+        yield acquired
+    finally:
+        if acquired and cache.get(MOVERS_LOCK_KEY) == token:
+            cache.delete(MOVERS_LOCK_KEY)
+
+def invalidate_movers():
+    """Drop the cached lists so they are rebuilt on next use"""
+    with movers_lock():
+        cache.delete(MOVERS_CACHE_KEY)
+    invalidate_shared('movers')
+
+def refresh_movers():
+    """Rebuild the gainers and losers lists from the change_percent index"""
+    with movers_lock() as locked:
+        return build_movers(store=locked)
+
+def build_movers(store=True):
+    quoted = Stock.objects.filter(current_price__isnull=False, change_percent__isnull=False)
+    limit = TOP_MOVERS_SIZE + TOP_MOVERS_RESERVE
+    movers = {
+        'gainers': [mover_entry(stock) for stock in quoted.order_by('-change_percent')[:limit]],
+        'losers': [mover_entry(stock) for stock in quoted.order_by('change_percent')[:limit]],
+    }
+    # A short list means every quoted stock is in it, so the list is exact
+    movers['complete'] = len(movers['gainers']) < limit
+    if store:
+        cache.set(MOVERS_CACHE_KEY, movers, MOVERS_CACHE_TIMEOUT)
+    invalidate_shared('movers')
+    return movers
+
+def top_movers(n=5):
+    """Top n gainers and losers from the shared cache, rebuilt only on a miss"""
+    movers = cache.get(MOVERS_CACHE_KEY) or refresh_movers()
+    return {'gainers': movers['gainers'][:n], 'losers': movers['losers'][:n]}
+
+def update_movers(stock, deleted=False):
+    """
+    Fold one quote change into the cached lists
+
+    Each list holds exactly the stocks ranked at or above its last entry, so a
+    changed stock is pushed back through a bounded heap selection only if it
+    still clears that boundary. When a list falls below TOP_MOVERS_SIZE, stocks
+    outside it may now belong in it, so the lists are rebuilt from the database.
+
+    The cycle runs under movers_lock so concurrent updates are not lost; if
+    the lock cannot be had, the lists are dropped and rebuilt on next use.
+    """
+    with movers_lock() as locked:
+        if not locked:
+            cache.delete(MOVERS_CACHE_KEY)
+            invalidate_shared('movers')
+            return
+        fold_mover(stock, deleted)
+
+def fold_mover(stock, deleted):
+    movers = cache.get(MOVERS_CACHE_KEY)
+    if movers is None:
+        return
+    limit = TOP_MOVERS_SIZE + TOP_MOVERS_RESERVE
+    complete = movers['complete']
+    shown = {key: movers[key][:TOP_MOVERS_SIZE] for key in ('gainers', 'losers')}
+    for key, sign in [('gainers', 1), ('losers', -1)]:
+        rank = lambda entry: sign * entry['change_percent']
+        entries = [entry for entry in movers[key] if entry['id'] != stock.id]
+        boundary = None if movers['complete'] or not movers[key] else min(map(rank, movers[key]))
+        if not deleted and is_quoted(stock):
+            entry = mover_entry(stock)
+            if boundary is None or rank(entry) >= boundary:
+                entries.append(entry)
+        if len(entries) < TOP_MOVERS_SIZE and not movers['complete']:
+            build_movers()
+            return
+        complete = movers['complete'] and len(entries) <= limit
+        movers[key] = heapq.nlargest(limit, entries, key=rank)
+    movers['complete'] = complete
+    cache.set(MOVERS_CACHE_KEY, movers, MOVERS_CACHE_TIMEOUT)
+    # Cached panels only need re-rendering when a shown entry changed
+    if any(movers[key][:TOP_MOVERS_SIZE] != entries for key, entries in shown.items()):
+        invalidate_shared('movers')
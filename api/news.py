@@ -0,0 +1,258 @@
+import re
+import logging
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from stocks.models import Stock, StockNews, news_url_hash
+from .fragments import invalidate_shared
+from .pagination import KeysetPage, encode_cursor, decode_cursor, keyset_page
+from .rate_limiter import news_rate_limiter
+
+logger = logging.getLogger(__name__)
+
+# NewsAPI rejects 'q' longer than 500 characters and returns at most 100 articles per page
+MAX_QUERY_LENGTH = 500
+PAGE_SIZE = 100
+
+TITLE_MAX_LENGTH = StockNews._meta.get_field('title').max_length
+URL_MAX_LENGTH = StockNews._meta.get_field('url').max_length
+
+class FakeNewsApiClient:
+    """Offline stand-in for NewsApiClient serving a fixed list of articles"""
+
+    def __init__(self, articles=None):
+        self.articles = articles or []
+        self.queries = []
+
+    def get_everything(self, q, language='en', sort_by='publishedAt', page_size=20, **kwargs):
+        self.queries.append(q)
+        terms = [term.strip('"').lower() for term in q.split(' OR ')]
+        articles = [
+            article for article in self.articles
+            if any(term in f"{article.get('title') or ''} {article.get('description') or ''}".lower()
+                   for term in terms)
+        ]
+        return {'status': 'ok', 'totalResults': len(articles), 'articles': articles[:page_size]}
+
+def get_news_client():
+    """NewsAPI client for the configured key, or the fake client when none is set"""
+    if not settings.NEWS_API_KEY:
+        logger.warning("NEWS_API_KEY is not set, using the offline news client")
+        return FakeNewsApiClient()
+    from newsapi import NewsApiClient
+    return NewsApiClient(api_key=settings.NEWS_API_KEY)
+
+def tracked_stocks():
+    """Stocks that appear in any watchlist or portfolio"""
+    return Stock.objects.filter(Q(watchlist__isnull=False) | Q(portfolio__isnull=False)).distinct()
+
+def search_terms(stock):
+    terms = [stock.symbol]
+    if stock.name and stock.name != f"{stock.symbol} Company":
+        terms.append(f'"{stock.name}"')
+    return terms
+
+def batch_queries(stocks, max_length=MAX_QUERY_LENGTH):
+    """
+    Group stocks into OR queries that fit NewsAPI's query length limit
+
+    Returns:
+        List of (query, stocks) tuples
+    """
+    batches = []
+    query, batch = '', []
+    for stock in stocks:
+        clause = ' OR '.join(search_terms(stock))
+        candidate = f"{query} OR {clause}" if query else clause
+        if batch and len(candidate) > max_length:
+            batches.append((query, batch))
+            candidate, batch = clause, []
+        query = candidate
+        batch.append(stock)
+    if batch:
+        batches.append((query, batch))
+    return batches
+
+def match_stock(article, stocks):
+    """First stock in the batch whose symbol or name the article mentions"""
+    text = f" {article.get('title') or ''} {article.get('description') or ''} ".lower()
+    for stock in stocks:
+        if f" {stock.symbol.lower()} " in text or (stock.name and stock.name.lower() in text):
+            return stock
+    return None
+
+def ingest_news(stocks=None, client=None):
+    """
+    Fetch news for tracked stocks in batched queries and store new articles
+
+    Articles already stored, or repeated across batches, are skipped by the
+    unique url_hash index, so the pipeline can be rerun safely.
+
+    Args:
+        stocks: Stocks to fetch news for, defaults to tracked_stocks()
+        client: NewsAPI-compatible client, defaults to get_news_client()
+
+    Returns:
+        Dictionary with the number of requests made, articles fetched and articles stored
+    """
+    stocks = list(tracked_stocks() if stocks is None else stocks)
+    client = client or get_news_client()
+    articles = {}
+    requests_made = fetched = 0
+
+    for query, batch in batch_queries(stocks):
+        if news_rate_limiter.is_rate_limited('everything'):
+            logger.warning("NewsAPI request budget exhausted, stopping news ingestion")
+            break
+        try:
+            response = client.get_everything(q=query, language='en', sort_by='publishedAt', page_size=PAGE_SIZE)
+        except Exception as e:
+            logger.error(f"Error fetching news for {query}: {str(e)}")
+            continue
+        requests_made += 1
+
+        for article in response.get('articles', []):
+            fetched += 1
+            url = article.get('url')
+            published_at = parse_datetime(article.get('publishedAt') or '')
+            if not url or len(url) > URL_MAX_LENGTH or not article.get('title') or published_at is None:
+                continue
+            url_hash = news_url_hash(url)
+            if url_hash in articles:
+                continue
+            articles[url_hash] = StockNews(
+                stock=match_stock(article, batch),
+                title=article['title'][:TITLE_MAX_LENGTH],
+                content=article.get('description') or '',
+                url=url,
+                source=(article.get('source') or {}).get('name') or '',
+                url_hash=url_hash,
+                published_at=published_at
+            )
+
+    before = StockNews.objects.count()
+    StockNews.objects.bulk_create(articles.values(), batch_size=500, ignore_conflicts=True)
+    stored = StockNews.objects.count() - before
+    if stored:
+        # Bulk inserts skip the save signal that invalidates the news panel
+        invalidate_shared('news')
+    return {
+        'requests': requests_made,
+        'fetched': fetched,
+        'stored': stored
+    }
+
+# Full-text search structures created by stocks migration 0006, per backend
+FTS_TABLE = 'stocks_stocknews_fts'
+SEARCH_VECTOR_COLUMN = 'search_vector'
+_search_backends = {}
+
+FTS5_SEARCH_SQL = f"""
+    SELECT n.id AS id, n.published_at AS published_at, bm25({FTS_TABLE}, 10.0, 1.0) AS rank
+    FROM {FTS_TABLE} JOIN stocks_stocknews n ON n.id = {FTS_TABLE}.rowid
+    WHERE {FTS_TABLE} MATCH %s
+"""
+
+POSTGRES_SEARCH_SQL = f"""
+    SELECT n.id AS id, n.published_at AS published_at, -ts_rank_cd(n.{SEARCH_VECTOR_COLUMN}, query) AS rank
+    FROM stocks_stocknews n, websearch_to_tsquery('english', %s) query
+    WHERE n.{SEARCH_VECTOR_COLUMN} @@ query
+"""
+
+def search_backend(connection):
+    """'fts5', 'postgresql' or 'icontains', depending on what the database provides"""
+    if connection.alias not in _search_backends:
+        backend = 'icontains'
+        if connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names():
+            backend = 'fts5'
+        elif connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                columns = connection.introspection.get_table_description(cursor, StockNews._meta.db_table)
+            if any(column.name == SEARCH_VECTOR_COLUMN for column in columns):
+                backend = 'postgresql'
+        _search_backends[connection.alias] = backend
+    return _search_backends[connection.alias]
+
+def fts5_query(query):
+    """FTS5 MATCH expression requiring every word, with prefix matching on the last"""
+    terms = re.findall(r'\w+', query)
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"' for term in terms) + '*'
+
+def search_news(query='', cursor=None, page_size=10):
+    """
+    One page of news, relevance-ranked when searching and newest first otherwise
+
+    Pages are fetched by keyset: searches order by (rank, published_at, id) and
+    browsing by (published_at, id), so no page needs an OFFSET or a COUNT(*).
+
+    Args:
+        query: Search text; an empty query browses all news
+        cursor: next_cursor of the previous page
+        page_size: Articles per page
+
+    Returns:
+        KeysetPage of StockNews with the stock selected
+    """
+    query = query.strip()
+    # Raw search SQL follows the database router like the ORM reads do
+    connection = connections[router.db_for_read(StockNews)]
+    backend = search_backend(connection) if query else None
+    if backend == 'fts5':
+        match = fts5_query(query)
+        if match is None:
+            return KeysetPage([], None)
+        return _ranked_page(connection, FTS5_SEARCH_SQL, match, cursor, page_size)
+    if backend == 'postgresql':
+        return _ranked_page(connection, POSTGRES_SEARCH_SQL, query, cursor, page_size)
+
+    news = StockNews.objects.select_related('stock')
+    if query:
+        news = news.filter(Q(title__icontains=query) | Q(content__icontains=query))
+    return keyset_page(news, ['-published_at', '-id'], cursor, page_size)
+
+def _keyset(cursor, size):
+    """Validated [rank, published_at, id] sort key from a ranked-search cursor, or None"""
+    after = decode_cursor(cursor)
+    if not after or len(after) != size:
+        return None
+    *rank, published_at, news_id = after
+    try:
+        published_at = parse_datetime(published_at)
+    except (TypeError, ValueError):
+        return None
+    if published_at is None or not isinstance(news_id, int) or not all(isinstance(r, (int, float)) for r in rank):
+        return None
+    return [*rank, published_at, news_id]
+
+def _ranked_page(connection, search_sql, match, cursor, page_size):
+    sql = f"SELECT id, rank FROM ({search_sql}) ranked"
+    params = [match]
+    after = _keyset(cursor, 3)
+    if after:
+        rank, published_at = after[0], connection.ops.adapt_datetimefield_value(after[1])
+        sql += (" WHERE rank > %s OR (rank = %s AND"
+                " (published_at < %s OR (published_at = %s AND id < %s)))")
+        params += [rank, rank, published_at, published_at, after[2]]
+    sql += " ORDER BY rank, published_at DESC, id DESC LIMIT %s"
+    params.append(page_size + 1)
+
+    with connection.cursor() as db_cursor:
+        db_cursor.execute(sql, params)
+        ranks = db_cursor.fetchall()
+
+    news_by_id = (StockNews.objects.using(connection.alias).select_related('stock')
+                  .in_bulk([news_id for news_id, _ in ranks[:page_size]]))
+    items = []
+    for news_id, rank in ranks[:page_size]:
+        news = news_by_id[news_id]
+        news.rank = rank
+        items.append(news)
+
+    next_cursor = None
+    if len(ranks) > page_size:
+        last = items[-1]
+        next_cursor = encode_cursor([last.rank, last.published_at.isoformat(), last.id])
+    return KeysetPage(items, next_cursor)
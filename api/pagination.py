@@ -0,0 +1,113 @@
+import json
+import base64
+import binascii
+from collections import namedtuple
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import Q
+
+# One page of keyset-paginated results; next_cursor is None on the last page
+KeysetPage = namedtuple('KeysetPage', ['items', 'next_cursor'])
+
+def encode_cursor(values):
+    """Opaque, URL-safe cursor for the sort key of the last row on a page"""
+    payload = json.dumps(values, separators=(',', ':'), default=str).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """Sort key list from a cursor, or None if the cursor is missing or malformed"""
+    if not cursor:
+        return None
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(payload)
+    except (binascii.Error, ValueError):
+        return None
+    return values if isinstance(values, list) else None
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+# Above this many rows a count is only an estimate; see estimate_count
+COUNT_ESTIMATE_CAP = 1000
+
+def page_size_param(value, default=DEFAULT_PAGE_SIZE):
+    """Requested page size clamped to [1, MAX_PAGE_SIZE]; ValueError if not an integer"""
+    if value in (None, ''):
+        return default
+    return min(MAX_PAGE_SIZE, max(1, int(value)))
+
+def _sort_field(model, path):
+    field = None
+    for name in path.split('__'):
+        field = model._meta.get_field(name)
+        model = field.related_model
+    return field
+
+def _sort_value(obj, path):
+    for name in path.split('__'):
+        obj = getattr(obj, name)
+    return obj
+
+def keyset_page(queryset, ordering, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    One page of queryset ordered by ordering, continuing after cursor
+
+    Rows are selected with a WHERE on the sort key instead of OFFSET, so every
+    page costs the same when an index covers the ordering.
+
+    Args:
+        ordering: Field paths ('-' prefixed for descending) whose combination
+            is unique, e.g. ['-published_at', '-id']
+        cursor: next_cursor of the previous page; a malformed or stale cursor
+            restarts from the first page
+
+    Returns:
+        KeysetPage of model instances
+    """
+    fields = [name.lstrip('-') for name in ordering]
+    queryset = queryset.order_by(*ordering)
+    after = decode_cursor(cursor)
+    if after and len(after) == len(fields):
+        try:
+            after = [_sort_field(queryset.model, field).to_python(value) for field, value in zip(fields, after)]
+        except ValidationError:
+            after = None
+        if after:
+            # (a, b) after (x, y) means a beyond x, or a == x and b beyond y
+            condition = Q()
+            for i, name in enumerate(ordering):
+                lookup = 'lt' if name.startswith('-') else 'gt'
+                condition |= Q(**dict(zip(fields[:i], after[:i])), **{f'{fields[i]}__{lookup}': after[i]})
+            queryset = queryset.filter(condition)
+
+    items = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        next_cursor = encode_cursor([_sort_value(items[-1], field) for field in fields])
+    return KeysetPage(items, next_cursor)
+
+def estimate_count(queryset):
+    """
+    Total rows for display without a full COUNT(*) on large tables
+
+    PostgreSQL answers from the planner's row estimate. Elsewhere rows are
+    counted exactly but only up to COUNT_ESTIMATE_CAP, which is returned for
+    anything larger.
+    """
+    connection = connections[queryset.db]
+    queryset = queryset.order_by()
+    if connection.vendor == 'postgresql':
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        plan = json.loads(plan) if isinstance(plan, str) else plan
+        return int(plan[0]['Plan']['Plan Rows'])
+    return queryset[:COUNT_ESTIMATE_CAP].count()
+
+def next_page_link(request, next_cursor):
+    """RFC 8288 Link header value pointing at the page after next_cursor"""
+    params = request.GET.copy()
+    params['cursor'] = next_cursor
+    return f'<{request.build_absolute_uri(request.path)}?{params.urlencode()}>; rel="next"'
@@ -0,0 +1,149 @@
+import datetime
+import numpy as np
+from .prediction import FEATURES, FEATURE_WINDOW, add_indicators, create_features, prepare_features
+
+def _normalize(X, mean, std):
+    return (X - mean) / std
+
+def _symbol_stats(X):
+    mean = X.mean(axis=0)
+    std = X.std(axis=0)
+    std[std == 0] = 1.0
+    return mean, std
+
+def build_pooled_design(histories):
+    """
+    Stack per-symbol normalized features into a single design matrix
+
+    Features are z-scored with each symbol's own statistics and the target is the
+    next-day return, so symbols at very different price levels share one model.
+
+    Args:
+        histories: Dict of symbol -> DataFrame with OHLC data
+
+    Returns:
+        Dictionary with the stacked training matrix, targets and group codes, plus
+        the latest normalized feature row and close of every symbol for inference
+    """
+    symbols = []
+    X_blocks, y_blocks, group_blocks = [], [], []
+    latest_rows, latest_closes = [], []
+
+    for symbol, history in histories.items():
+        df = prepare_features(history)
+        if df.empty:
+            continue
+
+        X = df[FEATURES].values
+        mean, std = _symbol_stats(X)
+        group = len(symbols)
+        symbols.append(symbol)
+
+        X_blocks.append(_normalize(X, mean, std))
+        y_blocks.append((df['target'] / df['close'] - 1).values)
+        group_blocks.append(np.full(len(df), group))
+
+        # Latest bar has no target yet, so build its features from the raw tail
+        tail = history['close'].iloc[-FEATURE_WINDOW:].astype(float).to_frame()
+        latest = add_indicators(create_features(tail, dropna=False))[FEATURES].iloc[-1].values
+        latest_rows.append(_normalize(latest, mean, std))
+        latest_closes.append(float(history['close'].iloc[-1]))
+
+    if not symbols:
+        raise ValueError('Not enough history to build a pooled design matrix')
+
+    return {
+        'symbols': symbols,
+        'X': np.vstack(X_blocks),
+        'y': np.concatenate(y_blocks),
+        'groups': np.concatenate(group_blocks),
+        'latest_X': np.vstack(latest_rows),
+        'latest_close': np.array(latest_closes)
+    }
+
+class PooledLinearModel:
+    """One least-squares model shared by every symbol, with optional per-symbol intercepts"""
+
+    def __init__(self, per_symbol_intercepts=False):
+        self.per_symbol_intercepts = per_symbol_intercepts
+        self.coef = None
+        self.intercept = 0.0
+        self.group_intercepts = None
+
+    def fit(self, X, y, groups=None):
+        if not self.per_symbol_intercepts:
+            design = np.column_stack([np.ones(len(X)), X])
+            solution = np.linalg.lstsq(design, y, rcond=None)[0]
+            self.intercept, self.coef = solution[0], solution[1:]
+            return self
+
+        # Within transform: demeaning by symbol is equivalent to one dummy column
+        # per symbol but keeps the solve at f columns
+        n_groups = groups.max() + 1
+        counts = np.bincount(groups, minlength=n_groups).astype(float)
+        X_means = np.zeros((n_groups, X.shape[1]))
+        np.add.at(X_means, groups, X)
+        X_means /= counts[:, None]
+        y_means = np.bincount(groups, weights=y, minlength=n_groups) / counts
+
+        self.coef = np.linalg.lstsq(X - X_means[groups], y - y_means[groups], rcond=None)[0]
+        self.group_intercepts = y_means - X_means @ self.coef
+        return self
+
+    def predict(self, X, groups=None):
+        if self.per_symbol_intercepts:
+            return X @ self.coef + self.group_intercepts[groups]
+        return X @ self.coef + self.intercept
+
+def predict_universe(histories, per_symbol_intercepts=False):
+    """
+    Fit one pooled model across all symbols and predict each symbol's next close
+
+    Args:
+        histories: Dict of symbol -> DataFrame with OHLC data
+        per_symbol_intercepts: Give every symbol its own intercept
+
+    Returns:
+        Dictionary of symbol -> next-day prediction
+    """
+    design = build_pooled_design(histories)
+    model = PooledLinearModel(per_symbol_intercepts).fit(design['X'], design['y'], design['groups'])
+
+    # Inference for the whole universe is a single matrix product
+    groups = np.arange(len(design['symbols']))
+    returns = model.predict(design['latest_X'], groups)
+    prices = design['latest_close'] * (1 + returns)
+
+    return {
+        symbol: {
+            'predicted_price': round(float(price), 2),
+            'change': round(float(price - close), 2),
+            'change_percent': round(float(ret * 100), 2)
+        }
+        for symbol, price, close, ret in zip(design['symbols'], prices, design['latest_close'], returns)
+    }
+
+def predict_stock_price_pooled(histories, symbol):
+    """
+    Predict symbol's next close with one pooled model fit over every history
+
+    The pooled model forecasts returns one day ahead, so a single prediction
+    is returned.
+
+    Args:
+        histories: Dict of symbol -> DataFrame with OHLC data, including symbol
+        symbol: Stock symbol to report the prediction of
+
+    Returns:
+        Dictionary with prediction results
+    """
+    results = predict_universe(histories, per_symbol_intercepts=True)
+    if symbol not in results:
+        raise ValueError(f"Not enough history to predict {symbol}")
+
+    next_date = histories[symbol].index[-1] + datetime.timedelta(days=1)
+    return {
+        'predictions': [{'date': next_date.strftime('%Y-%m-%d'), **results[symbol]}],
+        'model_type': 'pooled',
+        'model_performance': {'symbols': len(results)}
+    }
@@ -0,0 +1,57 @@
+from decimal import Decimal
+from django.db.models import F, Q, Sum, Value, Case, When, ExpressionWrapper, DecimalField
+from django.db.models.functions import Coalesce
+from stocks.models import Portfolio
+
+MONEY = DecimalField(max_digits=20, decimal_places=2)
+ZERO = Value(Decimal('0.00'), output_field=MONEY)
+
+def valued_holdings(user):
+    """
+    A user's holdings with the stock joined and values computed by the database
+
+    Each row is annotated with invested_value, current_value, profit_loss and
+    profit_loss_percent. Holdings without a current price are valued at zero.
+    """
+    invested_value = ExpressionWrapper(F('quantity') * F('buy_price'), output_field=MONEY)
+    current_value = ExpressionWrapper(
+        F('quantity') * Coalesce(F('stock__current_price'), ZERO), output_field=MONEY
+    )
+    return (
+        Portfolio.objects.filter(user=user)
+        .select_related('stock')
+        .annotate(invested_value=invested_value, current_value=current_value)
+        .annotate(profit_loss=ExpressionWrapper(F('current_value') - F('invested_value'), output_field=MONEY))
+        .annotate(profit_loss_percent=Case(
+            When(Q(invested_value__gt=0),
+                 then=ExpressionWrapper(F('profit_loss') * 100 / F('invested_value'), output_field=MONEY)),
+            default=ZERO,
+            output_field=MONEY
+        ))
+        .order_by('stock__symbol')
+    )
+
+def portfolio_valuation(user):
+    """
+    Holdings plus portfolio totals in a constant number of queries
+
+    Returns:
+        Dictionary with the annotated holdings queryset and total_investment,
+        current_value, profit_loss and profit_loss_percent
+    """
+    holdings = valued_holdings(user)
+    # Aggregate aliases must not reuse the row annotation names
+    totals = holdings.aggregate(
+        total_investment=Coalesce(Sum('invested_value'), ZERO),
+        total_value=Coalesce(Sum('current_value'), ZERO)
+    )
+    total_investment = totals['total_investment']
+    profit_loss = totals['total_value'] - total_investment
+
+    return {
+        'portfolio_items': holdings,
+        'total_investment': total_investment,
+        'current_value': totals['total_value'],
+        'profit_loss': profit_loss,
+        'profit_loss_percent': (profit_loss / total_investment * 100) if total_investment > 0 else 0
+    }
@@ -1,11 +1,19 @@
-import pandas as pd
 import numpy as np
-from sklearn.preprocessing import MinMaxScaler
-from sklearn.linear_model import LinearRegression
 from sklearn.model_selection import train_test_split
+from django.core.cache import cache
 import datetime
 
-def create_features(df, window=30):
+FEATURES = ['ma7', 'ma21', 'ma50', 'ma200', 'return_1d', 'return_5d', 'return_10d',
+            'volatility_10d', 'volatility_30d', 'rsi', 'macd', 'signal_line']
+
+# Lagged daily returns used by the autoregressive model
+AR_LAGS = 5
+AR_FEATURES = ['return_1d'] + [f'return_1d_lag{lag}' for lag in range(1, AR_LAGS)]
+
+# Bars of history needed to compute one fully populated feature row
+FEATURE_WINDOW = 260
+
+def create_features(df, window=30, dropna=True):
     """Create features for the prediction model"""
     df = df.copy()
     
@@ -19,6 +27,8 @@ def create_features(df, window=30):
     df['return_1d'] = df['close'].pct_change(periods=1)
     df['return_5d'] = df['close'].pct_change(periods=5)
     df['return_10d'] = df['close'].pct_change(periods=10)
+    for lag in range(1, AR_LAGS):
+        df[f'return_1d_lag{lag}'] = df['return_1d'].shift(lag)
     
     # Volatility
     df['volatility_10d'] = df['return_1d'].rolling(window=10).std()
@@ -28,27 +38,13 @@ def create_features(df, window=30):
     df['target'] = df['close'].shift(-1)
     
     # Drop NaN values
-    df.dropna(inplace=True)
+    if dropna:
+        df.dropna(inplace=True)
     
     return df
 
-def predict_stock_price(historical_data, days_ahead=5, model_type='lstm'):
-    """
-    Predict stock prices for the next few days using machine learning
-    
-    Args:
-        historical_data: DataFrame with OHLC data
-        days_ahead: Number of days to predict ahead
-        model_type: Type of model to use ('lstm', 'arima', 'prophet', 'ensemble')
-        
-    Returns:
-        Dictionary with prediction results
-    """
-    df = historical_data.copy()
-    
-    # Create features
-    df = create_features(df)
-    
+def add_indicators(df):
+    """Add RSI and MACD columns to a feature frame"""
     # Add RSI
     delta = df['close'].diff()
     gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
@@ -62,40 +58,45 @@ def predict_stock_price(historical_data, days_ahead=5, model_type='lstm'):
     df['macd'] = exp1 - exp2
     df['signal_line'] = df['macd'].ewm(span=9, adjust=False).mean()
     
-    # Prepare features and target
-    features = ['ma7', 'ma21', 'ma50', 'ma200', 'return_1d', 'return_5d', 'return_10d',
-                'volatility_10d', 'volatility_30d', 'rsi', 'macd', 'signal_line']
-    X = df[features]
-    y = df['target']
-    
-    # Split data
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    return df
+
+def prepare_features(historical_data):
+    """Build the training frame: every row has all FEATURES and a known target"""
+    df = add_indicators(create_features(historical_data))
     
-    # Train model
-    model = LinearRegression()
-    model.fit(X_train, y_train)
+    # RSI needs a warm-up period after the moving averages are populated
+    df.dropna(subset=FEATURES, inplace=True)
     
-    # Make predictions
-    predictions = []
-    last_data = df.iloc[-1:].copy()
+    return df
+
+def predict_stock_price(historical_data, days_ahead=5, model_type='linear'):
+    """
+    Predict stock prices for the next few days using machine learning
     
-    for i in range(days_ahead):
-        # Predict next day
-        pred = model.predict(last_data[features])[0]
-        pred_date = df.index[-1] + pd.Timedelta(days=i+1)
-        
-        predictions.append({
-            'date': pred_date.strftime('%Y-%m-%d'),
-            'predicted_price': round(float(pred), 2)
-        })
+    Args:
+        historical_data: DataFrame with OHLC data
+        days_ahead: Number of days to predict ahead
+        model_type: Type of model to use ('linear', 'ridge', 'gbm', 'ar', 'ensemble',
+            or the aliases 'lstm', 'arima', 'prophet')
         
-        # Update features for next prediction
-        last_data['close'] = pred
-        last_data = create_features(last_data)
+    Returns:
+        Dictionary with prediction results
+    """
+    from .forecasters import get_forecaster
+    
+    # Create features once; every model reads its columns from this frame
+    df = prepare_features(historical_data)
+    
+    # Split data
+    train, test = train_test_split(df, test_size=0.2, random_state=42)
+    
+    # Train model
+    model = get_forecaster(model_type).fit(train)
     
     # Calculate model performance metrics
     from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
-    y_pred = model.predict(X_test)
+    y_test = test['target']
+    y_pred = model.predict(test)
     mse = mean_squared_error(y_test, y_pred)
     mae = mean_absolute_error(y_test, y_pred)
     r2 = r2_score(y_test, y_pred)
@@ -104,80 +105,183 @@ def predict_stock_price(historical_data, days_ahead=5, model_type='lstm'):
     # Calculate confidence score based on multiple metrics
     confidence = round((r2 * 100 + (1 - rmse/y_test.mean()) * 100) / 2, 2)
     
-    # Prepare data for modeling with enhanced features
-    features = ['ma7', 'ma21', 'ma50', 'ma200', 'return_1d', 'return_5d', 'return_10d',
-                'volatility_10d', 'volatility_30d', 'rsi', 'macd', 'signal_line']
-    X = df[features]
-    y = df['target']
+    # Refit on the full history
+    model = get_forecaster(model_type).fit(df)
     
-    # Scale features
-    scaler = MinMaxScaler()
-    X_scaled = scaler.fit_transform(X)
+    # Make predictions for future days
+    predictions = forecast_forward(historical_data, model.predict, days_ahead)
     
-    # Train model
-    model = LinearRegression()
-    model.fit(X_scaled, y)
+    return {
+        'predictions': predictions,
+        'model_type': model.name,
+        'model_performance': {
+            'confidence': confidence,
+            'r2_score': round(r2 * 100, 2),
+            'rmse': round(rmse, 2),
+            'mae': round(mae, 2)
+        }
+    }
+
+class OnlineScaler:
+    """Standardizes features with exponentially weighted running mean and variance"""
     
-    # Make predictions for future days
-    last_data = df.iloc[-1:][features]
-    predictions = []
-    current_data = last_data.copy()
+    def __init__(self, n_features, forgetting=0.99):
+        self.forgetting = forgetting
+        self.weight = 0.0
+        self.mean = np.zeros(n_features)
+        self.var = np.zeros(n_features)
     
-    last_date = df.index[-1]
-    last_close = df['close'].iloc[-1]
+    def partial_fit(self, x):
+        # Forgetting-weighted Welford update, O(f) per observation
+        self.weight = self.forgetting * self.weight + 1.0
+        delta = x - self.mean
+        self.mean = self.mean + delta / self.weight
+        self.var = self.forgetting * self.var + delta * (x - self.mean)
+        return self
+    
+    def transform(self, X):
+        if self.weight <= 1.0:
+            return np.asarray(X, dtype=float) - self.mean
+        std = np.sqrt(self.var / self.weight)
+        std[std == 0] = 1.0
+        return (np.asarray(X, dtype=float) - self.mean) / std
+
+class RecursiveLeastSquares:
+    """Linear regression updated in O(f^2) per observation with a forgetting factor"""
+    
+    def __init__(self, n_features, forgetting=0.99, delta=1000.0):
+        self.forgetting = forgetting
+        # Coefficients include a leading intercept term
+        self.coef = np.zeros(n_features + 1)
+        self.P = np.eye(n_features + 1) * delta
+    
+    def partial_fit(self, x, y):
+        x = np.concatenate(([1.0], x))
+        Px = self.P @ x
+        gain = Px / (self.forgetting + x @ Px)
+        error = y - self.coef @ x
+        self.coef = self.coef + gain * error
+        self.P = (self.P - np.outer(gain, Px)) / self.forgetting
+        return error
+    
+    def predict(self, X):
+        X = np.atleast_2d(X)
+        return self.coef[0] + X @ self.coef[1:]
+
+class OnlineLinearModel:
+    """Online scaler plus RLS regressor, tracking prequential (predict-then-update) errors"""
+    
+    def __init__(self, n_features, forgetting=0.99, delta=1000.0):
+        self.scaler = OnlineScaler(n_features, forgetting)
+        self.rls = RecursiveLeastSquares(n_features, forgetting, delta)
+        self.observations = 0
+        self.abs_error_sum = 0.0
+        self.sq_error_sum = 0.0
+    
+    def partial_fit(self, x, y):
+        x = np.asarray(x, dtype=float)
+        self.scaler.partial_fit(x)
+        error = self.rls.partial_fit(self.scaler.transform(x), y)
+        self.observations += 1
+        self.abs_error_sum += abs(error)
+        self.sq_error_sum += error ** 2
+        return self
+    
+    def fit(self, X, y):
+        for x_row, y_row in zip(np.asarray(X, dtype=float), np.asarray(y, dtype=float)):
+            self.partial_fit(x_row, y_row)
+        return self
+    
+    def predict(self, X):
+        return self.rls.predict(self.scaler.transform(X))
+    
+    def performance(self):
+        if not self.observations:
+            return {'mae': None, 'rmse': None, 'observations': 0}
+        return {
+            'mae': round(self.abs_error_sum / self.observations, 2),
+            'rmse': round(float(np.sqrt(self.sq_error_sum / self.observations)), 2),
+            'observations': self.observations
+        }
+
+def forecast_forward(historical_data, predict_fn, days_ahead=5):
+    """
+    Forecast recursively, feeding each predicted close back in to rebuild the next feature row
+    
+    predict_fn receives a one-row frame with every feature column and the current close.
+    """
+    closes = historical_data['close'].iloc[-FEATURE_WINDOW:].astype(float).copy()
+    last_date = closes.index[-1]
+    last_close = closes.iloc[-1]
+    predictions = []
     
     for i in range(days_ahead):
-        # Scale the current data
-        current_scaled = scaler.transform(current_data)
-        
-        # Predict the next day's price
-        next_price = model.predict(current_scaled)[0]
-        
-        # Calculate the date for this prediction
+        frame = add_indicators(create_features(closes.to_frame(), dropna=False))
+        next_price = float(predict_fn(frame.iloc[[-1]])[0])
         next_date = last_date + datetime.timedelta(days=i+1)
         
-        # Store the prediction
         predictions.append({
             'date': next_date.strftime('%Y-%m-%d'),
-            'predicted_price': round(float(next_price), 2),
-            'change': round(float(next_price - last_close), 2),
-            'change_percent': round(float((next_price - last_close) / last_close * 100), 2)
+            'predicted_price': round(next_price, 2),
+            'change': round(next_price - last_close, 2),
+            'change_percent': round((next_price - last_close) / last_close * 100, 2)
         })
         
-        # Update all features for next prediction
-        current_data['ma7'] = df['close'].rolling(window=7).mean().iloc[-1] if i == 0 else next_price
-        current_data['ma21'] = df['close'].rolling(window=21).mean().iloc[-1]
-        current_data['ma50'] = df['close'].rolling(window=50).mean().iloc[-1]
-        current_data['ma200'] = df['close'].rolling(window=200).mean().iloc[-1]
-        
-        current_data['return_1d'] = (next_price - last_close) / last_close
-        current_data['return_5d'] = df['close'].pct_change(periods=5).iloc[-1]
-        current_data['return_10d'] = df['close'].pct_change(periods=10).iloc[-1]
-        
-        current_data['volatility_10d'] = df['return_1d'].rolling(window=10).std().iloc[-1]
-        current_data['volatility_30d'] = df['return_1d'].rolling(window=30).std().iloc[-1]
-        
-        # Update RSI
-        delta = next_price - last_close
-        gain = delta if delta > 0 else 0
-        loss = -delta if delta < 0 else 0
-        avg_gain = (current_data['rsi'].iloc[-1] * 13 + gain) / 14
-        avg_loss = (current_data['rsi'].iloc[-1] * 13 + loss) / 14
-        rs = avg_gain / avg_loss if avg_loss != 0 else 100
-        current_data['rsi'] = 100 - (100 / (1 + rs))
-        
-        # Update MACD
-        current_data['macd'] = df['macd'].ewm(span=12, adjust=False).mean().iloc[-1]
-        current_data['signal_line'] = df['signal_line'].ewm(span=9, adjust=False).mean().iloc[-1]
-        
+        closes.loc[next_date] = next_price
         last_close = next_price
     
+    return predictions
+
+def predict_stock_price_online(historical_data, symbol, days_ahead=5, forgetting=0.99):
+    """
+    Predict stock prices with an online linear model that is updated, not refit
+    
+    New bars are appended to the symbol's feature store and the cached model only
+    consumes the store rows it has not seen yet. The store version tells a cached
+    model whether anything changed since its last update.
+    
+    Args:
+        historical_data: DataFrame with OHLC data
+        symbol: Stock symbol the model state is stored under
+        days_ahead: Number of days to predict ahead
+        forgetting: Weight kept by past observations on each update (0 < forgetting <= 1)
+        
+    Returns:
+        Dictionary with prediction results
+    """
+    from .feature_store import feature_store
+    
+    version = feature_store.append(symbol, historical_data)
+    stored = feature_store.load(symbol)
+    if stored is None:
+        raise ValueError(f"No history available for {symbol}")
+    
+    cache_key = f'online_model_{symbol}'
+    state = cache.get(cache_key)
+    
+    # A model whose coefficients went non-finite is rebuilt rather than updated forever
+    if (state and state['forgetting'] == forgetting and state['rows_seen'] <= len(stored)
+            and np.isfinite(state['model'].rls.coef).all()):
+        model = state['model']
+        start = state['rows_seen']
+    else:
+        state = None
+        model = OnlineLinearModel(len(FEATURES), forgetting)
+        start = None
+    
+    if state is None or state['version'] != version:
+        X, y = stored.training_arrays(start)
+        model.fit(X, y)
+    
+    cache.set(cache_key, {
+        'model': model,
+        'forgetting': forgetting,
+        'version': version,
+        'rows_seen': len(stored) - 1
+    }, timeout=None)
+    
     return {
-        'predictions': predictions,
-        'model_performance': {
-            'confidence': confidence,
-            'r2_score': round(r2 * 100, 2),
-            'rmse': round(rmse, 2),
-            'mae': round(mae, 2)
-        }
+        'predictions': forecast_forward(historical_data, lambda row: model.predict(row[FEATURES]), days_ahead),
+        'model_type': 'online',
+        'model_performance': model.performance()
     }
\ No newline at end of file
@@ -0,0 +1,131 @@
+import re
+import time
+import logging
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUDGET = {
+    'MAX_QUERIES': 30,
+    'MAX_SQL_MS': 250,
+    # A query shape executed more often than this in one request is reported as an N+1
+    'MAX_REPEATS': 5,
+}
+
+_LITERALS = [
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'\bIN \((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE), 'IN (...)'),
+    (re.compile(r'\s+'), ' '),
+]
+
+def query_shape(sql):
+    """SQL with literals and IN lists collapsed, so repeated lookups compare equal"""
+    for pattern, replacement in _LITERALS:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+class QueryRecorder:
+    """Records every SQL statement run while active, on all database connections"""
+
+    def __init__(self):
+        self.queries = []
+        self._stack = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - start))
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def sql_ms(self):
+        return sum(duration for _, duration in self.queries) * 1000
+
+    def repeated_shapes(self, max_repeats):
+        """Query shapes executed more than max_repeats times, with their counts"""
+        shapes = Counter(query_shape(sql) for sql, _ in self.queries)
+        return {shape: count for shape, count in shapes.items() if count > max_repeats}
+
+    def violations(self, max_queries=None, max_sql_ms=None, max_repeats=None):
+        """Descriptions of every budget the recorded queries exceed"""
+        problems = []
+        if max_queries is not None and self.count > max_queries:
+            problems.append(f"{self.count} queries (budget {max_queries})")
+        if max_sql_ms is not None and self.sql_ms > max_sql_ms:
+            problems.append(f"{self.sql_ms:.1f}ms in SQL (budget {max_sql_ms}ms)")
+        if max_repeats is not None:
+            for shape, count in self.repeated_shapes(max_repeats).items():
+                problems.append(f"repeated {count}x: {shape[:200]}")
+        return problems
+
+def get_budget(view_name=None):
+    """
+    Budget for a view from settings.QUERY_BUDGET
+
+    QUERY_BUDGET holds MAX_QUERIES, MAX_SQL_MS and MAX_REPEATS defaults, an
+    optional VIEWS mapping of view names to overrides, and RAISE to turn
+    violations into errors instead of warnings.
+    """
+    config = getattr(settings, 'QUERY_BUDGET', {})
+    budget = {**DEFAULT_BUDGET, **{key: config[key] for key in DEFAULT_BUDGET if key in config}}
+    budget.update(config.get('VIEWS', {}).get(view_name, {}))
+    return budget
+
+class QueryBudgetMiddleware:
+    """Logs requests whose SQL count, SQL time or repeated query shapes exceed the budget"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+
+        view_name = request.resolver_match.view_name if request.resolver_match else request.path
+        budget = get_budget(view_name)
+        problems = recorder.violations(budget['MAX_QUERIES'], budget['MAX_SQL_MS'], budget['MAX_REPEATS'])
+        if settings.DEBUG:
+            response['Server-Timing'] = f'db;dur={recorder.sql_ms:.1f};desc="{recorder.count} queries"'
+        if problems:
+            message = f"Query budget exceeded for {view_name}: " + '; '.join(problems)
+            if getattr(settings, 'QUERY_BUDGET', {}).get('RAISE', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+@contextmanager
+def assert_query_budget(view_name=None, **overrides):
+    """
+    Test helper failing when the enclosed block exceeds a query budget
+
+    Uses the configured budget for view_name, with keyword overrides such as
+    max_queries=5, max_sql_ms=None or max_repeats=1.
+    """
+    budget = {key.lower(): value for key, value in get_budget(view_name).items()}
+    budget.update(overrides)
+    with QueryRecorder() as recorder:
+        yield recorder
+    problems = recorder.violations(**budget)
+    if problems:
+        raise QueryBudgetExceeded('Query budget exceeded: ' + '; '.join(problems))
@@ -0,0 +1,155 @@
+import logging
+from decimal import Decimal
+import numpy as np
+import pandas as pd
+import yfinance as yf
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from stocks.models import Stock, next_versions
+from .http_cache import QUOTE_TTL_OPEN, market_is_open, market_max_age, quote_is_fresh
+from .fragments import invalidate_quote_panels
+from .live import broadcaster, quote_payload
+from .movers import invalidate_movers
+from .rate_limiter import stock_rate_limiter
+from .upstream import call_upstream
+
+logger = logging.getLogger(__name__)
+
+MAX_QUOTE_SYMBOLS = 300
+QUOTE_FIELDS = ['price', 'previous_close', 'change', 'change_percent', 'updated_at']
+
+def quote_cache_key(symbol):
+    return f'quote_{symbol}'
+
+def quote_cache_timeout(exchange=None):
+    return QUOTE_TTL_OPEN if market_is_open(exchange=exchange) else market_max_age(exchange=exchange)
+
+def parse_symbols(value):
+    """
+    Upper-cased, de-duplicated symbols from a comma-separated list, in request order
+
+    Raises ValueError for a symbol longer than Stock.symbol can store.
+    """
+    symbols = [symbol.strip().upper() for symbol in (value or '').split(',')]
+    max_length = Stock._meta.get_field('symbol').max_length
+    too_long = [symbol for symbol in symbols if len(symbol) > max_length]
+    if too_long:
+        raise ValueError(f'Symbols are at most {max_length} characters: {", ".join(too_long[:5])}')
+    return list(dict.fromkeys(symbol for symbol in symbols if symbol))
+
+def stored_quote(row):
+    price, previous_close, change, change_percent, updated_at = row
+    return {
+        'price': float(price),
+        'previous_close': float(previous_close) if previous_close is not None else None,
+        'change': float(change) if change is not None else None,
+        'change_percent': float(change_percent) if change_percent is not None else None,
+        'updated_at': int(updated_at.timestamp()),
+    }
+
+def fetch_quotes(symbols):
+    """
+    Latest quotes for many symbols from one batched upstream download
+
+    The last two daily closes give the price and the previous close. Symbols
+    the provider returns no closes for are left out.
+    """
+    data = yf.download(symbols, period='5d', interval='1d', group_by='ticker',
+                       auto_adjust=False, threads=True, progress=False, timeout=10)
+    if data is None or data.empty:
+        return {}
+    if not isinstance(data.columns, pd.MultiIndex):
+        data.columns = pd.MultiIndex.from_product([symbols, data.columns])
+    closes = data.xs('Close', axis=1, level=1).reindex(columns=symbols)
+
+    now = timezone.now()
+    quotes = {}
+    for symbol in symbols:
+        series = closes[symbol].dropna().to_numpy(dtype=np.float64)
+        if not len(series):
+            continue
+        price = series[-1]
+        previous_close = series[-2] if len(series) > 1 else None
+        change = price - previous_close if previous_close else None
+        quotes[symbol] = {
+            'price': round(price, 2),
+            'previous_close': round(previous_close, 2) if previous_close else None,
+            'change': round(change, 2) if change is not None else None,
+            'change_percent': round(change / previous_close * 100, 2) if change is not None else None,
+            'updated_at': int(now.timestamp()),
+        }
+    return quotes
+
+def store_quotes(quotes):
+    """Upsert fetched quotes into Stock with one statement; new symbols are named after themselves"""
+    now = timezone.now()
+    decimal = lambda value: Decimal(str(value)) if value is not None else None
+    with transaction.atomic():
+        first_version = next_versions(len(quotes))
+        Stock.objects.bulk_create([
+            Stock(symbol=symbol, name=symbol, current_price=decimal(quote['price']),
+                  previous_close=decimal(quote['previous_close']), change=decimal(quote['change']),
+                  change_percent=decimal(quote['change_percent']), updated_at=now, version=first_version + i)
+            for i, (symbol, quote) in enumerate(quotes.items())
+        ], update_conflicts=True, unique_fields=['symbol'],
+           update_fields=['current_price', 'previous_close', 'change', 'change_percent', 'updated_at', 'version'])
+    # Bulk writes skip the save signals, so let the movers lists rebuild on next
+    # use, invalidate the affected dashboard panels and push the new quotes to
+    # live subscribers here
+    invalidate_movers()
+    invalidate_quote_panels(Stock.objects.filter(symbol__in=list(quotes)).values_list('id', flat=True))
+    for symbol, quote in quotes.items():
+        broadcaster.publish(quote_payload(symbol, quote['price'], quote['change'], quote['change_percent'], now))
+
+def get_quotes(symbols):
+    """
+    Quotes for many symbols with at most one cache round trip, query and upstream call each
+
+    Symbols are served from the shared cache, then from stored quotes still
+    fresh for the market session, and only the rest are fetched upstream in
+    one batch. When the upstream fetch fails, is rate limited or its circuit
+    is open, older stored quotes are returned and flagged as stale.
+
+    Returns:
+        (quotes by symbol, stale symbols, missing symbols)
+    """
+    cached = cache.get_many([quote_cache_key(symbol) for symbol in symbols])
+    quotes = {symbol: cached[quote_cache_key(symbol)] for symbol in symbols if quote_cache_key(symbol) in cached}
+    misses = [symbol for symbol in symbols if symbol not in quotes]
+    if not misses:
+        return quotes, [], []
+
+    stored, exchanges = {}, {}
+    for symbol, exchange, *row in (Stock.objects.filter(symbol__in=misses, current_price__isnull=False)
+                                   .values_list('symbol', 'exchange', 'current_price', 'previous_close',
+                                                'change', 'change_percent', 'updated_at')):
+        stored[symbol], exchanges[symbol] = row, exchange
+    fresh = {symbol: stored_quote(row) for symbol, row in stored.items()
+             if quote_is_fresh(row[-1], exchange=exchanges[symbol])}
+    remaining = [symbol for symbol in misses if symbol not in fresh]
+
+    fetched = {}
+    if remaining:
+        if stock_rate_limiter.is_rate_limited('quotes_batch'):
+            logger.warning(f"Quote batch rate limited, serving stored quotes for {len(remaining)} symbols")
+        else:
+            try:
+                fetched = call_upstream('yfinance', fetch_quotes, remaining)
+            except Exception as e:
+                logger.error(f"Error fetching quotes for {len(remaining)} symbols: {str(e)}")
+        if fetched:
+            store_quotes(fetched)
+
+    new = {**fresh, **fetched}
+    if new:
+        # One lifetime for the batch, the shortest of the exchanges' sessions involved
+        timeout = min(quote_cache_timeout(exchange) for exchange in {exchanges.get(symbol) for symbol in new})
+        cache.set_many({quote_cache_key(symbol): quote for symbol, quote in new.items()}, timeout)
+    quotes.update(fresh)
+    quotes.update(fetched)
+
+    stale = [symbol for symbol in remaining if symbol not in fetched and symbol in stored]
+    quotes.update({symbol: stored_quote(stored[symbol]) for symbol in stale})
+    missing = [symbol for symbol in symbols if symbol not in quotes]
+    return quotes, stale, missing
@@ -1,5 +1,3 @@
-import time
-from functools import wraps
 from datetime import datetime, timedelta
 from django.core.cache import cache
 import logging
@@ -57,31 +55,8 @@ class RateLimiter:
 
             return True
 
-def retry_with_backoff(max_retries=3, initial_delay=1, max_delay=60, exponential_base=2):
-    def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            delay = initial_delay
-            retries = 0
-
-            while retries < max_retries:
-                try:
-                    return func(*args, **kwargs)
-                except Exception as e:
-                    if 'Too Many Requests' not in str(e):
-                        raise e
-
-                    retries += 1
-                    if retries == max_retries:
-                        raise e
-
-                    sleep_time = min(delay * (exponential_base ** (retries - 1)), max_delay)
-                    logger.warning(f"Rate limited. Retrying in {sleep_time} seconds...")
-                    time.sleep(sleep_time)
-
-            return func(*args, **kwargs)
-        return wrapper
-    return decorator
-
 # Global rate limiter instance for stock API
-stock_rate_limiter = RateLimiter(max_requests=5, time_window=60, cache_prefix='stock_api')
\ No newline at end of file
+stock_rate_limiter = RateLimiter(max_requests=5, time_window=60, cache_prefix='stock_api')
+
+# NewsAPI developer plans allow 100 requests per day
+news_rate_limiter = RateLimiter(max_requests=100, time_window=24 * 60 * 60, cache_prefix='news_api')
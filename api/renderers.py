@@ -0,0 +1,34 @@
+import datetime
+from decimal import Decimal
+import msgpack
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from .columnar import to_json_data, to_binary_data
+
+class FastJSONRenderer(JSONRenderer):
+    """JSON renderer that encodes SeriesFrame columns in bulk and maps NaN/inf to null"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return super().render(to_json_data(data), accepted_media_type, renderer_context)
+
+def _msgpack_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return str(value)
+
+class ColumnarMsgpackRenderer(BaseRenderer):
+    """
+    Compact binary responses, selected with ?format=msgpack or Accept: application/x-msgpack
+
+    History series are sent as packed columns (see SeriesFrame.to_binary).
+    """
+    media_type = 'application/x-msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(to_binary_data(data), default=_msgpack_default, use_bin_type=True)
@@ -0,0 +1,197 @@
+import gzip
+import json
+import time
+import logging
+import datetime
+from pathlib import Path
+import pandas as pd
+from django.apps import apps
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from stocks.exchanges import exchange_session
+from stocks.models import PriceBar, StockPrediction
+
+logger = logging.getLogger(__name__)
+
+INTRADAY_INTERVALS = ['1m', '5m', '1h']
+
+DEFAULT_RETENTION = {
+    'BATCH_SIZE': 1000,
+    'ARCHIVE_DIR': Path(settings.BASE_DIR) / 'archive',
+    'POLICIES': {},
+    'ROLLUPS': {},
+}
+
+def retention_config():
+    return {**DEFAULT_RETENTION, **getattr(settings, 'RETENTION', {})}
+
+class JobReport:
+    """Rows processed by one retention step and how fast"""
+
+    def __init__(self, name):
+        self.name = name
+        self.rows = 0
+        self.archived = 0
+        self.start = time.perf_counter()
+        self.seconds = 0.0
+
+    def finish(self):
+        self.seconds = time.perf_counter() - self.start
+        return self
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        archived = f", {self.archived} archived" if self.archived else ''
+        return f"{self.name}: {self.rows} rows{archived} in {self.seconds:.2f}s ({self.rows_per_second:.0f} rows/s)"
+
+def archive_path(model, archive_dir, run_at):
+    directory = Path(archive_dir) / model._meta.label_lower.replace('.', '_')
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory / f"{run_at:%Y%m%dT%H%M%S}.jsonl.gz"
+
+def delete_in_batches(queryset, batch_size, archive_to=None, pause=0, report=None):
+    """
+    Delete the rows of queryset in primary-key batches, one short transaction each
+
+    Args:
+        queryset: Rows to delete
+        batch_size: Rows per batch
+        archive_to: Optional .jsonl.gz path each batch is appended to before deletion
+        pause: Seconds to sleep between batches, giving other writers the lock
+        report: JobReport to accumulate counts into
+    """
+    report = report or JobReport(queryset.model._meta.label)
+    last_pk = None
+    while True:
+        # Resume after the last deleted key so each batch is an index range scan
+        remaining = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        ids = list(remaining.order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            break
+        last_pk = ids[-1]
+        with transaction.atomic():
+            batch = queryset.model.objects.filter(pk__in=ids)
+            if archive_to is not None:
+                with gzip.open(archive_to, 'at', encoding='utf-8') as f:
+                    for row in batch.values():
+                        f.write(json.dumps(row, cls=DjangoJSONEncoder) + '\n')
+                report.archived += len(ids)
+            batch.delete()
+        report.rows += len(ids)
+        if pause:
+            time.sleep(pause)
+    return report
+
+def apply_policies(now=None, pause=0):
+    """
+    Delete (and optionally archive) rows older than each configured policy
+
+    RETENTION['POLICIES'] maps model labels to {'field', 'days', 'archive'}.
+    """
+    config = retention_config()
+    now = now or timezone.now()
+    reports = []
+    for label, policy in config['POLICIES'].items():
+        model = apps.get_model(label)
+        cutoff = now - datetime.timedelta(days=policy['days'])
+        queryset = model.objects.filter(**{f"{policy['field']}__lt": cutoff})
+        archive_to = archive_path(model, config['ARCHIVE_DIR'], now) if policy.get('archive') else None
+        report = delete_in_batches(queryset, config['BATCH_SIZE'], archive_to, pause, JobReport(f"Retain {label}"))
+        reports.append(report.finish())
+    return reports
+
+def rollup_intraday_bars(older_than_days, now=None, batch_size=1000, pause=0):
+    """
+    Replace intraday bars older than the cutoff with one daily bar per stock and day
+
+    Days are the stock's exchange's local trading dates, and rolled-up bars
+    are stamped at local midnight like the provider's daily bars; days that
+    already have a provider daily bar keep it. The intraday rows are deleted
+    either way.
+    """
+    now = now or timezone.now()
+    cutoff = now - datetime.timedelta(days=older_than_days)
+    report = JobReport('Roll up intraday bars')
+    old_bars = PriceBar.objects.filter(interval__in=INTRADAY_INTERVALS, timestamp__lt=cutoff)
+
+    for stock_id, exchange in old_bars.values_list('stock_id', 'stock__exchange').distinct():
+        tz = exchange_session(exchange)['tz']
+        bars = pd.DataFrame(
+            old_bars.filter(stock_id=stock_id).order_by('timestamp')
+            .values_list('timestamp', 'open', 'high', 'low', 'close', 'volume'),
+            columns=['timestamp', 'open', 'high', 'low', 'close', 'volume']
+        )
+        bars['date'] = pd.to_datetime(bars['timestamp'], utc=True).dt.tz_convert(tz).dt.normalize()
+        daily = bars.groupby('date').agg(
+            open=('open', 'first'), high=('high', 'max'), low=('low', 'min'),
+            close=('close', 'last'), volume=('volume', 'sum')
+        )
+        existing = {timestamp.astimezone(tz).date() for timestamp in PriceBar.objects.filter(
+            stock_id=stock_id, interval='1d', timestamp__gte=daily.index.min(),
+            timestamp__lt=daily.index.max() + pd.Timedelta(days=1)
+        ).values_list('timestamp', flat=True)}
+        daily = daily[[day not in existing for day in daily.index.date]]
+
+        PriceBar.objects.bulk_create([
+            PriceBar(stock_id=stock_id, interval='1d', timestamp=day.to_pydatetime(),
+                     open=row.open, high=row.high, low=row.low, close=row.close, volume=int(row.volume))
+            for day, row in daily.iterrows()
+        ], batch_size=batch_size, ignore_conflicts=True)
+        delete_in_batches(old_bars.filter(stock_id=stock_id), batch_size, pause=pause, report=report)
+
+    return report.finish()
+
+def compact_predictions(older_than_days, now=None, batch_size=1000, pause=0):
+    """
+    Keep only the latest prediction per stock, model and target date once it is old
+
+    Every prediction request stores a row, so old target dates accumulate many
+    superseded forecasts; the latest one is what accuracy tracking scores.
+    The latest id of every group is read once, then the old rows are walked
+    in primary-key batches and the superseded ones of each batch deleted.
+    """
+    now = now or timezone.now()
+    cutoff = (now - datetime.timedelta(days=older_than_days)).date()
+    old = StockPrediction.objects.filter(prediction_date__lt=cutoff)
+    latest_ids = {
+        (stock_id, model_type, prediction_date): latest_id
+        for stock_id, model_type, prediction_date, latest_id in
+        old.values('stock_id', 'model_type', 'prediction_date').annotate(latest_id=Max('id'))
+        .values_list('stock_id', 'model_type', 'prediction_date', 'latest_id')
+    }
+    report = JobReport('Compact predictions')
+    last_pk = None
+    while True:
+        remaining = old if last_pk is None else old.filter(pk__gt=last_pk)
+        rows = list(remaining.order_by('pk').values_list('pk', 'stock_id', 'model_type', 'prediction_date')[:batch_size])
+        if not rows:
+            break
+        last_pk = rows[-1][0]
+        # Rows stored since the groups were read are kept
+        ids = [pk for pk, *group in rows if pk < latest_ids.get(tuple(group), pk)]
+        if ids:
+            StockPrediction.objects.filter(pk__in=ids).delete()
+            report.rows += len(ids)
+        if pause:
+            time.sleep(pause)
+    return report.finish()
+
+def run_retention(now=None, pause=0):
+    """Run the configured rollups, then the retention policies; returns a JobReport per step"""
+    config = retention_config()
+    rollups = config['ROLLUPS']
+    reports = []
+    if rollups.get('INTRADAY_BARS_DAYS') is not None:
+        reports.append(rollup_intraday_bars(rollups['INTRADAY_BARS_DAYS'], now, config['BATCH_SIZE'], pause))
+    if rollups.get('PREDICTIONS_DAYS') is not None:
+        reports.append(compact_predictions(rollups['PREDICTIONS_DAYS'], now, config['BATCH_SIZE'], pause))
+    reports += apply_policies(now, pause)
+    for report in reports:
+        logger.info(str(report))
+    return reports
@@ -0,0 +1,50 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from stocks.models import Stock, Watchlist, Portfolio, StockNews, next_versions
+from .movers import update_movers
+from .live import broadcaster, stock_payload
+from .fragments import invalidate_quote_panels, invalidate_shared, invalidate_users
+
+@receiver(post_save, sender=Stock)
+def stock_saved(sender, instance, **kwargs):
+    update_movers(instance)
+    invalidate_quote_panels([instance.pk])
+    if instance.current_price is not None:
+        broadcaster.publish(stock_payload(instance))
+
+@receiver(post_delete, sender=Stock)
+def stock_deleted(sender, instance, **kwargs):
+    update_movers(instance, deleted=True)
+
+@receiver(m2m_changed, sender=Watchlist.stocks.through)
+def watchlist_stocks_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # Membership changes bypass Watchlist.save, so the lists get their new version here
+    if reverse and action == 'pre_clear':
+        # Clearing from the stock side reports no watchlist ids afterwards
+        instance._cleared_watchlists = list(Watchlist.objects.filter(stocks=instance).values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        pks = [instance.pk]
+    elif action == 'post_clear':
+        pks = instance.__dict__.pop('_cleared_watchlists', [])
+    else:
+        pks = pk_set
+    with transaction.atomic():
+        Watchlist.objects.filter(pk__in=pks).update(version=next_versions())
+    user_ids = [instance.user_id] if not reverse else Watchlist.objects.filter(pk__in=pks).values_list('user_id', flat=True)
+    invalidate_users('watchlists', user_ids)
+
+@receiver([post_save, post_delete], sender=Watchlist)
+def watchlist_changed(sender, instance, **kwargs):
+    invalidate_users('watchlists', [instance.user_id])
+
+@receiver([post_save, post_delete], sender=Portfolio)
+def holding_changed(sender, instance, **kwargs):
+    invalidate_users('portfolio', [instance.user_id])
+
+@receiver(post_save, sender=StockNews)
+def news_saved(sender, instance, **kwargs):
+    invalidate_shared('news')
@@ -0,0 +1,143 @@
+import datetime
+import logging
+import numpy as np
+import pandas as pd
+from django.db.models import Max, OuterRef, Subquery
+from django.utils import timezone
+from stocks.models import Portfolio, PortfolioSnapshot, PriceBar, Stock
+from stocks.prices import day_range, trading_dates
+
+logger = logging.getLogger(__name__)
+
+def daily_closes(stock_ids, start, end):
+    """
+    Wide (date x stock_id) frame of stored daily closes, forward-filled across gaps
+
+    Dates are trading dates in each stock's exchange time zone. Each stock is
+    seeded on start with its last close before it, so a stock without a bar
+    early in the range is not valued as if it had no price.
+    """
+    bars = PriceBar.objects.filter(stock_id__in=stock_ids, interval='1d')
+    exchanges = dict(Stock.objects.filter(id__in=stock_ids).values_list('id', 'exchange'))
+    lower, upper = day_range(start, end, set(exchanges.values()))
+    rows = (bars.filter(timestamp__gte=lower, timestamp__lt=upper).order_by('timestamp')
+            .values_list('stock_id', 'timestamp', 'close'))
+    closes = pd.DataFrame(list(rows), columns=['stock_id', 'date', 'close'])
+    # One index probe per stock for its latest bar before the range
+    seeds = dict(Stock.objects.filter(id__in=stock_ids).annotate(
+        seed=Subquery(bars.filter(stock_id=OuterRef('pk'), timestamp__lt=lower)
+                      .order_by('-timestamp').values('close')[:1])
+    ).filter(seed__isnull=False).values_list('id', 'seed'))
+    if closes.empty and not seeds:
+        return pd.DataFrame(columns=list(stock_ids), dtype=float)
+    closes['date'] = trading_dates(closes['date'], closes['stock_id'].map(exchanges))
+    # Bounds widened for other exchanges' zones can take in bars from before
+    # start; the last of those stands in as the stock's seed
+    closes = closes[closes['date'] <= pd.Timestamp(end)]
+    closes['date'] = closes['date'].clip(lower=pd.Timestamp(start))
+    closes['close'] = closes['close'].astype(float)
+    closes = closes.pivot_table(index='date', columns='stock_id', values='close', aggfunc='last')
+    closes = closes.reindex(index=closes.index.union([pd.Timestamp(start)]), columns=list(stock_ids))
+    closes.iloc[0] = closes.iloc[0].fillna(pd.Series(seeds, dtype=float))
+    return closes.ffill()
+
+def compute_snapshots(holdings, closes):
+    """
+    Portfolio value of every user on every date as one matrix product
+
+    Args:
+        holdings: DataFrame with user_id, stock_id, quantity, buy_price and buy_date
+            (date) columns, one row per holding
+        closes: Wide daily closes from daily_closes covering the holdings' stocks
+
+    Returns:
+        Long DataFrame with user_id, date, market_value and invested_value. A holding
+        counts from its buy date; before its stock has a stored close it is
+        valued at its buy price.
+    """
+    dates = closes.index.values.astype('datetime64[D]')
+    users, user_index = np.unique(holdings['user_id'].values, return_inverse=True)
+
+    # (dates x holdings) prices and the mask of holdings already bought on each date
+    prices = closes[holdings['stock_id'].values].to_numpy(dtype=np.float64)
+    buy_price = holdings['buy_price'].to_numpy(dtype=np.float64)
+    prices = np.where(np.isnan(prices), buy_price, prices)
+    held = dates[:, None] >= holdings['buy_date'].values.astype('datetime64[D]')[None, :]
+    quantity = held * holdings['quantity'].to_numpy(dtype=np.float64)
+
+    # (holdings x users) one-hot ownership folds holdings into per-user totals
+    ownership = np.zeros((len(holdings), len(users)))
+    ownership[np.arange(len(holdings)), user_index] = 1
+    market_value = (quantity * prices) @ ownership
+    invested_value = (quantity * buy_price) @ ownership
+
+    snapshots = pd.DataFrame({
+        'user_id': np.tile(users, len(dates)),
+        'date': np.repeat(dates, len(users)),
+        'market_value': market_value.ravel(),
+        'invested_value': invested_value.ravel(),
+    })
+    # Days before a user's first purchase carry no snapshot
+    return snapshots[snapshots['invested_value'] > 0]
+
+def snapshot_portfolios(end=None, since=None):
+    """
+    Store snapshots for every user up to end, continuing from each user's last one
+
+    Users without snapshots are backfilled from their earliest holding. Holdings
+    are taken as they are now, since edits overwrite them in place; pass since
+    to recompute from a date after such changes.
+
+    Returns:
+        Number of snapshots written
+    """
+    end = end or timezone.now().date()
+    holdings = pd.DataFrame(
+        Portfolio.objects.values_list('user_id', 'stock_id', 'quantity', 'buy_price', 'buy_date'),
+        columns=['user_id', 'stock_id', 'quantity', 'buy_price', 'buy_date']
+    )
+    if holdings.empty:
+        return 0
+    holdings['buy_date'] = pd.to_datetime(holdings['buy_date'], utc=True).dt.date
+
+    last_dates = pd.Series(dict(
+        PortfolioSnapshot.objects.values('user_id').annotate(last=Max('date')).values_list('user_id', 'last')
+    ), dtype=object)
+    next_dates = holdings.groupby('user_id')['buy_date'].min()
+    resume = last_dates.reindex(next_dates.index).dropna().map(lambda day: day + datetime.timedelta(days=1))
+    next_dates.loc[resume.index] = resume
+    if since is not None:
+        next_dates = next_dates.clip(upper=since)
+    start = next_dates.min()
+    if start > end:
+        return 0
+
+    closes = daily_closes(holdings['stock_id'].unique(), start, end)
+    if closes.empty:
+        logger.warning(f"No stored closes between {start} and {end}, skipping portfolio snapshots")
+        return 0
+    snapshots = compute_snapshots(holdings, closes)
+    snapshots = snapshots[snapshots['date'].dt.date >= snapshots['user_id'].map(next_dates)]
+
+    PortfolioSnapshot.objects.bulk_create([
+        PortfolioSnapshot(user_id=row.user_id, date=row.date.date(),
+                          market_value=round(row.market_value, 2), invested_value=round(row.invested_value, 2))
+        for row in snapshots.itertuples()
+    ], batch_size=500, update_conflicts=True, unique_fields=['user', 'date'],
+       update_fields=['market_value', 'invested_value'])
+    return len(snapshots)
+
+def portfolio_history(user, start=None, end=None):
+    """A user's snapshots in [start, end] as columnar lists, from one range scan"""
+    snapshots = PortfolioSnapshot.objects.filter(user=user)
+    if start is not None:
+        snapshots = snapshots.filter(date__gte=start)
+    if end is not None:
+        snapshots = snapshots.filter(date__lte=end)
+    rows = list(snapshots.order_by('date').values_list('date', 'market_value', 'invested_value'))
+    dates, market_values, invested_values = zip(*rows) if rows else ((), (), ())
+    return {
+        'dates': [date.isoformat() for date in dates],
+        'market_value': [float(value) for value in market_values],
+        'invested_value': [float(value) for value in invested_values],
+    }
@@ -4,43 +4,50 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
 from stocks.models import Stock
-from django.core.cache import cache
-from datetime import datetime, timedelta
+from stocks.prices import upsert_bars
 import logging
 import asyncio
-import concurrent.futures
-from .rate_limiter import stock_rate_limiter, retry_with_backoff
+import numpy as np
+from .rate_limiter import stock_rate_limiter
+from .upstream import UpstreamUnavailable, acached_upstream, cached_upstream, request_deadline
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from .http_cache import conditional_quote, set_cache_headers
+from .charts import CHART_RANGES, DEFAULT_CHART_RANGE, chart_series, chart_width
+from .columnar import SeriesFrame
+from .quotes import MAX_QUOTE_SYMBOLS, QUOTE_FIELDS, get_quotes, parse_symbols
+from .live import quote_events, quote_payload
 
 logger = logging.getLogger(__name__)
 
-@retry_with_backoff(max_retries=3, initial_delay=2, max_delay=30)
-def get_stock_info(symbol):
-    """Helper function to fetch stock info with caching and rate limiting"""
-    cache_key = f'stock_info_{symbol}'
-    cached_data = cache.get(cache_key)
-    
-    if cached_data:
-        # Check if cache is still fresh (less than 5 minutes old)
-        if (datetime.now() - cached_data['timestamp']).seconds < 300:
-            return cached_data['data']
-    
-    # Check rate limit before making API call
+# Seconds stock info and history are served from the cache before being fetched again
+STOCK_INFO_FRESH_FOR = 300
+
+def fetch_stock_info(symbol):
+    """Stock info from Yahoo Finance, or None for unknown symbols"""
     if stock_rate_limiter.is_rate_limited(symbol):
-        raise Exception('Too Many Requests')
-        
-    try:
-        stock = yf.Ticker(symbol)
-        info = stock.info
-        if info and 'symbol' in info:
-            cache_data = {
-                'timestamp': datetime.now(),
-                'data': info
-            }
-            cache.set(cache_key, cache_data, timeout=600)  # Cache for 10 minutes max
-            return info
-    except Exception as e:
-        logger.error(f"Error fetching stock info for {symbol}: {str(e)}")
-        raise e
+        raise UpstreamUnavailable('yfinance rate limited')
+    info = yf.Ticker(symbol).info
+    return info if info and 'symbol' in info else None
+
+def fetch_stock_history(symbol):
+    return yf.Ticker(symbol).history(period='1y', timeout=10)
+
+def get_stock_info(symbol, deadline=None):
+    """
+    Helper function to fetch stock info with caching, rate limiting and a stale fallback
+
+    Pass the request's deadline when fetching several symbols, so together
+    they stay within one request budget.
+
+    Returns:
+        (info, stale) where stale is True if Yahoo Finance is unavailable and
+        the last cached info was returned instead
+    """
+    return cached_upstream('yfinance', f'yfinance_info_{symbol}', fetch_stock_info, symbol,
+                           fresh_for=STOCK_INFO_FRESH_FOR, deadline=deadline)
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -50,11 +57,12 @@ def search_stocks(request):
         if len(query) < 2:
             return Response([], status=status.HTTP_200_OK)
 
-        # Search for stocks using yfinance
+        # Search for stocks using yfinance, within one upstream budget for the request
+        deadline = request_deadline()
         matching_stocks = []
         try:
             # Try exact symbol match first
-            info = get_stock_info(query)
+            info, _ = get_stock_info(query, deadline)
             if info:
                 matching_stocks.append({
                     'symbol': info['symbol'],
@@ -87,7 +95,7 @@ def search_stocks(request):
             for symbol, name in common_stocks.items():
                 if query in symbol or query.lower() in name.lower():
                     try:
-                        info = get_stock_info(symbol)
+                        info, _ = get_stock_info(symbol, deadline)
                         if info:
                             matching_stocks.append({
                             'symbol': symbol,
@@ -109,37 +117,37 @@ def search_stocks(request):
                         status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 async def fetch_stock_data(symbol):
-    """Asynchronously fetch stock data"""
+    """
+    Asynchronously fetch stock info and a year of daily history within one request deadline
+
+    Info marked 'stale' was served from the cache while Yahoo Finance was unavailable.
+
+    Returns:
+        (info, history DataFrame indexed by exchange-local timestamp), or (None, None)
+    """
     try:
-        info = get_stock_info(symbol)
+        deadline = request_deadline()
+        info, info_stale = await acached_upstream('yfinance', f'yfinance_info_{symbol}', fetch_stock_info, symbol,
+                                                  fresh_for=STOCK_INFO_FRESH_FOR, deadline=deadline)
         if not info or 'symbol' not in info:
             return None, None
 
-        # Use ThreadPoolExecutor for CPU-bound operations
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            stock = yf.Ticker(symbol)
-            future = executor.submit(lambda: stock.history(period='1y'))
-            hist = future.result(timeout=10)  # 10 seconds timeout
-
-        historical_data = {
-            'dates': hist.index.strftime('%Y-%m-%d').tolist(),
-            'prices': hist['Close'].tolist(),
-            'volumes': hist['Volume'].tolist()
-        }
-        
-        return info, historical_data
+        hist, history_stale = await acached_upstream('yfinance', f'yfinance_history_{symbol}', fetch_stock_history,
+                                                     symbol, fresh_for=STOCK_INFO_FRESH_FOR, deadline=deadline)
+        return {**info, 'stale': info_stale or history_stale}, hist
     except Exception as e:
         logger.error(f"Error in fetch_stock_data for {symbol}: {str(e)}")
         return None, None
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@conditional_quote(variant=lambda request: request.accepted_renderer.format)
 def get_stock_data(request, symbol):
     try:
         # Run async function in sync context
-        info, historical_data = asyncio.run(fetch_stock_data(symbol))
+        info, history = asyncio.run(fetch_stock_data(symbol))
         
-        if not info or not historical_data:
+        if not info or history is None:
             return Response({'error': 'Stock not found or data unavailable'}, 
                            status=status.HTTP_404_NOT_FOUND)
 
@@ -155,9 +163,16 @@ def get_stock_data(request, symbol):
             'pe_ratio': info.get('trailingPE', 0),
             'eps': info.get('trailingEps', 0),
             'dividend_yield': info.get('dividendYield', 0),
-            'historical_data': historical_data
+            'historical_data': SeriesFrame(history.index, prices=history['Close'], volumes=history['Volume']),
+            'stale': info.get('stale', False)
         }
 
+        if response_data['stale']:
+            # Keep the stored quote, and caches, from treating old data as fresh
+            response = Response(response_data, status=status.HTTP_200_OK)
+            response['Cache-Control'] = 'no-cache'
+            return response
+
         # Update or create stock in database
         stock_obj, created = Stock.objects.update_or_create(
             symbol=info['symbol'],
@@ -169,10 +184,105 @@ def get_stock_data(request, symbol):
                 'change_percent': info.get('regularMarketChangePercent', 0)
             }
         )
+        # Keep the daily bars from the last stored one on, which may have been a partial session
+        last_bar = stock_obj.bars.filter(interval='1d').order_by('-timestamp').values_list('timestamp', flat=True).first()
+        upsert_bars(stock_obj, history if last_bar is None else history[history.index >= last_bar])
 
         return Response(response_data, status=status.HTTP_200_OK)
 
     except Exception as e:
         logger.error(f"Error fetching stock data for {symbol}: {str(e)}")
         return Response({'error': 'An error occurred while fetching stock data'}, 
-                        status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+                        status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_stock_chart(request, symbol):
+    """Stored price history for one chart range (?range=), downsampled to ?width= points"""
+    chart_range = request.GET.get('range', DEFAULT_CHART_RANGE)
+    if chart_range not in CHART_RANGES:
+        return Response({'error': f"Unknown range, expected one of {', '.join(CHART_RANGES)}"},
+                        status=status.HTTP_400_BAD_REQUEST)
+    try:
+        width = chart_width(request.GET.get('width'))
+    except ValueError:
+        return Response({'error': 'width must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+    stock = Stock.objects.filter(symbol=symbol.upper()).first()
+    chart = chart_series(stock, chart_range, width) if stock else None
+    if chart is None:
+        return Response({'error': 'No price history available'}, status=status.HTTP_404_NOT_FOUND)
+
+    etag = f'"{stock.symbol}-{chart_range}-{width}-{request.accepted_renderer.format}-{chart["version"]}"'
+    not_modified = get_conditional_response(
+        request, etag=etag, last_modified=int(chart['last_modified'].timestamp())
+    )
+    if not_modified is not None:
+        return set_cache_headers(not_modified, etag, chart['last_modified'], stock.exchange)
+
+    response = Response({
+        'symbol': stock.symbol,
+        'range': chart_range,
+        'interval': chart['interval'],
+        'source_points': chart['source_points'],
+        'historical_data': chart['historical_data'],
+    }, status=status.HTTP_200_OK)
+    return set_cache_headers(response, etag, chart['last_modified'], stock.exchange)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def batch_quotes(request):
+    """
+    Quotes for ?symbols=A,B,C in one response
+
+    Each field is one column aligned with 'symbols' (null where unknown);
+    'stale' lists symbols served from older stored quotes and 'missing' those
+    with no quote at all.
+    """
+    try:
+        symbols = parse_symbols(request.GET.get('symbols'))
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    if not symbols:
+        return Response({'error': 'symbols is required'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(symbols) > MAX_QUOTE_SYMBOLS:
+        return Response({'error': f'At most {MAX_QUOTE_SYMBOLS} symbols per request'},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    quotes, stale, missing = get_quotes(symbols)
+    data = {'symbols': symbols}
+    for field in QUOTE_FIELDS:
+        values = [quotes[symbol][field] if symbol in quotes else None for symbol in symbols]
+        data[field] = np.array([float('nan') if value is None else value for value in values], dtype=np.float64)
+    data['stale'] = stale
+    data['missing'] = missing
+    return Response(data, status=status.HTTP_200_OK)
+
+async def quote_stream(request):
+    """
+    Server-sent quote updates for ?symbols=A,B,C (see api.live.quote_events)
+
+    The stream stays open, so it is only served through the ASGI application.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'error': 'Live quotes are only available through the ASGI server'}, status=501)
+    is_authenticated = await sync_to_async(lambda: request.user.is_authenticated)()
+    if not is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+    try:
+        symbols = parse_symbols(request.GET.get('symbols'))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    if not symbols or len(symbols) > MAX_QUOTE_SYMBOLS:
+        return JsonResponse({'error': f'Between 1 and {MAX_QUOTE_SYMBOLS} symbols are required'}, status=400)
+
+    rows = await sync_to_async(list)(
+        Stock.objects.filter(symbol__in=symbols, current_price__isnull=False)
+        .values_list('symbol', 'current_price', 'change', 'change_percent', 'updated_at')
+    )
+    response = StreamingHttpResponse(quote_events(symbols, [quote_payload(*row) for row in rows]),
+                                     content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Keep reverse proxies from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
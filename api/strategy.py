@@ -1,5 +1,6 @@
 import pandas as pd
 import numpy as np
+from .columnar import SeriesFrame
 
 def enhanced_pullback_strategy(df, long_ma=50, short_ma=20, stop_loss_pct=0.02):
     """
@@ -77,11 +78,11 @@ def enhanced_pullback_strategy(df, long_ma=50, short_ma=20, stop_loss_pct=0.02):
         'loss_trades': int(loss_trades),
         'win_rate': round(win_trades / (win_trades + loss_trades) * 100, 2) if (win_trades + loss_trades) > 0 else 0,
         'signals': signals,
-        'data': {
-            'dates': df.index.strftime('%Y-%m-%d').tolist(),
-            'close': df['close'].tolist(),
-            'long_ma': df['long_ma'].tolist(),
-            'short_ma': df['short_ma'].tolist(),
-            'position': df['position'].tolist(),
-        }
+        'data': SeriesFrame(
+            df.index,
+            close=df['close'],
+            long_ma=df['long_ma'],
+            short_ma=df['short_ma'],
+            position=df['position'],
+        )
     }
\ No newline at end of file
@@ -0,0 +1,102 @@
+from django.db.models import Q
+from stocks.models import Stock, Watchlist, current_version
+from .pagination import estimate_count, next_page_link
+from .portfolio import valued_holdings
+
+# Response header carrying the cursor for full (non-delta) responses
+CURSOR_HEADER = 'X-Sync-Cursor'
+
+def parse_since(value):
+    """The since cursor as a non-negative int, None when absent; ValueError if malformed"""
+    if value in (None, ''):
+        return None
+    since = int(value)
+    if since < 0:
+        raise ValueError('since must not be negative')
+    return since
+
+# Response header with the total row estimate requested by ?count=1
+COUNT_HEADER = 'X-Total-Count-Estimate'
+
+def list_headers(request, queryset, page, cursor):
+    """
+    Headers of a full listing: its sync cursor, a Link to the next page, and
+    with ?count=1 an estimate of the total rows
+    """
+    headers = {CURSOR_HEADER: str(cursor)}
+    if page.next_cursor:
+        headers['Link'] = next_page_link(request, page.next_cursor)
+    if request.GET.get('count'):
+        headers[COUNT_HEADER] = str(estimate_count(queryset))
+    return headers
+
+def stock_quote(stock):
+    return {
+        'symbol': stock.symbol,
+        'name': stock.name,
+        'current_price': stock.current_price,
+        'change': stock.change,
+        'change_percent': stock.change_percent
+    }
+
+def holding_row(item):
+    return {
+        'id': item.id,
+        'symbol': item.stock.symbol,
+        'name': item.stock.name,
+        'quantity': item.quantity,
+        'buy_price': float(item.buy_price),
+        'current_price': float(item.stock.current_price) if item.stock.current_price else None,
+        'current_value': float(item.current_value),
+        'invested_value': float(item.invested_value),
+        'profit_loss': float(item.profit_loss),
+        'profit_loss_percent': float(item.profit_loss_percent)
+    }
+
+def watchlist_changes(user, since):
+    """
+    What changed in a user's watchlists after version since
+
+    The cursor is read before the rows, so a change committed meanwhile is
+    sent again next time rather than missed.
+
+    Returns:
+        Dictionary with the new 'cursor', every 'watchlist_ids' (lists missing
+        from it were deleted), the changed 'watchlists' with their full symbol
+        lists, and 'stocks' holding the quotes that changed or that belong to
+        a changed list
+    """
+    cursor = current_version()
+    watchlists = Watchlist.objects.filter(user=user)
+    watchlist_ids = list(watchlists.order_by('id').values_list('id', flat=True))
+    changed = list(watchlists.filter(version__gt=since).order_by('id').prefetch_related('stocks'))
+    stocks = (Stock.objects.filter(watchlist__user=user)
+              .filter(Q(version__gt=since) | Q(watchlist__in=[watchlist.id for watchlist in changed]))
+              .distinct().order_by('symbol'))
+    return {
+        'cursor': cursor,
+        'watchlist_ids': watchlist_ids,
+        'watchlists': [{
+            'id': watchlist.id,
+            'name': watchlist.name,
+            'symbols': sorted(stock.symbol for stock in watchlist.stocks.all())
+        } for watchlist in changed],
+        'stocks': [stock_quote(stock) for stock in stocks],
+    }
+
+def portfolio_changes(user, since):
+    """
+    Holdings whose row or stock quote changed after version since
+
+    Returns:
+        Dictionary with the new 'cursor', every 'holding_ids' (holdings
+        missing from it were sold) and the changed 'holdings'
+    """
+    cursor = current_version()
+    holdings = valued_holdings(user)
+    return {
+        'cursor': cursor,
+        'holding_ids': list(holdings.order_by('id').values_list('id', flat=True)),
+        'holdings': [holding_row(item) for item in
+                     holdings.filter(Q(version__gt=since) | Q(stock__version__gt=since))],
+    }
@@ -1,12 +1,21 @@
-from django.test import TestCase, Client
+from django.test import TestCase, SimpleTestCase, Client, override_settings
+from django.http import HttpResponse
 from django.urls import reverse
 from django.contrib.auth.models import User
+from django.utils import timezone
 from rest_framework.test import APITestCase
 from rest_framework import status
 from unittest.mock import patch, MagicMock
-from stocks.models import Stock, Watchlist, Portfolio, StockNews, StockPrediction, TradeSignal
+from stocks.models import Stock, Watchlist, Portfolio, StockNews, StockPrediction, TradeSignal, PriceBar
 from decimal import Decimal
 import json
+import datetime
+from zoneinfo import ZoneInfo
+import os
+import tempfile
+import time
+import numpy as np
+import pandas as pd
 import yfinance as yf
 
 class StockDataAPITests(APITestCase):
@@ -169,7 +178,1312 @@ class PredictionAPITests(APITestCase):
         }
         
         url = reverse('api:prediction', args=['AAPL'])
-        response = self.client.get(url)
+        response = self.client.get(url, {'sync': 1})
         
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn('predictions', response.data)
+
+
+class OnlinePredictionTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        store_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(store_dir.cleanup)
+        settings_override = override_settings(FEATURE_STORE_DIR=store_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        
+        dates = pd.date_range(end=datetime.datetime(2024, 6, 28), periods=400, freq='D')
+        close = 100 + np.cumsum(np.sin(np.arange(400) / 7.0))
+        self.df = pd.DataFrame({'close': close}, index=dates)
+    
+    def test_rls_matches_least_squares(self):
+        from api.prediction import RecursiveLeastSquares
+        rng = np.random.default_rng(0)
+        X = rng.normal(size=(300, 4))
+        y = 1.5 + X @ np.array([0.5, -2.0, 1.0, 3.0])
+        
+        rls = RecursiveLeastSquares(4, forgetting=1.0, delta=1e6)
+        for x_row, y_row in zip(X, y):
+            rls.partial_fit(x_row, y_row)
+        
+        np.testing.assert_allclose(rls.coef, [1.5, 0.5, -2.0, 1.0, 3.0], atol=1e-3)
+    
+    def test_online_prediction_only_feeds_new_bars(self):
+        from api.prediction import predict_stock_price_online
+        
+        first = predict_stock_price_online(self.df.iloc[:-5], 'AAPL', days_ahead=3)
+        seen = first['model_performance']['observations']
+        second = predict_stock_price_online(self.df, 'AAPL', days_ahead=3)
+        
+        self.assertEqual(len(second['predictions']), 3)
+        self.assertEqual(second['model_performance']['observations'], seen + 5)
+
+
+class PooledPredictionTests(TestCase):
+    def test_per_symbol_intercepts_recovered(self):
+        from api.pooled_prediction import PooledLinearModel
+        rng = np.random.default_rng(1)
+        X = rng.normal(size=(600, 3))
+        groups = np.repeat(np.arange(3), 200)
+        y = X @ np.array([0.2, -0.1, 0.4]) + np.array([0.01, -0.02, 0.03])[groups]
+        
+        model = PooledLinearModel(per_symbol_intercepts=True).fit(X, y, groups)
+        
+        np.testing.assert_allclose(model.coef, [0.2, -0.1, 0.4], atol=1e-8)
+        np.testing.assert_allclose(model.group_intercepts, [0.01, -0.02, 0.03], atol=1e-8)
+    
+    def test_predict_universe(self):
+        from api.pooled_prediction import predict_universe
+        dates = pd.date_range(end=datetime.datetime(2024, 6, 28), periods=300, freq='D')
+        histories = {
+            symbol: pd.DataFrame({'close': base + np.cumsum(np.sin(np.arange(300) / period))}, index=dates)
+            for symbol, base, period in [('AAPL', 150, 5.0), ('MSFT', 300, 9.0)]
+        }
+        
+        results = predict_universe(histories, per_symbol_intercepts=True)
+        
+        self.assertEqual(set(results), {'AAPL', 'MSFT'})
+        self.assertIn('predicted_price', results['AAPL'])
+    
+    def test_pooled_model_type_predicts_from_every_stored_stock(self):
+        from api.analysis import prediction_analysis
+        from stocks.prices import upsert_bars
+        dates = pd.date_range(end=timezone.now().date(), periods=300, freq='D', tz='UTC')
+        for symbol, base, period in [('AAPL', 150, 5.0), ('MSFT', 300, 9.0), ('IBM', 120, 7.0)]:
+            close = base + np.cumsum(np.sin(np.arange(300) / period))
+            stock = Stock.objects.create(symbol=symbol, name=symbol, exchange='NYSE')
+            upsert_bars(stock, pd.DataFrame({'Open': close, 'High': close, 'Low': close, 'Close': close,
+                                             'Volume': 1000}, index=dates))
+        
+        results = prediction_analysis('AAPL', model_type='pooled')
+        
+        self.assertEqual(results['model_type'], 'pooled')
+        self.assertEqual(results['model_performance']['symbols'], 3)
+        self.assertEqual(len(results['predictions']), 1)
+        self.assertTrue(StockPrediction.objects.filter(stock__symbol='AAPL', model_type='pooled').exists())
+
+
+class ForecasterTests(TestCase):
+    def setUp(self):
+        dates = pd.date_range(end=datetime.datetime(2024, 6, 28), periods=400, freq='D')
+        close = 100 + np.cumsum(np.sin(np.arange(400) / 7.0))
+        self.df = pd.DataFrame({'close': close}, index=dates)
+    
+    def test_model_types_are_honored(self):
+        from api.prediction import predict_stock_price
+        for model_type, name in [('ridge', 'ridge'), ('arima', 'ar'), ('lstm', 'gbm'), ('ensemble', 'ensemble')]:
+            results = predict_stock_price(self.df, days_ahead=2, model_type=model_type)
+            self.assertEqual(results['model_type'], name)
+            self.assertEqual(len(results['predictions']), 2)
+    
+    def test_unknown_model_type(self):
+        from api.forecasters import get_forecaster
+        with self.assertRaises(ValueError):
+            get_forecaster('transformer')
+    
+    def test_ensemble_drops_slow_member(self):
+        import time
+        from api.forecasters import EnsembleForecaster, RidgeForecaster
+        from api.prediction import prepare_features
+        
+        class SlowForecaster(RidgeForecaster):
+            name = 'slow'
+            
+            def predict(self, frame):
+                time.sleep(0.5)
+                return np.zeros(len(frame))
+        
+        frame = prepare_features(self.df)
+        ensemble = EnsembleForecaster(members=[RidgeForecaster(), SlowForecaster(latency_budget=0.05)])
+        ensemble.fit(frame)
+        ensemble.weights = np.array([0.5, 0.5])
+        
+        fast_only = ensemble.members[0].predict(frame.iloc[[-1]])
+        np.testing.assert_allclose(ensemble.predict(frame.iloc[[-1]]), fast_only)
+
+
+class PredictionAccuracyTests(TestCase):
+    def setUp(self):
+        self.stock = Stock.objects.create(symbol='AAPL', name='Apple Inc.')
+        for day, price in [(3, '101.00'), (4, '99.00'), (6, '104.00'), (20, '110.00')]:
+            StockPrediction.objects.create(
+                stock=self.stock,
+                model_type='ridge',
+                prediction_date=datetime.date(2024, 6, day),
+                predicted_price=Decimal(price),
+                confidence=Decimal('50.00')
+            )
+        self.closes = pd.DataFrame({
+            'symbol': ['AAPL'] * 4,
+            'date': pd.to_datetime(['2024-06-03', '2024-06-04', '2024-06-05', '2024-06-07']),
+            'close': [100.0, 100.0, 102.0, 103.0],
+        })
+    
+    def test_matured_predictions_are_scored(self):
+        from api.accuracy import evaluate_predictions
+        from stocks.models import PredictionAccuracy
+        
+        result = evaluate_predictions(self.closes, today=datetime.date(2024, 6, 21))
+        
+        # June 20 is past the last stored close, so it stays pending
+        self.assertEqual(result['evaluated'], 3)
+        self.assertTrue(StockPrediction.objects.filter(prediction_date='2024-06-20', evaluated_at__isnull=True).exists())
+        june_6 = StockPrediction.objects.get(prediction_date='2024-06-06')
+        self.assertEqual(june_6.realized_price, Decimal('102.00'))
+        self.assertEqual(june_6.error, Decimal('2.00'))
+        
+        accuracy = PredictionAccuracy.objects.get(stock=self.stock, model_type='ridge')
+        self.assertEqual(accuracy.sample_count, 3)
+        self.assertEqual(accuracy.mae, Decimal('1.33'))
+    
+    def test_stored_and_fetched_closes_score_alike(self):
+        from api.accuracy import evaluate_predictions, fetch_closes
+        from stocks.prices import upsert_bars
+        stock = Stock.objects.create(symbol='RELIANCE', name='Reliance Industries', exchange='NSE')
+        dates = pd.date_range('2026-01-05', periods=5, freq='B', tz='Asia/Kolkata')
+        history = pd.DataFrame({'Open': 1.0, 'High': 1.0, 'Low': 1.0, 'Close': [10.0, 11.0, 12.0, 13.0, 14.0],
+                                'Volume': 1}, index=dates)
+        upsert_bars(stock, history)
+        for day in range(5, 10):
+            StockPrediction.objects.create(stock=stock, model_type='ridge', prediction_date=datetime.date(2026, 1, day),
+                                           predicted_price=Decimal('12.00'), confidence=Decimal('50.00'))
+        predictions = StockPrediction.objects.filter(stock=stock).order_by('prediction_date')
+        
+        evaluate_predictions(today=datetime.date(2026, 1, 12))
+        stored = list(predictions.values_list('prediction_date', 'realized_price'))
+        self.assertEqual([price for _, price in stored], [10, 11, 12, 13, 14])
+        
+        predictions.update(realized_price=None, error=None, abs_pct_error=None, evaluated_at=None)
+        # Batches mixing exchanges come back indexed in UTC
+        download = pd.concat({'Close': history[['Close']].rename(columns={'Close': 'RELIANCE'})}, axis=1)
+        download.index = download.index.tz_convert('UTC')
+        with patch('api.accuracy.yf.download', return_value=download):
+            closes = fetch_closes({'RELIANCE'}, datetime.date(2026, 1, 1), datetime.date(2026, 1, 12))
+        evaluate_predictions(closes, today=datetime.date(2026, 1, 12))
+        self.assertEqual(list(predictions.values_list('prediction_date', 'realized_price')), stored)
+    
+    def test_pairs_leaving_the_window_lose_their_aggregate(self):
+        from api.accuracy import evaluate_predictions, refresh_accuracy
+        from stocks.models import PredictionAccuracy
+        evaluate_predictions(self.closes, today=datetime.date(2024, 6, 21))
+        
+        self.assertEqual(refresh_accuracy(window_days=30, today=datetime.date(2024, 8, 1)), 0)
+        self.assertFalse(PredictionAccuracy.objects.exists())
+    
+    @patch('api.analysis.predict_stock_price')
+    def test_non_finite_confidence_is_stored_as_zero(self, predict):
+        from api.analysis import prediction_analysis
+        predict.return_value = {
+            'model_type': 'ridge',
+            'predictions': [{'date': datetime.date(2024, 7, 1), 'predicted_price': 100.0}],
+            'model_performance': {'confidence': float('nan')},
+        }
+        prediction_analysis('AAPL')
+        self.assertEqual(StockPrediction.objects.get(prediction_date='2024-07-01').confidence, 0)
+
+
+
+class FeatureStoreTests(TestCase):
+    def setUp(self):
+        store_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(store_dir.cleanup)
+        self.root = store_dir.name
+        
+        dates = pd.date_range(end=datetime.datetime(2024, 6, 28), periods=320, freq='D')
+        close = 100 + np.cumsum(np.sin(np.arange(320) / 7.0))
+        self.df = pd.DataFrame({'close': close}, index=dates)
+    
+    def test_incremental_append_matches_full_build(self):
+        from api.feature_store import FeatureStore
+        incremental = FeatureStore(self.root + '/incremental')
+        full = FeatureStore(self.root + '/full')
+        
+        self.assertEqual(incremental.append('AAPL', self.df.iloc[:300]), 1)
+        self.assertEqual(incremental.append('AAPL', self.df.iloc[:300]), 1)
+        self.assertEqual(incremental.append('AAPL', self.df), 2)
+        full.append('AAPL', self.df)
+        
+        grown, rebuilt = incremental.load('AAPL'), full.load('AAPL')
+        self.assertEqual(len(grown), 320)
+        np.testing.assert_allclose(grown.features, rebuilt.features, rtol=1e-5, equal_nan=True)
+    
+    def test_training_arrays_are_views(self):
+        from api.feature_store import FeatureStore
+        store = FeatureStore(self.root)
+        store.append('AAPL', self.df)
+        stored = store.load('AAPL')
+        
+        X, y = stored.training_arrays()
+        
+        self.assertTrue(np.shares_memory(X, stored.features))
+        self.assertEqual(len(X), len(y))
+        self.assertFalse(np.isnan(X).any())
+        self.assertEqual(y[-1], stored.close[-1])
+    
+    def test_training_arrays_drop_non_finite_rows(self):
+        from api.feature_store import FeatureStore
+        store = FeatureStore(self.root)
+        df = self.df.copy()
+        # A flat stretch leaves the 14-bar RSI undefined after the warm-up
+        df.iloc[250:270, 0] = 100.0
+        store.append('AAPL', df)
+        stored = store.load('AAPL')
+        self.assertTrue(np.isnan(stored.features[stored.first_valid:]).any())
+        
+        X, y = stored.training_arrays()
+        self.assertTrue(np.isfinite(X).all())
+        self.assertEqual(len(X), len(y))
+    
+    def test_append_discards_rows_of_an_unfinished_append(self):
+        import os
+        from api.feature_store import FeatureStore
+        store = FeatureStore(self.root)
+        store.append('AAPL', self.df.iloc[:300])
+        # A crash after the data files were appended but before the metadata
+        for name in ['index.i64', 'close.f64', 'features.f32']:
+            with open(os.path.join(self.root, 'AAPL', name), 'ab') as f:
+                f.write(b'\0' * 24)
+        store.append('AAPL', self.df)
+        
+        stored = store.load('AAPL')
+        self.assertEqual(os.path.getsize(os.path.join(self.root, 'AAPL', 'close.f64')), 320 * 8)
+        np.testing.assert_allclose(stored.close, self.df['close'].to_numpy())
+
+
+class PortfolioValuationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        for i in range(20):
+            stock = Stock.objects.create(
+                symbol=f'SYM{i}',
+                name=f'Stock {i}',
+                current_price=Decimal('110.00') if i % 2 else None
+            )
+            Portfolio.objects.create(user=self.user, stock=stock, quantity=2, buy_price=Decimal('100.00'))
+    
+    def test_valuation_uses_constant_queries(self):
+        from api.portfolio import portfolio_valuation
+        
+        with self.assertNumQueries(2):
+            valuation = portfolio_valuation(self.user)
+            for item in valuation['portfolio_items']:
+                item.stock.symbol
+        
+        self.assertEqual(valuation['total_investment'], Decimal('4000.00'))
+        self.assertEqual(valuation['current_value'], Decimal('2200.00'))
+        self.assertEqual(valuation['profit_loss'], Decimal('-1800.00'))
+        priced = valuation['portfolio_items'].get(stock__symbol='SYM1')
+        self.assertEqual(priced.profit_loss_percent, Decimal('10.00'))
+
+
+class NewsIngestionTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.watchlist = Watchlist.objects.create(user=self.user, name='Tech')
+        self.stocks = [
+            Stock.objects.create(symbol=f'SYM{i}', name=f'Company Number {i} Holdings')
+            for i in range(40)
+        ]
+        self.watchlist.stocks.add(*self.stocks)
+        Stock.objects.create(symbol='UNTRACKED', name='Untracked Inc')
+        self.articles = [
+            {
+                'title': f'SYM{i} beats estimates',
+                'description': f'Company Number {i} Holdings reported earnings',
+                'url': f'https://news.example.com/{i}',
+                'source': {'name': 'Example'},
+                'publishedAt': '2024-06-01T12:00:00Z'
+            }
+            for i in range(40)
+        ]
+    
+    def test_ingestion_batches_and_deduplicates(self):
+        from api.news import FakeNewsApiClient, ingest_news, MAX_QUERY_LENGTH
+        
+        client = FakeNewsApiClient(self.articles + self.articles[:5])
+        result = ingest_news(client=client)
+        
+        self.assertLess(result['requests'], len(self.stocks))
+        self.assertTrue(all(len(query) <= MAX_QUERY_LENGTH for query in client.queries))
+        self.assertFalse(any('UNTRACKED' in query for query in client.queries))
+        self.assertEqual(result['stored'], 40)
+        self.assertEqual(StockNews.objects.get(url='https://news.example.com/7').stock.symbol, 'SYM7')
+        
+        # Rerunning stores nothing new
+        result = ingest_news(client=FakeNewsApiClient(self.articles))
+        self.assertEqual(result['stored'], 0)
+        self.assertEqual(StockNews.objects.count(), 40)
+
+
+class DatabaseProfileTests(TestCase):
+    def test_sqlite_connections_are_tuned(self):
+        from django.db import connection
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite profile only')
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], REPLICA_READ_VIEWS=['dashboard:news'], REPLICA_STICKY_SECONDS=60)
+class ReplicaRoutingTests(SimpleTestCase):
+    def test_reads_use_replica_until_a_write(self):
+        from tradeicon.db_router import PrimaryReplicaRouter, read_from_replica
+        router = PrimaryReplicaRouter()
+        
+        self.assertIsNone(router.db_for_read(Stock))
+        with read_from_replica():
+            self.assertEqual(router.db_for_read(Stock), 'replica')
+            self.assertEqual(router.db_for_write(Stock), 'default')
+            self.assertIsNone(router.db_for_read(Stock))
+    
+    def test_session_sticks_to_primary_after_write(self):
+        from django.test import RequestFactory
+        from django.urls import resolve
+        from tradeicon.db_router import PrimaryReplicaRouter, ReplicaRoutingMiddleware
+        router = PrimaryReplicaRouter()
+        session = {}
+        
+        def request(method, view=lambda request: None):
+            routed = []
+            def get_response(request):
+                middleware.process_view(request, None, (), {})
+                routed.append(router.db_for_read(Stock))
+                view(request)
+                return HttpResponse()
+            middleware = ReplicaRoutingMiddleware(get_response)
+            request = getattr(RequestFactory(), method)('/news/')
+            request.session = session
+            request.resolver_match = resolve('/news/')
+            middleware(request)
+            return routed[0]
+        
+        self.assertEqual(request('get'), 'replica')
+        self.assertIsNone(request('post', lambda request: router.db_for_write(Stock)))
+        self.assertIsNone(request('get'))
+        self.assertIsNone(router.db_for_read(Stock))
+
+
+class RetentionTests(TestCase):
+    def setUp(self):
+        from stocks.models import PriceBar
+        self.archive_dir = tempfile.mkdtemp()
+        self.now = timezone.make_aware(datetime.datetime(2024, 6, 1, 12))
+        self.stock = Stock.objects.create(symbol='RELIANCE', name='Reliance Industries', exchange='NSE')
+        self.ist = ZoneInfo('Asia/Kolkata')
+        
+        # Two old days of hourly bars in the NSE session (03:45-10:00 UTC), one of
+        # which already has a provider daily bar, stamped at IST midnight
+        for day in [1, 2]:
+            for hour in range(4, 11):
+                PriceBar.objects.create(
+                    stock=self.stock, interval='1h', volume=100,
+                    timestamp=timezone.make_aware(datetime.datetime(2024, 3, day, hour)),
+                    open=100 + hour, high=101 + hour, low=99 + hour, close=100.5 + hour
+                )
+        PriceBar.objects.create(stock=self.stock, interval='1d', volume=5000,
+                                timestamp=datetime.datetime(2024, 3, 2, tzinfo=self.ist),
+                                open=1, high=2, low=0.5, close=1.5)
+        PriceBar.objects.create(stock=self.stock, interval='1h', volume=100,
+                                timestamp=self.now - datetime.timedelta(hours=1),
+                                open=1, high=2, low=0.5, close=1.5)
+        
+        for price in [100, 101, 102]:
+            StockPrediction.objects.create(stock=self.stock, prediction_date=datetime.date(2024, 1, 5),
+                                           predicted_price=price, confidence=80)
+        StockPrediction.objects.create(stock=self.stock, prediction_date=datetime.date(2024, 5, 30),
+                                       predicted_price=100, confidence=80)
+        
+        for i, days in enumerate([400, 10]):
+            StockNews.objects.create(title=f'News {i}', content='', url=f'https://news.example.com/{i}',
+                                     source='Example', published_at=self.now - datetime.timedelta(days=days))
+    
+    def test_rollups_and_archiving(self):
+        from stocks.models import PriceBar
+        from api.retention import run_retention
+        import gzip
+        import os
+        
+        retention = {
+            'BATCH_SIZE': 2,
+            'ARCHIVE_DIR': self.archive_dir,
+            'ROLLUPS': {'INTRADAY_BARS_DAYS': 30, 'PREDICTIONS_DAYS': 90},
+            'POLICIES': {'stocks.StockNews': {'field': 'published_at', 'days': 180, 'archive': True}},
+        }
+        with override_settings(RETENTION=retention):
+            reports = run_retention(now=self.now)
+        
+        self.assertEqual([report.rows for report in reports], [14, 2, 1])
+        self.assertEqual(PriceBar.objects.filter(interval='1h').count(), 1)
+        # Days are IST trading dates, although the provider's bar for 2 March falls on 1 March in UTC
+        self.assertEqual(PriceBar.objects.filter(interval='1d').count(), 2)
+        rolled = PriceBar.objects.get(interval='1d', timestamp=datetime.datetime(2024, 3, 1, tzinfo=self.ist))
+        self.assertEqual((rolled.open, rolled.high, rolled.low, rolled.close, rolled.volume),
+                         (104, 111, 103, 110.5, 700))
+        # The provider's daily bar wins over the rollup
+        self.assertEqual(PriceBar.objects.get(interval='1d', timestamp=datetime.datetime(2024, 3, 2, tzinfo=self.ist)).close, 1.5)
+        
+        old_predictions = StockPrediction.objects.filter(prediction_date=datetime.date(2024, 1, 5))
+        self.assertEqual(list(old_predictions.values_list('predicted_price', flat=True)), [Decimal('102.00')])
+        self.assertEqual(StockPrediction.objects.count(), 2)
+        
+        self.assertEqual(list(StockNews.objects.values_list('title', flat=True)), ['News 1'])
+        archive_dir = os.path.join(self.archive_dir, 'stocks_stocknews')
+        with gzip.open(os.path.join(archive_dir, os.listdir(archive_dir)[0]), 'rt') as f:
+            archived = [json.loads(line) for line in f]
+        self.assertEqual([row['title'] for row in archived], ['News 0'])
+
+
+class PortfolioSnapshotTests(APITestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='testpass123')
+        self.bob = User.objects.create_user(username='bob', password='testpass123')
+        self.aapl = Stock.objects.create(symbol='AAPL', name='Apple Inc.')
+        self.msft = Stock.objects.create(symbol='MSFT', name='Microsoft')
+        self.days = [datetime.date(2024, 1, 1) + datetime.timedelta(days=i) for i in range(10)]
+        # NSE daily bars, stamped at IST midnight: 18:30 UTC the day before
+        ist = ZoneInfo('Asia/Kolkata')
+        for i, day in enumerate(self.days):
+            for stock, base in [(self.aapl, 100), (self.msft, 200)]:
+                PriceBar.objects.create(stock=stock, interval='1d', timestamp=datetime.datetime.combine(
+                    day, datetime.time.min, tzinfo=ist), open=base, high=base, low=base, close=base + i)
+        
+        def hold(user, stock, quantity, buy_price, bought):
+            item = Portfolio.objects.create(user=user, stock=stock, quantity=quantity, buy_price=buy_price)
+            Portfolio.objects.filter(id=item.id).update(
+                buy_date=timezone.make_aware(datetime.datetime.combine(bought, datetime.time(15))))
+        
+        hold(self.alice, self.aapl, 10, Decimal('100.00'), self.days[0])
+        hold(self.alice, self.msft, 1, Decimal('200.00'), self.days[5])
+        hold(self.bob, self.msft, 2, Decimal('210.00'), self.days[3])
+    
+    def test_backfill_then_incremental(self):
+        from stocks.models import PortfolioSnapshot
+        from api.snapshots import snapshot_portfolios
+        
+        self.assertEqual(snapshot_portfolios(end=self.days[7]), 8 + 5)
+        alice = PortfolioSnapshot.objects.get(user=self.alice, date=self.days[6])
+        self.assertEqual(alice.market_value, Decimal(10 * 106 + 206))
+        self.assertEqual(alice.invested_value, Decimal('1200.00'))
+        self.assertFalse(PortfolioSnapshot.objects.filter(user=self.bob, date__lt=self.days[3]).exists())
+        
+        # The next run only adds the missing days
+        self.assertEqual(snapshot_portfolios(end=self.days[9]), 4)
+        self.assertEqual(snapshot_portfolios(end=self.days[9]), 0)
+        
+        self.client.force_authenticate(user=self.bob)
+        response = self.client.get(reverse('api:portfolio_history'), {'start': '2024-01-08'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['dates'], ['2024-01-08', '2024-01-09', '2024-01-10'])
+        self.assertEqual(response.data['market_value'], [414.0, 416.0, 418.0])
+    
+    def test_dates_are_exchange_trading_dates(self):
+        from api.snapshots import daily_closes
+        closes = daily_closes([self.aapl.id], self.days[2], self.days[4])
+        self.assertEqual(list(closes.index.date), self.days[2:5])
+        self.assertEqual(list(closes[self.aapl.id]), [102.0, 103.0, 104.0])
+        
+        # A stock on another exchange keeps its own dates in the same frame
+        nyse = Stock.objects.create(symbol='IBM', name='IBM', exchange='NYSE')
+        PriceBar.objects.create(stock=nyse, interval='1d', timestamp=datetime.datetime(
+            2024, 1, 4, tzinfo=ZoneInfo('America/New_York')), open=1, high=1, low=1, close=50)
+        closes = daily_closes([self.aapl.id, nyse.id], self.days[2], self.days[4])
+        self.assertEqual(list(closes.index.date), self.days[2:5])
+        self.assertEqual(closes[nyse.id].tolist()[1:], [50.0, 50.0])
+    
+    def test_closes_are_seeded_from_before_the_range(self):
+        from api.snapshots import daily_closes
+        PriceBar.objects.filter(stock=self.msft, timestamp__date__gte=self.days[5]).delete()
+        
+        closes = daily_closes([self.aapl.id, self.msft.id], self.days[7], self.days[9])
+        self.assertEqual(list(closes.index.date), self.days[7:])
+        self.assertEqual(list(closes[self.aapl.id]), [107.0, 108.0, 109.0])
+        self.assertEqual(list(closes[self.msft.id]), [205.0] * 3)
+        
+        # A range with no bars at all still carries the last closes
+        closes = daily_closes([self.msft.id], self.days[8], self.days[9])
+        self.assertEqual(list(closes.index.date), [self.days[8]])
+        self.assertEqual(list(closes[self.msft.id]), [205.0])
+
+
+class TopMoversTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.stocks = [
+            Stock.objects.create(symbol=f'SYM{i}', name=f'Stock {i}', current_price=Decimal('100.00'),
+                                 change_percent=Decimal(i - 25))
+            for i in range(50)
+        ]
+        Stock.objects.create(symbol='NOQUOTE', name='No quote', change_percent=Decimal('99.00'))
+    
+    def expected(self, order):
+        return list(Stock.objects.filter(current_price__isnull=False)
+                    .order_by(order, 'id').values_list('change_percent', flat=True)[:5])
+    
+    def test_updates_are_folded_in_without_queries(self):
+        from api.movers import top_movers
+        
+        movers = top_movers()
+        self.assertEqual([entry['symbol'] for entry in movers['gainers']], ['SYM49', 'SYM48', 'SYM47', 'SYM46', 'SYM45'])
+        self.assertEqual(movers['losers'][0]['symbol'], 'SYM0')
+        
+        stock = self.stocks[10]
+        stock.change_percent = Decimal('80.00')
+        stock.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(top_movers()['gainers'][0]['symbol'], 'SYM10')
+    
+    def test_random_updates_match_the_database(self):
+        from api.movers import top_movers
+        rng = np.random.default_rng(0)
+        top_movers()
+        for _ in range(300):
+            stock = self.stocks[rng.integers(len(self.stocks))]
+            stock.change_percent = Decimal(int(rng.integers(-40, 40)))
+            stock.save()
+        
+        movers = top_movers()
+        self.assertEqual([entry['change_percent'] for entry in movers['gainers']], self.expected('-change_percent'))
+        self.assertEqual([entry['change_percent'] for entry in movers['losers']], self.expected('change_percent'))
+    
+    @patch('api.movers.MOVERS_LOCK_WAIT', 0)
+    def test_update_during_another_write_drops_the_lists(self):
+        from django.core.cache import cache
+        from api.movers import MOVERS_CACHE_KEY, MOVERS_LOCK_KEY, top_movers
+        top_movers()
+        
+        # Another worker is midway through its read-modify-write
+        cache.set(MOVERS_LOCK_KEY, 'other')
+        stock = self.stocks[10]
+        stock.change_percent = Decimal('80.00')
+        stock.save()
+        self.assertIsNone(cache.get(MOVERS_CACHE_KEY))
+        self.assertEqual(cache.get(MOVERS_LOCK_KEY), 'other')
+        
+        cache.delete(MOVERS_LOCK_KEY)
+        self.assertEqual(top_movers()['gainers'][0]['symbol'], 'SYM10')
+
+
+class ConditionalStockDataTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.stock = Stock.objects.create(symbol='AAPL', name='Apple Inc.', current_price=Decimal('150.00'))
+        self.info = {'symbol': 'AAPL', 'longName': 'Apple Inc.', 'regularMarketPrice': 151.0}
+        self.history = pd.DataFrame({'Open': [150.0], 'High': [152.0], 'Low': [149.0], 'Close': [151.0],
+                                     'Volume': [1000]},
+                                    index=pd.DatetimeIndex(['2024-01-02'], tz='Asia/Kolkata'))
+    
+    def test_unchanged_data_is_not_modified(self):
+        from unittest.mock import AsyncMock
+        url = reverse('api:stock_data', args=['AAPL'])
+        with patch('api.stock_api.fetch_stock_data', new=AsyncMock(return_value=(self.info, self.history))) as fetch:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertIn('private', response['Cache-Control'])
+            self.assertNotIn('s-maxage', response['Cache-Control'])
+            etag = response['ETag']
+            
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(response['ETag'], etag)
+            self.assertEqual(fetch.await_count, 1)
+            
+            # A new bar changes the validator
+            PriceBar.objects.create(stock=self.stock, interval='1d', timestamp=timezone.now(),
+                                    open=1, high=1, low=1, close=1)
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotEqual(response['ETag'], etag)
+    
+    def test_history_is_stored_as_bars(self):
+        from django.core.cache import cache
+        from stocks.prices import upsert_bars
+        cache.clear()
+        dates = pd.date_range('2026-01-05', periods=5, freq='B', tz='Asia/Kolkata')
+        history = pd.DataFrame({'Open': 100.0, 'High': 102.0, 'Low': 99.0, 'Close': [100.0, 101.0, 102.0, 103.0, 104.0],
+                                'Volume': 1000}, index=dates)
+        ticker = MagicMock(info=self.info)
+        ticker.history.return_value = history
+        with patch('api.stock_api.yf.Ticker', return_value=ticker):
+            response = self.client.get(reverse('api:stock_data', args=['AAPL']))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+        bars = PriceBar.objects.filter(stock=self.stock, interval='1d').order_by('timestamp')
+        self.assertEqual(list(bars.values_list('close', flat=True)), [100, 101, 102, 103, 104])
+        # Stored at IST midnight, the previous day in UTC
+        self.assertEqual(bars[0].timestamp, datetime.datetime(2026, 1, 4, 18, 30, tzinfo=datetime.timezone.utc))
+        
+        # Later requests only rewrite bars from the last stored one on
+        history.loc[dates[-1], 'Close'] = 105.0
+        with patch('api.stock_api.yf.Ticker', return_value=ticker), \
+                patch('api.stock_api.STOCK_INFO_FRESH_FOR', 0), \
+                patch('api.stock_api.upsert_bars', wraps=upsert_bars) as upsert:
+            self.client.get(reverse('api:stock_data', args=['AAPL']))
+        self.assertEqual(len(upsert.call_args.args[1]), 1)
+        self.assertEqual(bars.last().close, 105)
+    
+    def test_market_hours(self):
+        from api.http_cache import market_is_open, quote_is_fresh, market_max_age
+        tz = datetime.timezone.utc
+        # 10:30 IST; NSE is the default exchange
+        monday_open = datetime.datetime(2024, 6, 3, 5, 0, tzinfo=tz)
+        saturday = datetime.datetime(2024, 6, 8, 5, 0, tzinfo=tz)
+        self.assertTrue(market_is_open(monday_open))
+        self.assertFalse(market_is_open(monday_open, exchange='NYSE'))
+        self.assertFalse(market_is_open(saturday))
+        self.assertFalse(quote_is_fresh(monday_open - datetime.timedelta(minutes=5), monday_open))
+        # Friday's post-close quote stays fresh all weekend
+        self.assertTrue(quote_is_fresh(datetime.datetime(2024, 6, 7, 11, 0, tzinfo=tz), saturday))
+        self.assertEqual(market_max_age(saturday), 3600)
+        
+        # Other exchanges keep their own session
+        self.assertTrue(market_is_open(datetime.datetime(2024, 6, 3, 15, 0, tzinfo=tz), exchange='NYSE'))
+        self.assertFalse(quote_is_fresh(datetime.datetime(2024, 6, 7, 11, 0, tzinfo=tz), saturday, exchange='NYSE'))
+
+
+class ColumnarRendererTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('api:strategy', args=['AAPL'])
+    
+    def test_json_maps_nan_to_null(self):
+        response = self.client.get(self.url, {'sync': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = json.loads(response.content)['data']
+        self.assertIsNone(data['long_ma'][0])
+        self.assertEqual(len(data['dates']), len(data['close']))
+        self.assertRegex(data['dates'][0], r'^\d{4}-\d{2}-\d{2}$')
+    
+    def test_msgpack_frame_round_trips(self):
+        import msgpack
+        json_data = json.loads(self.client.get(self.url, {'sync': 1}).content)['data']
+        response = self.client.get(self.url, {'format': 'msgpack', 'sync': 1})
+        self.assertEqual(response['Content-Type'], 'application/x-msgpack')
+        self.assertLess(len(response.content), len(self.client.get(self.url, {'sync': 1}).content) / 2)
+        
+        frame = msgpack.unpackb(response.content)['data']
+        dates = frame['dates']
+        days = dates['start'] + np.cumsum(np.frombuffer(dates['data'], dtype=dates['dtype']))
+        self.assertEqual(np.datetime_as_string(days.astype('datetime64[D]')).tolist(), json_data['dates'])
+        
+        columns = frame['columns']
+        close = np.frombuffer(columns['close']['data'], dtype=columns['close']['dtype'])
+        np.testing.assert_allclose(close, json_data['close'], rtol=1e-6)
+        long_ma = np.frombuffer(columns['long_ma']['data'], dtype=columns['long_ma']['dtype'])
+        self.assertTrue(np.isnan(long_ma[0]))
+        self.assertEqual(columns['position']['dtype'], '<i1')
+
+class StockChartTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.stock = Stock.objects.create(symbol='AAPL', name='Apple Inc.')
+        # Daily bars stamped at IST midnight, as yfinance gives them for NSE listings
+        dates = pd.bdate_range(end='2024-06-28', periods=1300, tz='Asia/Kolkata')
+        close = 100 + np.sin(np.arange(len(dates)) / 20) * 10
+        close[900] = 500
+        self.bars = pd.DataFrame({'open': close, 'high': close, 'low': close, 'close': close,
+                                  'volume': 1000}, index=dates)
+        from stocks.prices import upsert_bars
+        upsert_bars(self.stock, self.bars)
+        self.url = reverse('api:stock_chart', args=['AAPL'])
+    
+    def test_lttb_keeps_endpoints_and_extremes(self):
+        from api.downsample import lttb
+        y = np.sin(np.linspace(0, 20, 5000))
+        y[1234] = 5
+        keep = lttb(np.arange(5000), y, 200)
+        self.assertEqual(len(keep), 200)
+        self.assertEqual((keep[0], keep[-1]), (0, 4999))
+        self.assertTrue(np.all(np.diff(keep) > 0))
+        self.assertIn(1234, keep)
+        np.testing.assert_array_equal(lttb(np.arange(10), np.arange(10), 50), np.arange(10))
+    
+    def test_range_is_sliced_and_downsampled(self):
+        response = self.client.get(self.url, {'range': '5y', 'width': 200})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = json.loads(response.content)
+        self.assertEqual(data['source_points'], 1300)
+        history = data['historical_data']
+        self.assertEqual(len(history['dates']), 200)
+        self.assertEqual(history['dates'][-1], '2024-06-28')
+        self.assertIn(500, history['close'])
+        
+        data = json.loads(self.client.get(self.url, {'range': '3m'}).content)
+        self.assertLess(data['source_points'], 70)
+        self.assertEqual(len(data['historical_data']['dates']), data['source_points'])
+        
+        self.assertEqual(self.client.get(self.url, {'range': '2d'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(self.url, {'width': 'wide'}).status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_intraday_range_uses_intraday_bars(self):
+        from stocks.prices import upsert_bars
+        minutes = pd.date_range(end='2024-06-28 15:29', periods=2000, freq='min', tz='Asia/Kolkata')
+        upsert_bars(self.stock, self.bars.iloc[:1].reindex(minutes, method='nearest'), interval='1m')
+        data = json.loads(self.client.get(self.url, {'range': '1d', 'width': 100}).content)
+        self.assertEqual(data['interval'], '1m')
+        self.assertEqual(data['source_points'], 1441)
+        self.assertEqual(data['historical_data']['dates'][-1], '2024-06-28T15:29')
+    
+    def test_cached_chart_is_not_modified_until_a_bar_arrives(self):
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        with self.assertNumQueries(2):
+            # The stock and its bar coverage; the series itself comes from the cache
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        
+        PriceBar.objects.create(stock=self.stock, interval='1d', timestamp=timezone.now(),
+                                open=1, high=1, low=1, close=1)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content)['historical_data']['close'][-1], 1)
+    
+    def test_daily_points_match_the_stock_data_labels(self):
+        from unittest.mock import AsyncMock
+        stock = Stock.objects.create(symbol='RELIANCE', name='Reliance Industries', exchange='NSE')
+        dates = pd.date_range('2026-01-05', periods=5, freq='B', tz='Asia/Kolkata')
+        history = pd.DataFrame({'Open': 1.0, 'High': 1.0, 'Low': 1.0, 'Close': [10.0, 11.0, 12.0, 13.0, 14.0],
+                                'Volume': 1}, index=dates)
+        info = {'symbol': 'RELIANCE', 'longName': 'Reliance Industries', 'regularMarketPrice': 14.0}
+        with patch('api.stock_api.fetch_stock_data', new=AsyncMock(return_value=(info, history))):
+            stock_data = json.loads(self.client.get(reverse('api:stock_data', args=['RELIANCE'])).content)
+        self.assertEqual(PriceBar.objects.filter(stock=stock).count(), 5)
+        
+        chart = json.loads(self.client.get(reverse('api:stock_chart', args=['RELIANCE']), {'range': '1m'}).content)
+        self.assertEqual(chart['historical_data']['dates'][0], '2026-01-05')
+        self.assertEqual(chart['historical_data']['dates'], stock_data['historical_data']['dates'])
+        self.assertEqual(chart['historical_data']['close'], stock_data['historical_data']['prices'])
+    
+    def test_coverage_probes_the_index_ends(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from api.charts import bar_coverage
+        with CaptureQueriesContext(connection) as queries:
+            coverage = bar_coverage(self.stock, ['1h', '1d'])
+        self.assertEqual(list(coverage), ['1d'])
+        self.assertEqual(coverage['1d']['last'], datetime.datetime(2024, 6, 28, tzinfo=ZoneInfo('Asia/Kolkata')))
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('COUNT', queries[0]['sql'].upper())
+
+class BatchQuoteTests(APITestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('api:quotes')
+        # A fresh stored quote and an outdated one
+        Stock.objects.create(symbol='AAPL', name='Apple Inc.', current_price=Decimal('150.00'),
+                             previous_close=Decimal('148.00'), change=Decimal('2.00'), change_percent=Decimal('1.35'))
+        Stock.objects.create(symbol='MSFT', name='Microsoft', current_price=Decimal('300.00'))
+        Stock.objects.filter(symbol='MSFT').update(updated_at=timezone.now() - datetime.timedelta(days=7))
+    
+    def download(self, symbols, **kwargs):
+        dates = pd.bdate_range(end='2024-06-28', periods=2)
+        columns = pd.MultiIndex.from_product([symbols, ['Open', 'Close', 'Volume']])
+        data = pd.DataFrame(np.nan, index=dates, columns=columns)
+        for symbol in symbols:
+            if symbol != 'NOPE':
+                data[(symbol, 'Close')] = [200.0, 210.0]
+        return data
+    
+    @patch('api.quotes.quote_is_fresh', side_effect=lambda updated_at, now=None, exchange=None: updated_at > timezone.now() - datetime.timedelta(days=1))
+    def test_misses_are_fetched_in_one_batch(self, fresh):
+        with patch('api.quotes.yf.download', side_effect=self.download) as download:
+            response = self.client.get(self.url, {'symbols': 'aapl,MSFT,TSLA,NOPE,AAPL'})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            data = json.loads(response.content)
+            self.assertEqual(download.call_count, 1)
+            self.assertEqual(download.call_args[0][0], ['MSFT', 'TSLA', 'NOPE'])
+        
+        self.assertEqual(data['symbols'], ['AAPL', 'MSFT', 'TSLA', 'NOPE'])
+        self.assertEqual(data['price'], [150.0, 210.0, 210.0, None])
+        self.assertEqual(data['change_percent'][1], 5.0)
+        self.assertEqual(data['missing'], ['NOPE'])
+        self.assertEqual(Stock.objects.get(symbol='TSLA').current_price, Decimal('210.00'))
+        
+        # Everything found is now cached
+        with patch('api.quotes.yf.download') as download, self.assertNumQueries(0):
+            data = json.loads(self.client.get(self.url, {'symbols': 'AAPL,MSFT,TSLA'}).content)
+            download.assert_not_called()
+        self.assertEqual(data['price'], [150.0, 210.0, 210.0])
+    
+    def test_upstream_failure_serves_stale_quotes(self):
+        with patch('api.quotes.yf.download', side_effect=Exception('Too Many Requests')):
+            data = json.loads(self.client.get(self.url, {'symbols': 'MSFT,TSLA'}).content)
+        self.assertEqual(data['price'][0], 300.0)
+        self.assertEqual(data['stale'], ['MSFT'])
+        self.assertEqual(data['missing'], ['TSLA'])
+    
+    def test_symbol_limit(self):
+        symbols = ','.join(f'S{i}' for i in range(301))
+        self.assertEqual(self.client.get(self.url, {'symbols': symbols}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_400_BAD_REQUEST)
+    
+    @patch('api.quotes.fetch_quotes')
+    def test_symbols_longer_than_the_column_are_rejected(self, fetch):
+        response = self.client.get(self.url, {'symbols': 'AAPL,ABCDEFGHIJK'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('ABCDEFGHIJK', response.data['error'])
+        fetch.assert_not_called()
+
+@override_settings(LIVE_QUOTES={'MIN_INTERVAL': 0.2, 'POLL_INTERVAL': 60, 'HEARTBEAT': 5})
+class LiveQuoteTests(TestCase):
+    def test_updates_are_coalesced_per_client(self):
+        import asyncio
+        from api.live import broadcaster, quote_events, quote_payload
+        
+        async def scenario():
+            streams = [quote_events(['AAPL', 'MSFT']) for _ in range(50)]
+            for stream in streams:
+                self.assertTrue((await anext(stream)).startswith('retry:'))
+            now = timezone.now()
+            for i in range(10):
+                broadcaster.publish(quote_payload('AAPL', 100 + i, i, i, now + datetime.timedelta(seconds=i)))
+            broadcaster.publish(quote_payload('TSLA', 1, 0, 0, now))
+            events = await asyncio.gather(*(anext(stream) for stream in streams))
+            self.assertEqual(broadcaster.subscribers(), 50)
+            for stream in streams:
+                await stream.aclose()
+            self.assertEqual(broadcaster.subscribers(), 0)
+            return events
+        
+        events = asyncio.run(scenario())
+        # Ten AAPL updates reach each client as one batch with the latest price
+        quotes = json.loads(events[0].split('data: ')[1])
+        self.assertEqual([(quote['symbol'], quote['price']) for quote in quotes], [('AAPL', 109.0)])
+        self.assertEqual(len(set(events)), 1)
+    
+    def test_saved_quotes_are_published(self):
+        import asyncio
+        from django.db.models.signals import post_save
+        from api.live import broadcaster
+        stock = Stock.objects.create(symbol='AAPL', name='Apple Inc.')
+        
+        async def scenario():
+            subscription = broadcaster.subscribe(['AAPL'])
+            stock.current_price = Decimal('123.45')
+            # As if saved by a request thread
+            await asyncio.to_thread(post_save.send, sender=Stock, instance=stock, created=False)
+            batch = await subscription.next_batch(timeout=5)
+            broadcaster.unsubscribe(subscription)
+            return batch
+        
+        batch = asyncio.run(scenario())
+        self.assertEqual(batch[0]['price'], 123.45)
+    
+    def test_stream_requires_asgi_and_login(self):
+        url = reverse('api:quote_stream')
+        user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(url, {'symbols': 'AAPL'}).status_code, 501)
+        
+        import asyncio
+        from django.test import AsyncClient
+        async def unauthenticated():
+            return await AsyncClient().get(url, {'symbols': 'AAPL'})
+        self.assertEqual(asyncio.run(unauthenticated()).status_code, 401)
+
+class DeltaSyncTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.stocks = [Stock.objects.create(symbol=f'SYM{i}', name=f'Stock {i}', current_price=Decimal('10.00'))
+                       for i in range(5)]
+        self.watchlist = Watchlist.objects.create(user=self.user, name='Main')
+        self.watchlist.stocks.add(*self.stocks[:3])
+        Portfolio.objects.create(user=self.user, stock=self.stocks[0], quantity=1, buy_price=Decimal('5.00'))
+        Portfolio.objects.create(user=self.user, stock=self.stocks[1], quantity=2, buy_price=Decimal('5.00'))
+    
+    def test_versions_increase_on_every_save(self):
+        stock = self.stocks[0]
+        version = Stock.objects.get(pk=stock.pk).version
+        stock.current_price = Decimal('11.00')
+        stock.save(update_fields=['current_price'])
+        self.assertGreater(Stock.objects.get(pk=stock.pk).version, version)
+    
+    def test_queryset_updates_bump_versions(self):
+        from stocks.models import current_version
+        cursor = current_version()
+        Stock.objects.filter(pk__in=[self.stocks[0].pk, self.stocks[1].pk]).update(current_price=Decimal('13.00'))
+        self.assertEqual(current_version(), cursor + 1)
+        self.assertEqual(list(Stock.objects.filter(version__gt=cursor).order_by('pk')), self.stocks[:2])
+    
+    def test_watchlist_delta_returns_only_changes(self):
+        url = reverse('api:watchlist')
+        response = self.client.get(url)
+        cursor = response['X-Sync-Cursor']
+        
+        data = self.client.get(url, {'since': cursor}).data
+        self.assertEqual((data['watchlists'], data['stocks']), ([], []))
+        self.assertEqual(data['cursor'], int(cursor))
+        
+        self.stocks[1].current_price = Decimal('12.00')
+        self.stocks[1].save()
+        self.stocks[4].save()  # not watched
+        data = self.client.get(url, {'since': cursor}).data
+        self.assertEqual([stock['symbol'] for stock in data['stocks']], ['SYM1'])
+        self.assertEqual(data['watchlists'], [])
+        
+        # Membership changes resend the list and the new member's quote
+        self.watchlist.stocks.add(self.stocks[3])
+        self.watchlist.stocks.remove(self.stocks[0])
+        data = self.client.get(url, {'since': data['cursor']}).data
+        self.assertEqual(data['watchlists'], [{'id': self.watchlist.id, 'name': 'Main',
+                                               'symbols': ['SYM1', 'SYM2', 'SYM3']}])
+        self.assertIn('SYM3', [stock['symbol'] for stock in data['stocks']])
+        
+        self.assertEqual(self.client.get(url, {'since': 'x'}).status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_portfolio_delta(self):
+        url = reverse('api:portfolio')
+        cursor = self.client.get(url)['X-Sync-Cursor']
+        self.stocks[1].current_price = Decimal('20.00')
+        self.stocks[1].save()
+        Portfolio.objects.filter(stock=self.stocks[0]).delete()
+        
+        with self.assertNumQueries(3):
+            data = self.client.get(url, {'since': cursor}).data
+        self.assertEqual([holding['symbol'] for holding in data['holdings']], ['SYM1'])
+        self.assertEqual(data['holdings'][0]['current_value'], 40.0)
+        self.assertEqual(len(data['holding_ids']), 1)
+
+class KeysetPaginationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        for i in range(25):
+            stock = Stock.objects.create(symbol=f'SYM{i:02d}', name=f'Stock {i}', current_price=Decimal('10.00'))
+            Portfolio.objects.create(user=self.user, stock=stock, quantity=1, buy_price=Decimal('5.00'))
+            Watchlist.objects.create(user=self.user, name=f'List {i}').stocks.add(stock)
+    
+    def walk(self, url):
+        pages, params = [], {'page_size': 10, 'count': 1}
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response['X-Total-Count-Estimate'], '25')
+            pages.append(response.data)
+            link = response.get('Link')
+            url, params = (link[1:link.index('>')], None) if link else (None, None)
+        return pages
+    
+    def test_portfolio_pages_follow_link_header(self):
+        pages = self.walk(reverse('api:portfolio'))
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        symbols = [item['symbol'] for page in pages for item in page]
+        self.assertEqual(symbols, sorted(f'SYM{i:02d}' for i in range(25)))
+    
+    def test_watchlist_pages_cost_the_same_deep_down(self):
+        pages = self.walk(reverse('api:watchlist'))
+        self.assertEqual(sum(len(page) for page in pages), 25)
+        self.assertEqual(len({watchlist['id'] for page in pages for watchlist in page}), 25)
+    
+    def test_keyset_page_handles_mixed_directions_and_bad_cursors(self):
+        from api.pagination import keyset_page
+        Stock.objects.filter(symbol__in=['SYM01', 'SYM02', 'SYM03']).update(current_price=Decimal('20.00'))
+        stocks = Stock.objects.all()
+        seen, cursor = [], None
+        while True:
+            page = keyset_page(stocks, ['-current_price', 'symbol'], cursor, page_size=4)
+            seen += [stock.symbol for stock in page.items]
+            if not page.next_cursor:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(seen[:3], ['SYM01', 'SYM02', 'SYM03'])
+        self.assertEqual((len(seen), len(set(seen))), (25, 25))
+        self.assertEqual(keyset_page(stocks, ['symbol'], 'not-a-cursor', 3).items[0].symbol, 'SYM00')
+
+
+@override_settings(JOBS={'MODE': 'inline', 'MAX_ACTIVE_PER_USER': 2})
+class JobTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.other = User.objects.create_user(username='otheruser', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        Stock.objects.create(symbol='AAPL', name='Apple Inc.', current_price=Decimal('150.00'))
+    
+    def test_async_strategy_matches_sync_result(self):
+        url = reverse('api:strategy', args=['AAPL'])
+        response = self.client.get(url, {'short_ma': 10})
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response['Location'], reverse('api:job', args=[response.data['job_id']]))
+        
+        job = self.client.get(response['Location'])
+        self.assertEqual(job.status_code, status.HTTP_200_OK)
+        self.assertEqual(job.data['status'], 'succeeded')
+        synchronous = json.loads(self.client.get(url, {'short_ma': 10, 'sync': 1}).content)
+        self.assertEqual(job.data['result']['total_return'], synchronous['total_return'])
+        self.assertEqual(job.data['result']['signals'], synchronous['signals'])
+    
+    def test_failed_job_reports_error(self):
+        response = self.client.get(reverse('api:prediction', args=['MSFT']), {'async': 1})
+        job = self.client.get(response['Location']).data
+        self.assertEqual(job['status'], 'failed')
+        self.assertIsNone(job['result'])
+        self.assertIn('does not exist', job['error'])
+    
+    @patch('api.jobs.dispatch')
+    def test_identical_jobs_are_shared_and_active_jobs_limited(self, dispatch):
+        from api.jobs import JobLimitExceeded, submit_job
+        params = {'symbol': 'AAPL', 'long_ma': 50, 'short_ma': 20, 'stop_loss_pct': 0.02}
+        job, created = submit_job(self.user, 'strategy', params)
+        joined, joined_created = submit_job(self.other, 'strategy', dict(reversed(params.items())))
+        self.assertEqual((created, joined_created, joined.id), (True, False, job.id))
+        self.assertEqual(dispatch.call_count, 1)
+        
+        submit_job(self.user, 'strategy', {'symbol': 'MSFT', 'long_ma': 50})
+        with self.assertRaises(JobLimitExceeded):
+            submit_job(self.user, 'strategy', {'symbol': 'GOOGL', 'long_ma': 50})
+        response = self.client.get(reverse('api:strategy', args=['GOOGL']), {'async': 1})
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        # Joining an active job is still allowed
+        response = self.client.get(reverse('api:strategy', args=['AAPL']), {'async': 1, 'long_ma': 50})
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertFalse(response.data['created'])
+    
+    @patch('api.jobs.dispatch')
+    def test_sync_requests_count_towards_the_limit(self, dispatch):
+        from api.jobs import submit_job
+        submit_job(self.user, 'strategy', {'symbol': 'MSFT'})
+        submit_job(self.user, 'strategy', {'symbol': 'GOOGL'})
+        response = self.client.get(reverse('api:strategy', args=['AAPL']), {'sync': 1})
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+    
+    @patch('api.jobs.dispatch')
+    def test_lost_jobs_are_retried_then_failed(self, dispatch):
+        from stocks.models import Job
+        from api.jobs import submit_job
+        params = {'symbol': 'AAPL'}
+        job, _ = submit_job(self.user, 'strategy', params)
+        lost_dispatch, _ = submit_job(self.user, 'strategy', {'symbol': 'MSFT'})
+        long_ago = timezone.now() - datetime.timedelta(hours=1)
+        Job.objects.filter(pk=job.id).update(status='running', started_at=long_ago, attempts=1)
+        Job.objects.filter(pk=lost_dispatch.id).update(dispatched_at=long_ago)
+        dispatch.reset_mock()
+        
+        # The user's lost jobs are recovered when they submit again
+        joined, created = submit_job(self.user, 'strategy', params)
+        self.assertEqual((joined.id, created), (job.id, False))
+        self.assertEqual(Job.objects.get(pk=job.id).status, 'queued')
+        self.assertEqual(sorted(call.args[0] for call in dispatch.call_args_list), sorted([job.id, lost_dispatch.id]))
+        
+        # A job that keeps taking its worker down is given up on
+        Job.objects.filter(pk=job.id).update(status='running', started_at=long_ago, attempts=3)
+        replacement, created = submit_job(self.user, 'strategy', params)
+        self.assertTrue(created)
+        self.assertEqual(Job.objects.get(pk=job.id).status, 'failed')
+    
+    @patch('api.jobs.dispatch')
+    def test_broken_pool_requeues_the_claimed_job(self, dispatch):
+        from concurrent.futures import Future
+        from concurrent.futures.process import BrokenProcessPool
+        from stocks.models import Job
+        from api.jobs import pool_finished, submit_job
+        job, _ = submit_job(self.user, 'strategy', {'symbol': 'AAPL'})
+        Job.objects.filter(pk=job.id).update(status='running', started_at=timezone.now(), attempts=1)
+        future = Future()
+        future.set_exception(BrokenProcessPool('worker died'))
+        with patch('api.jobs.close_old_connections'):
+            pool_finished(job.id, future)
+        self.assertEqual(Job.objects.get(pk=job.id).status, 'queued')
+        dispatch.assert_called_with(job.id)
+    
+    @patch('api.jobs.dispatch')
+    def test_run_jobs_requeues_stale_and_runs_queued(self, dispatch):
+        from django.core.management import call_command
+        from stocks.models import Job
+        from api.jobs import submit_job
+        job, _ = submit_job(self.user, 'strategy', {'symbol': 'AAPL'})
+        stale, _ = submit_job(self.user, 'strategy', {'symbol': 'MSFT'})
+        Job.objects.filter(pk=stale.id).update(status='running',
+                                               started_at=timezone.now() - datetime.timedelta(hours=1))
+        call_command('run_jobs', stdout=open(os.devnull, 'w'))
+        self.assertEqual(set(Job.objects.values_list('status', flat=True)), {'succeeded'})
+    
+    @patch('api.jobs.dispatch')
+    def test_stream_follows_status_until_finished(self, dispatch):
+        import asyncio
+        import copy
+        from unittest.mock import AsyncMock
+        from stocks.models import Job
+        from api.jobs import job_events, submit_job
+        job, _ = submit_job(self.user, 'strategy', {'symbol': 'AAPL'})
+        states = []
+        for job_status in ['queued', 'queued', 'running', 'succeeded']:
+            job.status = job_status
+            states.append(copy.copy(job))
+        
+        async def collect():
+            with patch.object(Job.objects, 'aget', new=AsyncMock(side_effect=states)):
+                return [chunk async for chunk in job_events(job.id, poll=0, heartbeat=0)]
+        
+        chunks = asyncio.run(collect())
+        events = [json.loads(chunk.split('data: ', 1)[1])['status'] for chunk in chunks if chunk.startswith('event: job')]
+        self.assertEqual(events, ['queued', 'running', 'succeeded'])
+        self.assertIn(': keepalive\n\n', chunks)
+
+
+@override_settings(UPSTREAM={'FAILURE_THRESHOLD': 3, 'RESET_TIMEOUT': 30.0, 'DEADLINE': 5.0, 'MAX_RETRIES': 2,
+                             'BACKOFF': 0.5, 'MAX_BACKOFF': 4.0, 'STALE_FOR': 3600})
+class UpstreamTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.calls = 0
+    
+    def flaky(self, *failures):
+        """A provider call failing with each of failures in turn, then returning 'ok'"""
+        def call():
+            self.calls += 1
+            if self.calls <= len(failures):
+                raise failures[self.calls - 1]
+            return 'ok'
+        return call
+    
+    @patch('api.upstream.time.sleep')
+    def test_transient_failures_are_retried_with_backoff(self, sleep):
+        from api.upstream import call_upstream
+        result = call_upstream('test', self.flaky(ConnectionError('reset'), Exception('429 Too Many Requests')))
+        self.assertEqual((result, self.calls), ('ok', 3))
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [0.5, 1.0])
+        
+        # Other errors propagate at once
+        self.calls = 0
+        with self.assertRaises(KeyError):
+            call_upstream('test', self.flaky(KeyError('symbol')))
+        self.assertEqual(self.calls, 1)
+    
+    @patch('api.upstream.time.sleep')
+    def test_backoff_never_sleeps_past_deadline(self, sleep):
+        from api.upstream import UpstreamUnavailable, call_upstream, request_deadline
+        with self.assertRaises(UpstreamUnavailable):
+            call_upstream('test', self.flaky(TimeoutError(), TimeoutError()), deadline=request_deadline(0.7))
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [0.5])
+        self.assertEqual(self.calls, 2)
+    
+    @patch('api.upstream.time.sleep')
+    def test_open_circuit_fails_fast_then_lets_a_trial_through(self, sleep):
+        from api.upstream import UpstreamUnavailable, call_upstream, circuit_breaker
+        failing = self.flaky(*[ConnectionError('down')] * 3)
+        with self.assertRaises(UpstreamUnavailable):
+            call_upstream('test', failing)
+        self.assertEqual(circuit_breaker('test').state(), 'open')
+        with self.assertRaises(UpstreamUnavailable):
+            call_upstream('test', failing)
+        self.assertEqual(self.calls, 3)
+        
+        with patch('api.upstream.time.time', return_value=time.time() + 31):
+            self.assertEqual(circuit_breaker('test').state(), 'half-open')
+            self.assertEqual(call_upstream('test', failing), 'ok')
+        self.assertEqual(circuit_breaker('test').state(), 'closed')
+    
+    @patch('api.upstream.time.sleep')
+    def test_unavailable_provider_serves_stale_cache(self, sleep):
+        from api.upstream import UpstreamUnavailable, cached_upstream, circuit_breaker
+        self.assertEqual(cached_upstream('test', 'key', lambda: 'first', fresh_for=60), ('first', False))
+        self.assertEqual(cached_upstream('test', 'key', lambda: 'second', fresh_for=60), ('first', False))
+        
+        for _ in range(3):
+            circuit_breaker('test').record_failure()
+        self.assertEqual(cached_upstream('test', 'key', lambda: 'second', fresh_for=0), ('first', True))
+        with self.assertRaises(UpstreamUnavailable):
+            cached_upstream('test', 'other', lambda: 'second', fresh_for=0)
+    
+    def test_async_backoff_does_not_block(self):
+        import asyncio
+        from unittest.mock import AsyncMock
+        from api.upstream import acall_upstream
+        
+        async def call():
+            with patch('api.upstream.asyncio.sleep', new=AsyncMock()) as sleep, \
+                    patch('api.upstream.time.sleep') as blocking_sleep:
+                result = await acall_upstream('test', self.flaky(ConnectionError('reset')))
+            return result, sleep.await_args_list, blocking_sleep.called
+        
+        result, sleeps, blocked = asyncio.run(call())
+        self.assertEqual(result, 'ok')
+        self.assertEqual([call.args[0] for call in sleeps], [0.5])
+        self.assertFalse(blocked)
+    
+    @patch('api.upstream.time.sleep')
+    def test_stock_data_falls_back_to_stale_info(self, sleep):
+        from api.stock_api import fetch_stock_data
+        import asyncio
+        info = {'symbol': 'AAPL', 'longName': 'Apple Inc.', 'regularMarketPrice': 151.0}
+        history = pd.DataFrame({'Close': [150.0, 151.0], 'Volume': [1000, 1200]},
+                               index=pd.date_range('2024-06-27', periods=2))
+        ticker = MagicMock(info=info)
+        ticker.history.return_value = history
+        with patch('api.stock_api.yf.Ticker', return_value=ticker):
+            fresh, _ = asyncio.run(fetch_stock_data('AAPL'))
+        self.assertFalse(fresh['stale'])
+        
+        from api.upstream import circuit_breaker
+        for _ in range(3):
+            circuit_breaker('yfinance').record_failure()
+        with patch('api.stock_api.STOCK_INFO_FRESH_FOR', 0), patch('api.stock_api.yf.Ticker') as unavailable:
+            stale, historical_data = asyncio.run(fetch_stock_data('AAPL'))
+            unavailable.assert_not_called()
+        self.assertTrue(stale['stale'])
+        self.assertEqual(stale['regularMarketPrice'], 151.0)
+        self.assertIsNotNone(historical_data)
+    
+    def test_deadline_bounds_hung_calls(self):
+        import asyncio
+        import threading
+        from api.upstream import UpstreamUnavailable, call_upstream, request_deadline
+        from api.stock_api import fetch_stock_data
+        release = threading.Event()
+        self.addCleanup(release.set)
+        hung = lambda *args, **kwargs: release.wait(5)
+        
+        started = time.monotonic()
+        with self.assertRaises(UpstreamUnavailable):
+            call_upstream('test', hung, deadline=request_deadline(0.3))
+        self.assertLess(time.monotonic() - started, 1)
+        
+        # asyncio.run must not wait for the abandoned thread either
+        ticker = MagicMock()
+        type(ticker).info = property(hung)
+        started = time.monotonic()
+        with patch('api.stock_api.yf.Ticker', return_value=ticker), \
+                patch('api.stock_api.request_deadline', return_value=time.monotonic() + 0.3):
+            self.assertEqual(asyncio.run(fetch_stock_data('AAPL')), (None, None))
+        self.assertLess(time.monotonic() - started, 1)
+    
+    @patch('api.upstream.time.sleep')
+    def test_search_shares_one_deadline(self, sleep):
+        from api.stock_api import search_stocks
+        from rest_framework.test import APIRequestFactory, force_authenticate
+        deadlines = []
+        
+        def cached(provider, key, func, symbol, fresh_for, deadline):
+            deadlines.append(deadline)
+            return None, False
+        
+        request = APIRequestFactory().get('/api/stocks/search/', {'q': 'IN'})
+        force_authenticate(request, user=User.objects.create_user(username='searcher', password='testpass123'))
+        with patch('api.stock_api.cached_upstream', side_effect=cached):
+            search_stocks(request)
+        self.assertGreater(len(deadlines), 1)
+        self.assertEqual(len(set(deadlines)), 1)
+    
+    def test_per_process_cache_is_flagged_in_production(self):
+        from api.checks import shared_cache_check
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        redis = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://cache'}}
+        with self.settings(DEBUG=False, CACHES=locmem):
+            self.assertEqual([warning.id for warning in shared_cache_check(None)], ['api.W001'])
+        with self.settings(DEBUG=False, CACHES=redis):
+            self.assertEqual(shared_cache_check(None), [])
@@ -0,0 +1,255 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# Defaults for settings.UPSTREAM
+UPSTREAM = {
+    # Consecutive transient failures that open a provider's circuit
+    'FAILURE_THRESHOLD': 5,
+    # Seconds an open circuit fails fast before one trial call is let through
+    'RESET_TIMEOUT': 30.0,
+    # Seconds a request may spend on upstream calls, retries included
+    'DEADLINE': 8.0,
+    'MAX_RETRIES': 2,
+    # First backoff in seconds, doubled per retry up to MAX_BACKOFF
+    'BACKOFF': 0.5,
+    'MAX_BACKOFF': 4.0,
+    # Seconds a cached upstream result stays available as a stale fallback
+    'STALE_FOR': 24 * 60 * 60,
+    # Threads running upstream calls in each process
+    'THREADS': 16,
+}
+
+def upstream_setting(name):
+    return getattr(settings, 'UPSTREAM', {}).get(name, UPSTREAM[name])
+
+class UpstreamUnavailable(Exception):
+    """The provider's circuit is open, it is rate limited, or retries ran out before the deadline"""
+
+def is_transient(error):
+    """Whether an error is a rate limit, timeout or outage, worth retrying and counting against the provider"""
+    status_code = getattr(getattr(error, 'response', None), 'status_code', None)
+    if isinstance(status_code, int):
+        return status_code == 429 or status_code >= 500
+    if isinstance(error, OSError):
+        return True
+    name = type(error).__name__
+    return ('RateLimit' in name or 'Timeout' in name or 'Connection' in name
+            or 'Too Many Requests' in str(error))
+
+def request_deadline(seconds=None):
+    """Monotonic time by which the upstream calls of a request must finish"""
+    return time.monotonic() + (upstream_setting('DEADLINE') if seconds is None else seconds)
+
+_executor = None
+
+def upstream_executor():
+    """
+    Threads the upstream calls of this process run in, started on first use
+
+    A call given up at its deadline keeps its thread until the client returns,
+    detached from the request. The pool bounds how many such calls pile up
+    while a provider hangs; its circuit opens long before that.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=upstream_setting('THREADS'), thread_name_prefix='upstream')
+    return _executor
+
+def run_until(deadline, func, *args, **kwargs):
+    """func(*args, **kwargs) in an upstream thread, waited for no later than deadline"""
+    future = upstream_executor().submit(func, *args, **kwargs)
+    try:
+        return future.result(timeout=max(deadline - time.monotonic(), 0))
+    except FutureTimeout:
+        future.cancel()
+        raise TimeoutError('no answer before the request deadline')
+
+class CircuitBreaker:
+    """
+    Failure state of one upstream provider, kept in the default cache
+
+    With the Redis cache configured in settings every worker shares it;
+    with the local-memory fallback each process has its own.
+
+    Closed, calls pass and consecutive transient failures are counted. At
+    FAILURE_THRESHOLD the circuit opens and calls fail fast for
+    RESET_TIMEOUT seconds; after that one trial call at a time is let
+    through (half-open). A success closes the circuit, a failure reopens it.
+    """
+
+    def __init__(self, provider):
+        self.provider = provider
+        self.failures_key = f'circuit_{provider}_failures'
+        self.opened_key = f'circuit_{provider}_opened'
+        self.trial_key = f'circuit_{provider}_trial'
+
+    def state(self):
+        opened_at = cache.get(self.opened_key)
+        if opened_at is None:
+            return 'closed'
+        return 'open' if time.time() - opened_at < upstream_setting('RESET_TIMEOUT') else 'half-open'
+
+    def allow(self):
+        state = self.state()
+        if state == 'closed':
+            return True
+        if state == 'open':
+            return False
+        return cache.add(self.trial_key, True, upstream_setting('RESET_TIMEOUT'))
+
+    def record_success(self):
+        cache.delete_many([self.failures_key, self.opened_key, self.trial_key])
+
+    def record_failure(self):
+        try:
+            failures = cache.incr(self.failures_key)
+        except ValueError:
+            cache.set(self.failures_key, 1, None)
+            failures = 1
+        if failures >= upstream_setting('FAILURE_THRESHOLD'):
+            if self.state() == 'closed':
+                logger.warning(f"Circuit for {self.provider} opened after {failures} failures")
+            cache.set(self.opened_key, time.time(), None)
+            cache.delete(self.trial_key)
+
+circuit_breakers = {}
+
+def circuit_breaker(provider):
+    if provider not in circuit_breakers:
+        circuit_breakers[provider] = CircuitBreaker(provider)
+    return circuit_breakers[provider]
+
+def retry_delay(circuit, error, attempt, retries, deadline):
+    """
+    Seconds to back off after a failed attempt, or None if error is not transient
+
+    Raises UpstreamUnavailable when retries are exhausted or the backoff
+    would end past the deadline, rather than sleeping into it.
+    """
+    if not is_transient(error):
+        # The provider answered; the error is the caller's to handle
+        circuit.record_success()
+        return None
+    circuit.record_failure()
+    delay = min(upstream_setting('BACKOFF') * 2 ** attempt, upstream_setting('MAX_BACKOFF'))
+    if attempt >= retries or time.monotonic() + delay >= deadline:
+        raise UpstreamUnavailable(f'{circuit.provider} failed: {str(error) or type(error).__name__}') from error
+    logger.warning(f"{circuit.provider} call failed ({str(error)}), retrying in {delay}s")
+    return delay
+
+def call_upstream(provider, func, *args, deadline=None, retries=None, **kwargs):
+    """
+    func(*args, **kwargs) through provider's circuit breaker, retrying transient failures
+
+    func runs in an upstream thread and is given up on once deadline (a
+    monotonic time, see request_deadline) passes; retries back off
+    exponentially but never past it either, so a request is not pinned to a
+    hung or failing provider. func must not use the database. Errors that
+    are not transient propagate unchanged.
+
+    Raises:
+        UpstreamUnavailable: the circuit is open or the retries ran out
+    """
+    circuit = circuit_breaker(provider)
+    deadline = request_deadline() if deadline is None else deadline
+    retries = upstream_setting('MAX_RETRIES') if retries is None else retries
+    attempt = 0
+    while True:
+        if time.monotonic() >= deadline:
+            raise UpstreamUnavailable(f'{provider} deadline passed')
+        if not circuit.allow():
+            raise UpstreamUnavailable(f'{provider} circuit is open')
+        try:
+            result = run_until(deadline, func, *args, **kwargs)
+        except UpstreamUnavailable:
+            raise
+        except Exception as e:
+            delay = retry_delay(circuit, e, attempt, retries, deadline)
+            if delay is None:
+                raise
+            time.sleep(delay)
+            attempt += 1
+        else:
+            circuit.record_success()
+            return result
+
+async def acall_upstream(provider, func, *args, deadline=None, retries=None, **kwargs):
+    """
+    call_upstream for async callers
+
+    Waits for the upstream thread and backs off without blocking the event
+    loop. The thread is not the loop's default executor, so asyncio.run does
+    not wait for a call given up at the deadline either.
+    """
+    circuit = circuit_breaker(provider)
+    deadline = request_deadline() if deadline is None else deadline
+    retries = upstream_setting('MAX_RETRIES') if retries is None else retries
+    attempt = 0
+    while True:
+        if time.monotonic() >= deadline:
+            raise UpstreamUnavailable(f'{provider} deadline passed')
+        if not await sync_to_async(circuit.allow)():
+            raise UpstreamUnavailable(f'{provider} circuit is open')
+        try:
+            future = upstream_executor().submit(func, *args, **kwargs)
+            result = await asyncio.wait_for(asyncio.wrap_future(future), max(deadline - time.monotonic(), 0))
+        except UpstreamUnavailable:
+            raise
+        except Exception as e:
+            delay = await sync_to_async(retry_delay)(circuit, e, attempt, retries, deadline)
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
+            attempt += 1
+        else:
+            await sync_to_async(circuit.record_success)()
+            return result
+
+def cached_upstream(provider, cache_key, func, *args, fresh_for, **kwargs):
+    """
+    func's result through the cache, fetched again through call_upstream once older than fresh_for seconds
+
+    Results stay cached for STALE_FOR, and while the provider is unavailable
+    the last one is served instead, flagged as stale.
+
+    Returns:
+        (value, stale)
+
+    Raises:
+        UpstreamUnavailable: the provider is unavailable and nothing is cached
+    """
+    cached = cache.get(cache_key)
+    if cached is not None and time.time() - cached['fetched_at'] < fresh_for:
+        return cached['value'], False
+    try:
+        value = call_upstream(provider, func, *args, **kwargs)
+    except UpstreamUnavailable as e:
+        return stale_fallback(cache_key, cached, e)
+    cache.set(cache_key, {'fetched_at': time.time(), 'value': value}, upstream_setting('STALE_FOR'))
+    return value, False
+
+async def acached_upstream(provider, cache_key, func, *args, fresh_for, **kwargs):
+    """cached_upstream for async callers, through acall_upstream"""
+    cached = await cache.aget(cache_key)
+    if cached is not None and time.time() - cached['fetched_at'] < fresh_for:
+        return cached['value'], False
+    try:
+        value = await acall_upstream(provider, func, *args, **kwargs)
+    except UpstreamUnavailable as e:
+        return stale_fallback(cache_key, cached, e)
+    await cache.aset(cache_key, {'fetched_at': time.time(), 'value': value}, upstream_setting('STALE_FOR'))
+    return value, False
+
+def stale_fallback(cache_key, cached, error):
+    if cached is None:
+        raise error
+    logger.warning(f"Serving stale {cache_key}: {str(error)}")
+    return cached['value'], True
@@ -7,12 +7,19 @@ app_name = 'api'
 
 urlpatterns = [
     path('stocks/search/', stock_api.search_stocks, name='stock_search'),
+    path('quotes/', stock_api.batch_quotes, name='quotes'),
+    path('quotes/stream/', stock_api.quote_stream, name='quote_stream'),
     path('stocks/<str:symbol>/', stock_api.get_stock_data, name='stock_data'),
+    path('stock/<str:symbol>/', stock_api.get_stock_chart, name='stock_chart'),
     path('watchlist/', watchlist_api.WatchlistAPIView.as_view(), name='watchlist'),
     path('watchlist/add-stock/', watchlist_api.add_stock_to_watchlist, name='add_stock_to_watchlist'),
     path('watchlist/remove-stock/', watchlist_api.remove_stock_from_watchlist, name='remove_stock_from_watchlist'),
     path('watchlist/edit/', watchlist_api.edit_watchlist, name='edit_watchlist'),
     path('watchlist/delete/', watchlist_api.delete_watchlist, name='delete_watchlist'),
+    path('portfolio/', views.PortfolioAPIView.as_view(), name='portfolio'),
+    path('portfolio/history/', views.PortfolioHistoryAPIView.as_view(), name='portfolio_history'),
     path('strategy/<str:symbol>/', views.StrategyAPIView.as_view(), name='strategy'),
     path('prediction/<str:symbol>/', views.PredictionAPIView.as_view(), name='prediction'),
+    path('jobs/<uuid:job_id>/', views.JobAPIView.as_view(), name='job'),
+    path('jobs/<uuid:job_id>/stream/', views.job_stream, name='job_stream'),
 ]
\ No newline at end of file
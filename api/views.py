@@ -3,18 +3,24 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from .angel_api import AngelBrokingAPI
-from .strategy import enhanced_pullback_strategy
-from .prediction import predict_stock_price
-from stocks.models import Stock, Watchlist, Portfolio, StockPrediction, TradeSignal, StockNews
-import pandas as pd
+from .portfolio import valued_holdings
+from .jobs import JobLimitExceeded, execute_job, job_events, job_state, submit_job
+from .columnar import SeriesFrame
+from .snapshots import portfolio_history
+from .sync import list_headers, parse_since, holding_row, portfolio_changes
+from .pagination import keyset_page, page_size_param
+from stocks.models import Job, Stock, Watchlist, Portfolio, TradeSignal, current_version
+from stocks.prices import upsert_bars
 import datetime
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from asgiref.sync import sync_to_async
 from django.views.decorators.http import require_http_methods
 from django.contrib.auth.decorators import login_required
 import json
 import yfinance as yf
-from newsapi import NewsApiClient
 
 class StockDataAPIView(APIView):
     permission_classes = [IsAuthenticated]
@@ -52,44 +58,20 @@ class StockDataAPIView(APIView):
                 }
             )
             
-            # Get latest news
-            try:
-                newsapi = NewsApiClient(api_key='your-news-api-key')
-                news = newsapi.get_everything(
-                    q=f"{symbol} OR {quote.get('longName', '')}",
-                    language='en',
-                    sort_by='publishedAt',
-                    page_size=5
-                )
-            except Exception as e:
-                news = {'articles': []}
-                logger.error(f"Error fetching news for {symbol}: {str(e)}")
-            
-            # Save news to database
-            for article in news.get('articles', []):
-                StockNews.objects.create(
-                    stock=stock,
-                    title=article['title'],
-                    content=article['description'],
-                    url=article['url'],
-                    source=article['source']['name'],
-                    published_at=article['publishedAt']
-                )
+            # Keep the fetched history in the price bar table
+            upsert_bars(stock, df, interval='1d')
             
+            # News is ingested in batches by the ingest_news command, not per page view
             return Response({
                 'symbol': symbol,
                 'name': stock.name,
                 'current_price': float(stock.current_price) if stock.current_price else None,
                 'change': float(stock.change) if stock.change else None,
                 'change_percent': float(stock.change_percent) if stock.change_percent else None,
-                'historical_data': {
-                    'dates': df.index.strftime('%Y-%m-%d').tolist(),
-                    'open': df['Open'].tolist(),
-                    'high': df['High'].tolist(),
-                    'low': df['Low'].tolist(),
-                    'close': df['Close'].tolist(),
-                    'volume': df['Volume'].tolist()
-                },
+                'historical_data': SeriesFrame(
+                    df.index, open=df['Open'], high=df['High'], low=df['Low'],
+                    close=df['Close'], volume=df['Volume']
+                ),
                 'company_info': {
                     'sector': quote.get('sector'),
                     'industry': quote.get('industry'),
@@ -138,62 +120,100 @@ class StrategyAPIView(APIView):
     permission_classes = [IsAuthenticated]
     
     def get(self, request, symbol):
-        # Get historical data (mock data for demonstration)
-        end_date = datetime.datetime.now()
-        start_date = end_date - datetime.timedelta(days=365)
-        
-        dates = pd.date_range(start=start_date, end=end_date, freq='D')
-        data = {
-            'open': [100 + i * 0.1 + (i % 10) for i in range(len(dates))],
-            'high': [105 + i * 0.1 + (i % 10) for i in range(len(dates))],
-            'low': [95 + i * 0.1 + (i % 10) for i in range(len(dates))],
-            'close': [102 + i * 0.1 + (i % 10) for i in range(len(dates))],
-            'volume': [1000000 + i * 1000 for i in range(len(dates))]
+        # Strategy parameters
+        params = {
+            'symbol': symbol,
+            'long_ma': int(request.query_params.get('long_ma', 50)),
+            'short_ma': int(request.query_params.get('short_ma', 20)),
+            'stop_loss_pct': float(request.query_params.get('stop_loss_pct', 0.02)),
         }
-        df = pd.DataFrame(data, index=dates)
-        
-        # Apply strategy
-        long_ma = int(request.query_params.get('long_ma', 50))
-        short_ma = int(request.query_params.get('short_ma', 20))
-        stop_loss_pct = float(request.query_params.get('stop_loss_pct', 0.02))
-        
-        strategy_results = enhanced_pullback_strategy(df, long_ma, short_ma, stop_loss_pct)
-        
-        return Response(strategy_results)
+        if wants_sync(request):
+            return run_job_response(request, 'strategy', params)
+        return submit_job_response(request, 'strategy', params)
 
 class PredictionAPIView(APIView):
     permission_classes = [IsAuthenticated]
     
     def get(self, request, symbol):
-        # Get historical data (mock data for demonstration)
-        end_date = datetime.datetime.now()
-        start_date = end_date - datetime.timedelta(days=365)
-        
-        dates = pd.date_range(start=start_date, end=end_date, freq='D')
-        data = {
-            'open': [100 + i * 0.1 + (i % 10) for i in range(len(dates))],
-            'high': [105 + i * 0.1 + (i % 10) for i in range(len(dates))],
-            'low': [95 + i * 0.1 + (i % 10) for i in range(len(dates))],
-            'close': [102 + i * 0.1 + (i % 10) for i in range(len(dates))],
-            'volume': [1000000 + i * 1000 for i in range(len(dates))]
+        # Prediction parameters
+        params = {
+            'symbol': symbol,
+            'days_ahead': int(request.query_params.get('days_ahead', 5)),
+            'model_type': request.query_params.get('model_type', 'linear'),
         }
-        df = pd.DataFrame(data, index=dates)
-        
-        # Make predictions
-        days_ahead = int(request.query_params.get('days_ahead', 5))
-        prediction_results = predict_stock_price(df, days_ahead)
-        
-        # Store predictions in database
-        stock = get_object_or_404(Stock, symbol=symbol)
-        for pred in prediction_results['predictions']:
-            StockPrediction.objects.create(
-                stock=stock,
-                prediction_date=pred['date'],
-                predicted_price=pred['predicted_price'],
-                confidence=85.5  # Placeholder
-            )
-        
-        return Response(prediction_results)
+        if wants_sync(request):
+            return run_job_response(request, 'prediction', params)
+        return submit_job_response(request, 'prediction', params)
+
+def wants_sync(request):
+    """Whether the client asked for the result in the response (?sync=1) instead of a background job"""
+    return request.query_params.get('sync') in ('1', 'true')
+
+def job_accepted_response(job, created):
+    poll_url = reverse('api:job', args=[job.id])
+    return Response({
+        'job_id': str(job.id),
+        'status': job.status,
+        'created': created,
+        'poll_url': poll_url,
+        'stream_url': reverse('api:job_stream', args=[job.id]),
+    }, status=status.HTTP_202_ACCEPTED, headers={'Location': poll_url})
+
+def submit_job_response(request, kind, params):
+    """Submit (or join) a background job and answer 202 with where to follow it"""
+    try:
+        job, created = submit_job(request.user, kind, params)
+    except JobLimitExceeded as e:
+        return Response({'error': str(e)}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+    return job_accepted_response(job, created)
+
+def run_job_response(request, kind, params):
+    """
+    Run a job inside the request and answer with its result
+
+    The job still counts towards the user's active job limit; if an
+    identical job is already active, the client is sent to follow it.
+    """
+    try:
+        job, created = submit_job(request.user, kind, params, start=False)
+    except JobLimitExceeded as e:
+        return Response({'error': str(e)}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+    if not created:
+        return job_accepted_response(job, created)
+    try:
+        return Response(execute_job(job.id, reraise=True))
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except Stock.DoesNotExist:
+        return Response({'error': 'Stock not found'}, status=status.HTTP_404_NOT_FOUND)
+
+class JobAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request, job_id):
+        # Identical jobs are shared between users, so any signed-in user may
+        # follow one by its (unguessable) id
+        job = get_object_or_404(Job, pk=job_id)
+        return Response(job_state(job))
+
+async def job_stream(request, job_id):
+    """
+    Server-sent updates of a job until it finishes (see api.jobs.job_events)
+
+    Like the live quote stream, only served through the ASGI application.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'error': 'Job streams are only available through the ASGI server'}, status=501)
+    is_authenticated = await sync_to_async(lambda: request.user.is_authenticated)()
+    if not is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+    if not await Job.objects.filter(pk=job_id).aexists():
+        return JsonResponse({'error': 'Job not found'}, status=404)
+    
+    response = StreamingHttpResponse(job_events(job_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 class WatchlistAPIView(APIView):
     permission_classes = [IsAuthenticated]
@@ -274,29 +294,24 @@ class PortfolioAPIView(APIView):
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
-        portfolio_items = Portfolio.objects.filter(user=request.user)
-        result = []
+        # ?since=<cursor> returns only holdings changed after that cursor; full
+        # listings are paged with ?cursor= and ?page_size=
+        try:
+            since = parse_since(request.GET.get('since'))
+            page_size = page_size_param(request.GET.get('page_size'))
+        except ValueError:
+            return Response({'error': 'since and page_size must be integers'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if since is not None:
+            return Response(portfolio_changes(request.user, since))
         
-        for item in portfolio_items:
-            current_value = item.quantity * float(item.stock.current_price) if item.stock.current_price else 0
-            invested_value = item.quantity * float(item.buy_price)
-            profit_loss = current_value - invested_value
-            profit_loss_percent = (profit_loss / invested_value) * 100 if invested_value > 0 else 0
-            
-            result.append({
-                'id': item.id,
-                'symbol': item.stock.symbol,
-                'name': item.stock.name,
-                'quantity': item.quantity,
-                'buy_price': float(item.buy_price),
-                'current_price': float(item.stock.current_price) if item.stock.current_price else None,
-                'current_value': current_value,
-                'invested_value': invested_value,
-                'profit_loss': profit_loss,
-                'profit_loss_percent': profit_loss_percent
-            })
+        cursor = current_version()
+        # Values are computed in the same query that loads the holdings
+        holdings = valued_holdings(request.user)
+        page = keyset_page(holdings, ['stock__symbol'], request.GET.get('cursor'), page_size)
+        result = [holding_row(item) for item in page.items]
         
-        return Response(result)
+        return Response(result, headers=list_headers(request, holdings, page, cursor))
     
     def post(self, request):
         symbol = request.data.get('symbol')
@@ -332,6 +347,19 @@ class PortfolioAPIView(APIView):
         })
 
 
+class PortfolioHistoryAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request):
+        try:
+            start = datetime.date.fromisoformat(request.query_params['start']) if 'start' in request.query_params else None
+            end = datetime.date.fromisoformat(request.query_params['end']) if 'end' in request.query_params else None
+        except ValueError:
+            return Response({'error': 'start and end must be YYYY-MM-DD dates'},
+                           status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response(portfolio_history(request.user, start, end))
+
 @login_required
 def stock_data(request, symbol):
     # Placeholder for actual API implementation
@@ -3,7 +3,9 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.views import APIView
-from stocks.models import Stock, Watchlist
+from stocks.models import Stock, Watchlist, current_version
+from .sync import list_headers, parse_since, stock_quote, watchlist_changes
+from .pagination import keyset_page, page_size_param
 import yfinance as yf
 import logging
 
@@ -11,18 +13,26 @@ class WatchlistAPIView(APIView):
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
+        # ?since=<cursor> returns only what changed after that cursor; full
+        # listings are paged with ?cursor= and ?page_size=
         try:
-            watchlists = Watchlist.objects.filter(user=request.user)
+            since = parse_since(request.GET.get('since'))
+            page_size = page_size_param(request.GET.get('page_size'))
+        except ValueError:
+            return Response({'error': 'since and page_size must be integers'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            if since is not None:
+                return Response(watchlist_changes(request.user, since))
+            
+            cursor = current_version()
+            watchlists = Watchlist.objects.filter(user=request.user).prefetch_related('stocks')
+            page = keyset_page(watchlists, ['id'], request.GET.get('cursor'), page_size)
             watchlist_data = []
             
-            for watchlist in watchlists:
-                stocks_data = [{
-                    'symbol': stock.symbol,
-                    'name': stock.name,
-                    'current_price': stock.current_price,
-                    'change': stock.change,
-                    'change_percent': stock.change_percent
-                } for stock in watchlist.stocks.all()]
+            for watchlist in page.items:
+                stocks_data = [stock_quote(stock) for stock in watchlist.stocks.all()]
                 
                 watchlist_data.append({
                     'id': watchlist.id,
@@ -30,7 +40,7 @@ class WatchlistAPIView(APIView):
                     'stocks': stocks_data
                 })
             
-            return Response(watchlist_data)
+            return Response(watchlist_data, headers=list_headers(request, watchlists, page, cursor))
             
         except Exception as e:
             logger.error(f"Error fetching watchlists: {str(e)}")
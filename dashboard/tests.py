@@ -1,3 +1,158 @@
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.urls import reverse
+from django.contrib.auth.models import User
+from django.utils import timezone
+from stocks.models import Stock, Portfolio, StockNews, Watchlist
+from api.news import search_news
+from api.query_budget import assert_query_budget
+from decimal import Decimal
+import datetime
 
-# Create your tests here.
+class PortfolioPageTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.force_login(self.user)
+    
+    def add_holdings(self, start, count):
+        for i in range(start, start + count):
+            stock = Stock.objects.create(symbol=f'SYM{i}', name=f'Stock {i}', current_price=Decimal('10.00'))
+            Portfolio.objects.create(user=self.user, stock=stock, quantity=1, buy_price=Decimal('8.00'))
+    
+    def query_count(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+    
+    def test_portfolio_queries_do_not_grow_with_holdings(self):
+        url = reverse('dashboard:portfolio')
+        self.add_holdings(0, 3)
+        small = self.query_count(url)
+        self.add_holdings(3, 30)
+        
+        self.assertEqual(self.query_count(url), small)
+
+
+class NewsSearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.force_login(self.user)
+        published = timezone.now()
+        for i in range(25):
+            StockNews.objects.create(
+                title=f'Market wrap {i}',
+                content='Earnings season continues' if i % 5 else 'Semiconductor earnings beat expectations',
+                url=f'https://news.example.com/{i}',
+                source='Example',
+                published_at=published - datetime.timedelta(minutes=i % 3)
+            )
+        StockNews.objects.create(title='Semiconductor rally', content='Chip makers lead gains',
+                                 url='https://news.example.com/chips', source='Example',
+                                 published_at=published - datetime.timedelta(days=2))
+    
+    def collect(self, query):
+        seen = []
+        cursor = None
+        while True:
+            page = search_news(query, cursor=cursor, page_size=4)
+            seen.extend(news.id for news in page.items)
+            if not page.next_cursor:
+                return seen
+            cursor = page.next_cursor
+    
+    def test_browse_pages_cover_every_article_once(self):
+        seen = self.collect('')
+        self.assertEqual(len(seen), 26)
+        self.assertEqual(len(set(seen)), 26)
+    
+    def test_search_is_ranked_and_stays_in_sync(self):
+        first = search_news('semiconductor', page_size=10).items
+        # A title match outranks newer articles that only mention it in the content
+        self.assertEqual(first[0].title, 'Semiconductor rally')
+        self.assertEqual(len(self.collect('semiconductor')), 6)
+        
+        StockNews.objects.filter(title='Semiconductor rally').update(title='Chip rally')
+        self.assertEqual(len(self.collect('semiconductor')), 5)
+        StockNews.objects.filter(title='Chip rally').delete()
+        self.assertEqual(len(self.collect('chip')), 0)
+    
+    def test_news_view_avoids_count_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('dashboard:news'), {'search': 'earnings'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['news_list']), 10)
+        self.assertIsNotNone(response.context['next_cursor'])
+        self.assertFalse(any('COUNT(' in query['sql'].upper() for query in queries))
+
+
+class StockDetailQueryBudgetTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.force_login(self.user)
+        self.stock = Stock.objects.create(symbol='AAPL', name='Apple Inc.', current_price=Decimal('150.00'))
+        for i in range(20):
+            watchlist = Watchlist.objects.create(user=self.user, name=f'List {i}')
+            watchlist.stocks.add(Stock.objects.create(symbol=f'SYM{i}', name=f'Stock {i}'))
+        watchlist.stocks.add(self.stock)
+    
+    def test_stock_detail_within_budget(self):
+        with assert_query_budget('dashboard:stock_detail', max_queries=10, max_repeats=1):
+            response = self.client.get(reverse('dashboard:stock_detail', args=['AAPL']))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['in_watchlist'])
+
+class DashboardFragmentCacheTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.other = User.objects.create_user(username='other', password='testpass123')
+        self.client.force_login(self.user)
+        self.stock = Stock.objects.create(symbol='AAPL', name='Apple Inc.', current_price=Decimal('150.00'),
+                                          change=Decimal('1.00'), change_percent=Decimal('0.67'))
+        self.watchlist = Watchlist.objects.create(user=self.user, name='Main')
+        self.watchlist.stocks.add(self.stock)
+        Portfolio.objects.create(user=self.user, stock=self.stock, quantity=2, buy_price=Decimal('100.00'))
+    
+    def dashboard_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('dashboard:dashboard'))
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+    
+    def test_repeat_loads_render_from_cache(self):
+        response, cold = self.dashboard_queries()
+        self.assertContains(response, '$300.00')
+        response, warm = self.dashboard_queries()
+        self.assertContains(response, '$300.00')
+        self.assertContains(response, 'Main')
+        # Only the session and user lookups remain
+        self.assertLessEqual(warm, 2)
+        self.assertLess(warm, cold)
+    
+    def test_quote_update_invalidates_holders_only(self):
+        from api.fragments import panel_generations
+        self.dashboard_queries()
+        before = panel_generations(self.user.id)
+        other_before = panel_generations(self.other.id)
+        
+        self.stock.current_price = Decimal('160.00')
+        self.stock.save()
+        after = panel_generations(self.user.id)
+        self.assertNotEqual(after['portfolio'], before['portfolio'])
+        self.assertNotEqual(after['watchlists'], before['watchlists'])
+        self.assertEqual(panel_generations(self.other.id)['portfolio'], other_before['portfolio'])
+        
+        response, _ = self.dashboard_queries()
+        self.assertContains(response, '$320.00')
+    
+    def test_news_and_holdings_changes_invalidate(self):
+        self.dashboard_queries()
+        StockNews.objects.create(stock=self.stock, title='Fresh headline', content='', url='https://example.com/a',
+                                 source='Wire', published_at=timezone.now())
+        Portfolio.objects.filter(user=self.user).get().delete()
+        response, _ = self.dashboard_queries()
+        self.assertContains(response, 'Fresh headline')
+        self.assertContains(response, '$0.00')
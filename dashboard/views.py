@@ -1,46 +1,46 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
-from stocks.models import Stock, Watchlist, Portfolio, StockNews, StockPrediction, TradeSignal
-from django.core.paginator import Paginator
+from stocks.models import Stock, Watchlist, Portfolio, StockNews, StockPrediction, TradeSignal, PredictionAccuracy
 from django.db.models import F, ExpressionWrapper, DecimalField, Sum
 from decimal import Decimal
 from api.angel_api import AngelBrokingAPI
 from api.prediction import predict_stock_price
 from api.strategy import enhanced_pullback_strategy
+from api.portfolio import portfolio_valuation
+from api.news import search_news
+from api.movers import top_movers
+from api.fragments import FRAGMENT_CACHE_TIMEOUT, panel_generations
+from django.utils.functional import SimpleLazyObject
 import json
 
 def dashboard(request):
     if not request.user.is_authenticated:
         return render(request, 'dashboard/home.html')
         
-    # Get user's watchlists
-    watchlists = Watchlist.objects.filter(user=request.user)
+    # Panels are cached as template fragments keyed by their generation, so
+    # the data below is only loaded when a panel has to be rendered again
+    user = request.user
     
-    # Get user's portfolio
-    portfolio_items = Portfolio.objects.filter(user=request.user)
+    # Get user's watchlists
+    watchlists = Watchlist.objects.filter(user=user).prefetch_related('stocks')
     
-    # Calculate portfolio summary
-    total_investment = sum(item.quantity * item.buy_price for item in portfolio_items)
-    current_value = sum(item.quantity * item.stock.current_price for item in portfolio_items if item.stock.current_price)
-    profit_loss = current_value - total_investment
-    profit_loss_percent = (profit_loss / total_investment * 100) if total_investment > 0 else 0
+    # Get user's portfolio with its summary computed in the database
+    valuation = SimpleLazyObject(lambda: portfolio_valuation(user))
     
     # Get latest news
     latest_news = StockNews.objects.order_by('-published_at')[:5]
     
-    # Get trending stocks (simplified for demo)
-    trending_stocks = Stock.objects.filter(current_price__isnull=False).order_by('-change_percent')[:5]
+    # Top gainers from the shared, incrementally maintained movers cache
+    trending_stocks = SimpleLazyObject(lambda: top_movers(5)['gainers'])
     
     context = {
         'watchlists': watchlists,
-        'portfolio_items': portfolio_items,
-        'total_investment': total_investment,
-        'current_value': current_value,
-        'profit_loss': profit_loss,
-        'profit_loss_percent': profit_loss_percent,
+        'valuation': valuation,
         'latest_news': latest_news,
-        'trending_stocks': trending_stocks
+        'trending_stocks': trending_stocks,
+        'fragments': panel_generations(user.id),
+        'fragment_timeout': FRAGMENT_CACHE_TIMEOUT
     }
     
     return render(request, 'dashboard/dashboard.html', context)
@@ -92,21 +92,8 @@ def portfolio(request):
             
             return JsonResponse({'status': 'success'})
     
-    portfolio_items = Portfolio.objects.filter(user=request.user)
-    
-    # Calculate portfolio summary
-    total_investment = sum(item.quantity * item.buy_price for item in portfolio_items)
-    current_value = sum(item.quantity * item.stock.current_price for item in portfolio_items if item.stock.current_price)
-    profit_loss = current_value - total_investment
-    profit_loss_percent = (profit_loss / total_investment * 100) if total_investment > 0 else 0
-    
-    context = {
-        'portfolio_items': portfolio_items,
-        'total_investment': total_investment,
-        'current_value': current_value,
-        'profit_loss': profit_loss,
-        'profit_loss_percent': profit_loss_percent
-    }
+    # Holdings and summary are valued in the database
+    context = portfolio_valuation(request.user)
     
     return render(request, 'dashboard/portfolio.html', context)
 
@@ -115,11 +102,7 @@ def stock_detail(request, symbol):
     stock = get_object_or_404(Stock, symbol=symbol)
     
     # Check if stock is in user's watchlist
-    in_watchlist = False
-    for watchlist in Watchlist.objects.filter(user=request.user):
-        if stock in watchlist.stocks.all():
-            in_watchlist = True
-            break
+    in_watchlist = Watchlist.objects.filter(user=request.user, stocks=stock).exists()
     
     # Check if stock is in user's portfolio
     in_portfolio = Portfolio.objects.filter(user=request.user, stock=stock).exists()
@@ -183,21 +166,8 @@ def watchlist_view(request):
 
 @login_required
 def portfolio_view(request):
-    portfolio_items = Portfolio.objects.filter(user=request.user)
-    
-    # Calculate portfolio summary
-    total_investment = sum(item.quantity * item.buy_price for item in portfolio_items)
-    current_value = sum(item.quantity * item.stock.current_price for item in portfolio_items if item.stock.current_price)
-    profit_loss = current_value - total_investment
-    profit_loss_percent = (profit_loss / total_investment * 100) if total_investment > 0 else 0
-    
-    context = {
-        'portfolio_items': portfolio_items,
-        'total_investment': total_investment,
-        'current_value': current_value,
-        'profit_loss': profit_loss,
-        'profit_loss_percent': profit_loss_percent
-    }
+    # Holdings and summary are valued in the database
+    context = portfolio_valuation(request.user)
     
     return render(request, 'dashboard/portfolio.html', context)
 
@@ -273,18 +243,15 @@ def delete_portfolio_item(request, stock_id):
 @login_required
 def news_view(request):
     search_query = request.GET.get('search', '')
+    cursor = request.GET.get('cursor')
     
-    if search_query:
-        news_list = StockNews.objects.filter(title__icontains=search_query).order_by('-published_at')
-    else:
-        news_list = StockNews.objects.all().order_by('-published_at')
-    
-    paginator = Paginator(news_list, 10)  # Show 10 news items per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Relevance-ranked full-text search, keyset paginated (10 news items per page)
+    news_page = search_news(search_query, cursor=cursor, page_size=10)
     
     context = {
-        'news_list': page_obj,
+        'news_list': news_page.items,
+        'next_cursor': news_page.next_cursor,
+        'is_first_page': not cursor,
         'search_query': search_query
     }
     
@@ -299,8 +266,12 @@ def prediction_view(request, symbol=None):
         except Stock.DoesNotExist:
             pass
     
+    # Rolling accuracy is precomputed by the evaluate_predictions job
+    accuracy = PredictionAccuracy.objects.filter(stock=stock).order_by('mape') if stock else []
+    
     context = {
-        'stock': stock
+        'stock': stock,
+        'accuracy': accuracy
     }
     
     return render(request, 'dashboard/prediction.html', context)
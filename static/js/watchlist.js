@@ -4,6 +4,7 @@ class WatchlistManager {
     constructor() {
         this.initializeEventListeners();
         this.searchDebounceTimer = null;
+        this.subscribeToQuotes();
     }
 
     initializeEventListeners() {
@@ -268,6 +269,34 @@ class WatchlistManager {
     getCsrfToken() {
         return document.querySelector('[name=csrfmiddlewaretoken]').value;
     }
+
+    subscribeToQuotes() {
+        const rows = document.querySelectorAll('[data-quote]');
+        const symbols = [...new Set([...rows].map(row => row.dataset.quote))];
+        if (!symbols.length || !window.EventSource) {
+            return;
+        }
+
+        // One stream for every symbol on the page; the server batches updates
+        const source = new EventSource(`/api/quotes/stream/?symbols=${encodeURIComponent(symbols.join(','))}`);
+        source.addEventListener('quotes', (event) => {
+            JSON.parse(event.data).forEach(quote => this.updateQuote(quote));
+        });
+    }
+
+    updateQuote(quote) {
+        document.querySelectorAll(`[data-quote="${quote.symbol}"]`).forEach(row => {
+            if (quote.price !== null) {
+                row.querySelector('.quote-price').textContent = `$${quote.price.toFixed(2)}`;
+            }
+            if (quote.change !== null && quote.change_percent !== null) {
+                const cell = row.querySelector('.quote-change');
+                cell.textContent = `${quote.change.toFixed(2)} (${quote.change_percent.toFixed(2)}%)`;
+                cell.classList.toggle('positive', quote.change >= 0);
+                cell.classList.toggle('negative', quote.change < 0);
+            }
+        });
+    }
 }
 
 // Initialize watchlist manager when DOM is loaded
@@ -0,0 +1,16 @@
+import datetime
+from zoneinfo import ZoneInfo
+
+# Regular trading session of each exchange, in its local time
+EXCHANGES = {
+    'NSE': {'tz': ZoneInfo('Asia/Kolkata'), 'open': datetime.time(9, 15), 'close': datetime.time(15, 30)},
+    'BSE': {'tz': ZoneInfo('Asia/Kolkata'), 'open': datetime.time(9, 15), 'close': datetime.time(15, 30)},
+    'NYSE': {'tz': ZoneInfo('America/New_York'), 'open': datetime.time(9, 30), 'close': datetime.time(16, 0)},
+    'NASDAQ': {'tz': ZoneInfo('America/New_York'), 'open': datetime.time(9, 30), 'close': datetime.time(16, 0)},
+}
+# Quotes and history come from Angel Broking, so stocks are NSE listings unless stated
+DEFAULT_EXCHANGE = 'NSE'
+
+def exchange_session(exchange=None):
+    """Time zone and session hours of exchange, the default exchange's for unknown ones"""
+    return EXCHANGES.get(exchange or DEFAULT_EXCHANGE, EXCHANGES[DEFAULT_EXCHANGE])
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0002_alter_stocknews_options_stock_previous_close_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PredictionAccuracy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_type', models.CharField(max_length=20)),
+                ('window_days', models.PositiveIntegerField()),
+                ('sample_count', models.PositiveIntegerField()),
+                ('mae', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('rmse', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('mape', models.DecimalField(decimal_places=4, max_digits=8)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Prediction accuracy',
+            },
+        ),
+        migrations.AddField(
+            model_name='stockprediction',
+            name='abs_pct_error',
+            field=models.DecimalField(blank=True, decimal_places=4, max_digits=8, null=True),
+        ),
+        migrations.AddField(
+            model_name='stockprediction',
+            name='error',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='stockprediction',
+            name='evaluated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='stockprediction',
+            name='model_type',
+            field=models.CharField(default='linear', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='stockprediction',
+            name='realized_price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='stockprediction',
+            index=models.Index(fields=['evaluated_at', 'prediction_date'], name='stocks_stoc_evaluat_4aa49d_idx'),
+        ),
+        migrations.AddField(
+            model_name='predictionaccuracy',
+            name='stock',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='stocks.stock'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='predictionaccuracy',
+            unique_together={('stock', 'model_type')},
+        ),
+    ]
@@ -0,0 +1,38 @@
+import hashlib
+from django.db import migrations, models
+
+
+def populate_url_hash(apps, schema_editor):
+    StockNews = apps.get_model('stocks', 'StockNews')
+    seen = set()
+    duplicates = []
+    for news in StockNews.objects.order_by('id').iterator():
+        url_hash = hashlib.sha256(news.url.strip().encode('utf-8')).hexdigest()
+        if url_hash in seen:
+            duplicates.append(news.id)
+            continue
+        seen.add(url_hash)
+        news.url_hash = url_hash
+        news.save(update_fields=['url_hash'])
+    StockNews.objects.filter(id__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0004_pricebar'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stocknews',
+            name='url_hash',
+            field=models.CharField(editable=False, max_length=64, null=True),
+        ),
+        migrations.RunPython(populate_url_hash, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='stocknews',
+            name='url_hash',
+            field=models.CharField(editable=False, max_length=64, unique=True),
+        ),
+    ]
@@ -0,0 +1,97 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:11
+
+from django.db import migrations, models
+
+# SQLite: external-content FTS5 table kept in sync with stocks_stocknews by
+# triggers. Note that SQLite migrations which rebuild stocks_stocknews drop
+# these triggers and must recreate them.
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE stocks_stocknews_fts USING fts5(
+        title, content, content='stocks_stocknews', content_rowid='id', tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER stocks_stocknews_fts_ai AFTER INSERT ON stocks_stocknews BEGIN
+        INSERT INTO stocks_stocknews_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER stocks_stocknews_fts_ad AFTER DELETE ON stocks_stocknews BEGIN
+        INSERT INTO stocks_stocknews_fts(stocks_stocknews_fts, rowid, title, content)
+        VALUES ('delete', old.id, old.title, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER stocks_stocknews_fts_au AFTER UPDATE OF title, content ON stocks_stocknews BEGIN
+        INSERT INTO stocks_stocknews_fts(stocks_stocknews_fts, rowid, title, content)
+        VALUES ('delete', old.id, old.title, old.content);
+        INSERT INTO stocks_stocknews_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END
+    """,
+    "INSERT INTO stocks_stocknews_fts(stocks_stocknews_fts) VALUES ('rebuild')",
+]
+
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS stocks_stocknews_fts_ai",
+    "DROP TRIGGER IF EXISTS stocks_stocknews_fts_ad",
+    "DROP TRIGGER IF EXISTS stocks_stocknews_fts_au",
+    "DROP TABLE IF EXISTS stocks_stocknews_fts",
+]
+
+# PostgreSQL: a generated, weighted tsvector column maintained by the database
+POSTGRES_FORWARD = [
+    """
+    ALTER TABLE stocks_stocknews ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(content, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX stocks_stocknews_search_idx ON stocks_stocknews USING GIN (search_vector)",
+]
+
+POSTGRES_REVERSE = [
+    "DROP INDEX IF EXISTS stocks_stocknews_search_idx",
+    "ALTER TABLE stocks_stocknews DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def sqlite_has_fts5(schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite' and sqlite_has_fts5(schema_editor):
+        statements = SQLITE_FORWARD
+    elif vendor == 'postgresql':
+        statements = POSTGRES_FORWARD
+    else:
+        # Other backends fall back to icontains search
+        return
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    statements = {'sqlite': SQLITE_REVERSE, 'postgresql': POSTGRES_REVERSE}.get(vendor, [])
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0005_stocknews_url_hash'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stocknews',
+            index=models.Index(fields=['-published_at', '-id'], name='stock_news_published_idx'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
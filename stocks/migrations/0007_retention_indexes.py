@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0006_stocknews_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stockprediction',
+            index=models.Index(fields=['created_at'], name='stocks_stoc_created_3fc476_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockprediction',
+            index=models.Index(fields=['prediction_date'], name='stocks_stoc_predict_d1d16f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tradesignal',
+            index=models.Index(fields=['created_at'], name='stocks_trad_created_2ce4df_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0008_portfoliosnapshot'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(condition=models.Q(('current_price__isnull', False)), fields=['change_percent'], name='stock_movers_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:32
+
+from django.db import migrations, models
+
+
+def number_existing_rows(apps, schema_editor):
+    # Give every existing row its own version so a since=0 sync returns it
+    version = 0
+    for model_name in ['Stock', 'Watchlist', 'Portfolio']:
+        model = apps.get_model('stocks', model_name)
+        for pk in model.objects.order_by('pk').values_list('pk', flat=True).iterator():
+            version += 1
+            model.objects.filter(pk=pk).update(version=version)
+    apps.get_model('stocks', 'SyncCounter').objects.create(name='sync', value=version)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0009_stock_movers_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncCounter',
+            fields=[
+                ('name', models.CharField(max_length=20, primary_key=True, serialize=False)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='portfolio',
+            name='version',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='stock',
+            name='version',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='watchlist',
+            name='version',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.RunPython(number_existing_rows, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:59
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0011_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='dispatched_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0012_job_attempts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stock',
+            name='exchange',
+            field=models.CharField(choices=[('NSE', 'NSE'), ('BSE', 'BSE'), ('NYSE', 'NYSE'), ('NASDAQ', 'NASDAQ')], default='NSE', max_length=10),
+        ),
+    ]
@@ -0,0 +1,34 @@
+from django.db import migrations
+
+
+def create_sequence(apps, schema_editor):
+    # PostgreSQL allocates sync versions from a sequence, continuing after the counter
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    counter = apps.get_model('stocks', 'SyncCounter').objects.filter(name='sync').first()
+    schema_editor.execute("CREATE SEQUENCE IF NOT EXISTS stocks_sync_version_seq AS bigint MINVALUE 0 START 1")
+    if counter is not None and counter.value > 0:
+        schema_editor.execute("SELECT setval('stocks_sync_version_seq', %s)", [counter.value])
+
+
+def drop_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    # The counter row takes over allocation again from the last version handed out
+    schema_editor.execute(
+        "UPDATE stocks_synccounter SET value = GREATEST(value, "
+        "(SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM stocks_sync_version_seq)) "
+        "WHERE name = 'sync'"
+    )
+    schema_editor.execute("DROP SEQUENCE IF EXISTS stocks_sync_version_seq")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0013_stock_exchange'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_sequence, drop_sequence),
+    ]
@@ -1,9 +1,117 @@
-from django.db import models
+import hashlib
+import uuid
+from django.db import connections, models, router, transaction
 from django.contrib.auth.models import User
+from django.utils import timezone
+from .exchanges import DEFAULT_EXCHANGE, EXCHANGES
 
-class Stock(models.Model):
+def news_url_hash(url):
+    """Deduplication key for news articles"""
+    return hashlib.sha256(url.strip().encode('utf-8')).hexdigest()
+
+SYNC_COUNTER = 'sync'
+# PostgreSQL hands versions out from this sequence rather than the counter row
+SYNC_SEQUENCE = 'stocks_sync_version_seq'
+# Advisory lock (two-key form, so it cannot collide with the single-key
+# version leases) serialising version allocation with watermark reads
+SYNC_ALLOCATION_LOCK = (0x53594E43, 1)
+
+# Lowest version still leased by an open transaction, or the last one handed out
+POSTGRES_WATERMARK = f"""
+    SELECT COALESCE(
+        (SELECT MIN((classid::bigint << 32) | objid::bigint) - 1 FROM pg_locks
+         WHERE locktype = 'advisory' AND objsubid = 1
+           AND database = (SELECT oid FROM pg_database WHERE datname = current_database())),
+        (SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM {SYNC_SEQUENCE})
+    )
+"""
+
+def next_versions(count=1):
+    """
+    Reserve count consecutive sync versions and return the first
+
+    Must run inside the transaction that writes the versioned rows. The
+    counter (current_version) only moves past a version once its rows are
+    committed.
+
+    On PostgreSQL the versions come from a sequence, so concurrent writers do
+    not queue on one row: each transaction holds an advisory lock on its first
+    version until it ends, and after commit the counter is advanced to just
+    below the lowest version still locked. Elsewhere the counter row is bumped
+    in the transaction and stays locked until it commits, which serialises
+    writers as SQLite does anyway.
+    """
+    alias = router.db_for_write(SyncCounter)
+    connection = connections[alias]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_lock(%s, %s)", SYNC_ALLOCATION_LOCK)
+            try:
+                # A savepoint, so a failure here still leaves the transaction able to unlock
+                with transaction.atomic(using=alias):
+                    cursor.execute(f"SELECT setval('{SYNC_SEQUENCE}', nextval('{SYNC_SEQUENCE}') + %s - 1)", [count])
+                    first = cursor.fetchone()[0] - count + 1
+                    cursor.execute("SELECT pg_advisory_xact_lock(%s)", [first])
+            finally:
+                cursor.execute("SELECT pg_advisory_unlock(%s, %s)", SYNC_ALLOCATION_LOCK)
+        transaction.on_commit(lambda: publish_versions(alias), using=alias)
+        return first
+
+    counter = SyncCounter.objects.filter(name=SYNC_COUNTER)
+    if not counter.update(value=models.F('value') + count):
+        SyncCounter.objects.create(name=SYNC_COUNTER, value=count)
+    return counter.values_list('value', flat=True).get() - count + 1
+
+def publish_versions(alias):
+    """Advance the PostgreSQL counter to the highest version below which all are committed"""
+    with connections[alias].cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_lock(%s, %s)", SYNC_ALLOCATION_LOCK)
+        try:
+            cursor.execute(f"UPDATE stocks_synccounter SET value = GREATEST(value, ({POSTGRES_WATERMARK})) "
+                           f"WHERE name = %s", [SYNC_COUNTER])
+        finally:
+            cursor.execute("SELECT pg_advisory_unlock(%s, %s)", SYNC_ALLOCATION_LOCK)
+
+def current_version():
+    """Highest sync version whose changes are all committed, the cursor for changes made after now"""
+    return SyncCounter.objects.filter(name=SYNC_COUNTER).values_list('value', flat=True).first() or 0
+
+class SyncCounter(models.Model):
+    """Monotonic counter handing out versions for delta sync"""
+    name = models.CharField(max_length=20, primary_key=True)
+    value = models.BigIntegerField(default=0)
+
+class VersionedQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        """Update the rows and stamp them with one new sync version, as save() does"""
+        if 'version' in kwargs:
+            return super().update(**kwargs)
+        with transaction.atomic(using=router.db_for_write(self.model)):
+            return super().update(version=next_versions(), **kwargs)
+
+class Versioned(models.Model):
+    """Rows stamped with a new sync version on every save or update(), for since-cursor queries"""
+    version = models.BigIntegerField(default=0, db_index=True, editable=False)
+    
+    objects = VersionedQuerySet.as_manager()
+    
+    def save(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using')):
+            self.version = next_versions()
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'version'}
+            super().save(*args, **kwargs)
+    
+    class Meta:
+        abstract = True
+
+class Stock(Versioned):
     symbol = models.CharField(max_length=10, unique=True)
     name = models.CharField(max_length=100)
+    # Listing exchange, whose time zone and session hours apply to the stock's data
+    exchange = models.CharField(max_length=10, choices=[(code, code) for code in EXCHANGES],
+                                default=DEFAULT_EXCHANGE)
     current_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     previous_close = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     change = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
@@ -12,8 +120,42 @@ class Stock(models.Model):
     
     def __str__(self):
         return f"{self.symbol} - {self.name}"
+    
+    class Meta:
+        indexes = [
+            # Top movers ranking over quoted stocks
+            models.Index(fields=['change_percent'], condition=models.Q(current_price__isnull=False),
+                         name='stock_movers_idx'),
+        ]
+
+class PriceBar(models.Model):
+    INTERVAL_CHOICES = (
+        ('1m', '1 Minute'),
+        ('5m', '5 Minutes'),
+        ('1h', '1 Hour'),
+        ('1d', '1 Day'),
+        ('1wk', '1 Week'),
+    )
+    
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='bars')
+    interval = models.CharField(max_length=3, choices=INTERVAL_CHOICES, default='1d')
+    timestamp = models.DateTimeField()
+    open = models.FloatField()
+    high = models.FloatField()
+    low = models.FloatField()
+    close = models.FloatField()
+    volume = models.BigIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.stock.symbol} {self.interval} {self.timestamp:%Y-%m-%d %H:%M}"
+    
+    class Meta:
+        # Also serves as the (stock, interval, timestamp) index for range scans
+        constraints = [
+            models.UniqueConstraint(fields=['stock', 'interval', 'timestamp'], name='unique_price_bar'),
+        ]
 
-class Watchlist(models.Model):
+class Watchlist(Versioned):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     name = models.CharField(max_length=50)
     stocks = models.ManyToManyField(Stock)
@@ -25,7 +167,7 @@ class Watchlist(models.Model):
     class Meta:
         unique_together = ('user', 'name')
 
-class Portfolio(models.Model):
+class Portfolio(Versioned):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     stock = models.ForeignKey(Stock, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField()
@@ -38,31 +180,89 @@ class Portfolio(models.Model):
     class Meta:
         unique_together = ('user', 'stock')
 
+class PortfolioSnapshot(models.Model):
+    """End-of-day value of a user's holdings, for equity curves"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='portfolio_snapshots')
+    date = models.DateField()
+    market_value = models.DecimalField(max_digits=20, decimal_places=2)
+    invested_value = models.DecimalField(max_digits=20, decimal_places=2)
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.date}: {self.market_value}"
+    
+    class Meta:
+        # Also the (user, date) index history charts range-scan
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'date'], name='unique_portfolio_snapshot'),
+        ]
+
 class StockNews(models.Model):
     stock = models.ForeignKey(Stock, on_delete=models.CASCADE, null=True, blank=True)
     title = models.CharField(max_length=200)
     content = models.TextField()
     url = models.URLField()
     source = models.CharField(max_length=100)
+    url_hash = models.CharField(max_length=64, unique=True, editable=False)
     published_at = models.DateTimeField()
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
         return self.title
     
+    def save(self, *args, **kwargs):
+        self.url_hash = news_url_hash(self.url)
+        super().save(*args, **kwargs)
+    
     class Meta:
         ordering = ['-published_at']
         verbose_name_plural = 'Stock News'
+        indexes = [
+            # Keyset pagination order for the news feed
+            models.Index(fields=['-published_at', '-id'], name='stock_news_published_idx'),
+        ]
 
 class StockPrediction(models.Model):
     stock = models.ForeignKey(Stock, on_delete=models.CASCADE)
+    model_type = models.CharField(max_length=20, default='linear')
     prediction_date = models.DateField()
     predicted_price = models.DecimalField(max_digits=10, decimal_places=2)
     confidence = models.DecimalField(max_digits=5, decimal_places=2)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    # Filled in once the prediction date has a realized close
+    realized_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    error = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    abs_pct_error = models.DecimalField(max_digits=8, decimal_places=4, null=True, blank=True)
+    evaluated_at = models.DateTimeField(null=True, blank=True)
+    
     def __str__(self):
         return f"{self.stock.symbol} - {self.prediction_date}"
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['evaluated_at', 'prediction_date']),
+            # Retention cutoffs
+            models.Index(fields=['created_at']),
+            models.Index(fields=['prediction_date']),
+        ]
+
+class PredictionAccuracy(models.Model):
+    """Rolling accuracy of matured predictions per stock and model"""
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE)
+    model_type = models.CharField(max_length=20)
+    window_days = models.PositiveIntegerField()
+    sample_count = models.PositiveIntegerField()
+    mae = models.DecimalField(max_digits=10, decimal_places=2)
+    rmse = models.DecimalField(max_digits=10, decimal_places=2)
+    mape = models.DecimalField(max_digits=8, decimal_places=4)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.stock.symbol} - {self.model_type} ({self.mape}%)"
+    
+    class Meta:
+        unique_together = ('stock', 'model_type')
+        verbose_name_plural = 'Prediction accuracy'
 
 class TradeSignal(models.Model):
     SIGNAL_CHOICES = (
@@ -79,3 +279,51 @@ class TradeSignal(models.Model):
     
     def __str__(self):
         return f"{self.stock.symbol} - {self.signal} at {self.price}"
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at']),
+        ]
+
+class Job(models.Model):
+    """Background run of a heavy analysis request (see api.jobs)"""
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    )
+    ACTIVE_STATUSES = ('queued', 'running')
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='jobs')
+    kind = models.CharField(max_length=20)
+    params = models.JSONField()
+    # Deduplication key of kind and params
+    params_hash = models.CharField(max_length=64)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    # Times a worker claimed the job; lost jobs are retried up to a limit
+    attempts = models.PositiveSmallIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Last hand-off to a worker pool, to notice dispatches that never arrived
+    dispatched_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"{self.kind} {self.params} ({self.status})"
+    
+    class Meta:
+        indexes = [
+            # Per-user concurrency limit
+            models.Index(fields=['user', 'status']),
+            # Retention cutoff
+            models.Index(fields=['created_at']),
+        ]
+        constraints = [
+            # At most one queued or running job per identical request
+            models.UniqueConstraint(fields=['kind', 'params_hash'], condition=models.Q(status__in=('queued', 'running')),
+                                    name='unique_active_job'),
+        ]
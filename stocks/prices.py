@@ -0,0 +1,133 @@
+import datetime
+import numpy as np
+import pandas as pd
+from .exchanges import exchange_session
+from .models import PriceBar, Stock
+
+BAR_FIELDS = ['open', 'high', 'low', 'close', 'volume']
+
+def upsert_bars(stock, bars, interval='1d', batch_size=2000):
+    """
+    Insert or update price bars in bulk, one statement per batch
+
+    Args:
+        stock: Stock instance the bars belong to
+        bars: DataFrame indexed by timestamp with open/high/low/close/volume
+            columns (yfinance's capitalized names are accepted)
+        interval: Bar interval, one of PriceBar.INTERVAL_CHOICES
+        batch_size: Rows per INSERT ... ON CONFLICT statement (Django lowers
+            this further on backends with a bound-parameter limit, e.g. SQLite)
+
+    Returns:
+        Number of bars written
+    """
+    if bars is None or bars.empty:
+        return 0
+
+    df = bars.rename(columns=str.lower)[BAR_FIELDS].dropna(subset=['close'])
+    index = pd.DatetimeIndex(df.index)
+    index = index.tz_localize('UTC') if index.tz is None else index.tz_convert('UTC')
+
+    objs = [
+        PriceBar(stock=stock, interval=interval, timestamp=timestamp,
+                 open=row.open, high=row.high, low=row.low, close=row.close,
+                 volume=int(row.volume) if row.volume == row.volume else 0)
+        for timestamp, row in zip(index.to_pydatetime(), df.itertuples(index=False))
+    ]
+    PriceBar.objects.bulk_create(
+        objs, batch_size=batch_size, update_conflicts=True,
+        unique_fields=['stock', 'interval', 'timestamp'], update_fields=BAR_FIELDS
+    )
+    return len(objs)
+
+def bar_range(stock, interval='1d', start=None, end=None):
+    """Bars for one stock and interval in [start, end], ordered by timestamp"""
+    bars = PriceBar.objects.filter(stock=stock, interval=interval)
+    if start is not None:
+        bars = bars.filter(timestamp__gte=start)
+    if end is not None:
+        bars = bars.filter(timestamp__lte=end)
+    return bars.order_by('timestamp')
+
+def price_arrays(stock, interval='1d', start=None, end=None, fields=('close',)):
+    """
+    Range query returning NumPy arrays straight from values_list
+
+    No model instances are built; the rows are unpacked column-wise.
+    Timestamps are given in the wall time of the stock's exchange, so a
+    daily bar truncates to its trading date (NSE daily bars are stored at IST
+    midnight, the previous day in UTC).
+
+    Returns:
+        Dictionary with a naive datetime64[ns] exchange-local 'timestamp'
+        array and one float64 array per requested field
+    """
+    rows = list(bar_range(stock, interval, start, end).values_list('timestamp', *fields))
+    if not rows:
+        return {'timestamp': np.array([], dtype='datetime64[ns]'),
+                **{field: np.array([], dtype=np.float64) for field in fields}}
+
+    columns = list(zip(*rows))
+    tz = exchange_session(stock.exchange)['tz']
+    arrays = {
+        'timestamp': pd.DatetimeIndex(columns[0]).tz_convert(tz).tz_localize(None).values.astype('datetime64[ns]')
+    }
+    for field, values in zip(fields, columns[1:]):
+        arrays[field] = np.fromiter(values, dtype=np.float64, count=len(rows))
+    return arrays
+
+def price_frame(stock, interval='1d', start=None, end=None):
+    """Stored bars as a DataFrame with lowercase OHLCV columns indexed by exchange-local timestamp"""
+    arrays = price_arrays(stock, interval, start, end, fields=BAR_FIELDS)
+    return pd.DataFrame({field: arrays[field] for field in BAR_FIELDS},
+                        index=pd.DatetimeIndex(arrays['timestamp'], name='timestamp'))
+
+def day_range(start, end, exchanges=None):
+    """
+    Aware datetimes bounding the dates [start, end] as [lower, upper)
+
+    The bounds are local midnights of the given exchanges, widened to cover
+    all of them, or UTC midnights without exchanges. Filtering on timestamp
+    itself rather than timestamp__date keeps the (stock, interval, timestamp)
+    index usable.
+    """
+    zones = {exchange_session(exchange)['tz'] for exchange in exchanges} if exchanges else {datetime.timezone.utc}
+    lower = min(datetime.datetime.combine(start, datetime.time.min, tzinfo=tz) for tz in zones)
+    upper = max(datetime.datetime.combine(end + datetime.timedelta(days=1), datetime.time.min, tzinfo=tz)
+                for tz in zones)
+    return lower, upper
+
+def trading_dates(timestamps, exchanges):
+    """
+    Exchange-local trading dates, as naive midnights, of aware bar timestamps
+
+    Args:
+        timestamps: Sequence of aware timestamps
+        exchanges: Sequence of the exchange of each timestamp's stock
+    """
+    timestamps = pd.Series(pd.to_datetime(list(timestamps), utc=True))
+    # Unknown stocks fall back to the default exchange
+    exchanges = pd.Series(list(exchanges), index=timestamps.index, dtype=object).fillna('')
+    dates = pd.Series(pd.NaT, index=timestamps.index, dtype='datetime64[ns]')
+    for exchange in exchanges.unique():
+        same = exchanges == exchange
+        local = timestamps[same].dt.tz_convert(exchange_session(exchange)['tz'])
+        dates[same] = local.dt.tz_localize(None).dt.normalize()
+    return dates
+
+def stored_closes(symbols, start, end, interval='1d'):
+    """
+    Long-format (symbol, date, close) frame for many symbols
+
+    Dates are the trading dates of each stock's exchange, so closes line up
+    with yfinance's exchange-local history.
+    """
+    exchanges = set(Stock.objects.filter(symbol__in=symbols).values_list('exchange', flat=True))
+    lower, upper = day_range(start, end, exchanges)
+    rows = PriceBar.objects.filter(
+        stock__symbol__in=symbols, interval=interval, timestamp__gte=lower, timestamp__lt=upper
+    ).values_list('stock__symbol', 'stock__exchange', 'timestamp', 'close')
+    closes = pd.DataFrame(list(rows), columns=['symbol', 'exchange', 'date', 'close'])
+    closes['date'] = trading_dates(closes['date'], closes['exchange'])
+    in_range = (closes['date'] >= pd.Timestamp(start)) & (closes['date'] <= pd.Timestamp(end))
+    return closes.loc[in_range, ['symbol', 'date', 'close']].reset_index(drop=True)
@@ -1,3 +1,110 @@
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.contrib.auth.models import User
+from django.urls import reverse
+from django.test import override_settings
+from stocks.models import Stock, PriceBar, Watchlist
+from api.query_budget import assert_query_budget, query_shape, QueryBudgetExceeded
+from stocks.prices import upsert_bars, price_arrays, price_frame, stored_closes
+import datetime
+import numpy as np
+import pandas as pd
 
-# Create your tests here.
+class PriceBarTests(TestCase):
+    def setUp(self):
+        self.stock = Stock.objects.create(symbol='AAPL', name='Apple Inc.')
+        dates = pd.date_range('2020-01-01', periods=3000, freq='D', tz='America/New_York')
+        close = np.linspace(100, 200, 3000)
+        self.bars = pd.DataFrame({
+            'Open': close - 1, 'High': close + 1, 'Low': close - 2, 'Close': close, 'Volume': 1000
+        }, index=dates)
+    
+    def test_upsert_is_batched_and_idempotent(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(upsert_bars(self.stock, self.bars), 3000)
+        self.assertLess(len(queries), 50)
+        
+        revised = self.bars.iloc[-5:].copy()
+        revised['Close'] = 1.0
+        upsert_bars(self.stock, revised)
+        
+        self.assertEqual(PriceBar.objects.filter(stock=self.stock).count(), 3000)
+        self.assertEqual(PriceBar.objects.filter(stock=self.stock, close=1.0).count(), 5)
+    
+    def test_range_query_returns_arrays(self):
+        upsert_bars(self.stock, self.bars)
+        start = datetime.datetime(2021, 1, 1, tzinfo=datetime.timezone.utc)
+        end = datetime.datetime(2021, 2, 1, tzinfo=datetime.timezone.utc)
+        
+        arrays = price_arrays(self.stock, '1d', start, end, fields=('close', 'volume'))
+        
+        self.assertEqual(len(arrays['close']), 31)
+        self.assertEqual(arrays['close'].dtype, np.float64)
+        self.assertEqual(arrays['timestamp'].dtype, np.dtype('datetime64[ns]'))
+        self.assertTrue((np.diff(arrays['timestamp']) > np.timedelta64(0)).all())
+        self.assertEqual(list(price_frame(self.stock, '1d', start, end).columns),
+                         ['open', 'high', 'low', 'close', 'volume'])
+    
+    def test_daily_bars_keep_their_exchange_trading_date(self):
+        stock = Stock.objects.create(symbol='RELIANCE', name='Reliance Industries', exchange='NSE')
+        dates = pd.date_range('2026-01-05', periods=5, freq='B', tz='Asia/Kolkata')
+        upsert_bars(stock, pd.DataFrame({'Open': 1.0, 'High': 1.0, 'Low': 1.0, 'Close': [10.0, 11.0, 12.0, 13.0, 14.0],
+                                         'Volume': 1}, index=dates))
+        # Monday's bar is stored at 18:30 UTC on Sunday
+        self.assertEqual(PriceBar.objects.filter(stock=stock).earliest('timestamp').timestamp.date(),
+                         datetime.date(2026, 1, 4))
+        
+        closes = stored_closes(['RELIANCE'], datetime.date(2026, 1, 5), datetime.date(2026, 1, 9))
+        self.assertEqual(list(closes['date'].dt.date), [datetime.date(2026, 1, d) for d in range(5, 10)])
+        self.assertEqual(list(closes['close']), [10, 11, 12, 13, 14])
+        
+        timestamps = price_arrays(stock)['timestamp']
+        self.assertEqual(str(timestamps[0].astype('datetime64[D]')), '2026-01-05')
+
+
+class SearchQueryBudgetTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.force_login(self.user)
+        watchlist = Watchlist.objects.create(user=self.user, name='Tech')
+        for i in range(10):
+            stock = Stock.objects.create(symbol=f'TECH{i}', name=f'Tech Company {i}')
+            if i % 2:
+                watchlist.stocks.add(stock)
+    
+    def search(self):
+        return self.client.get(reverse('stocks:search'), {'q': 'TECH'}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+    
+    def test_ajax_search_has_no_per_row_queries(self):
+        with assert_query_budget('stocks:search', max_queries=8, max_repeats=1):
+            response = self.search()
+        stocks = response.json()['stocks']
+        self.assertEqual(len(stocks), 10)
+        self.assertEqual([stock['in_watchlist'] for stock in stocks], [bool(i % 2) for i in range(10)])
+    
+    def test_budget_violations_are_reported(self):
+        self.assertEqual(query_shape("SELECT 1 FROM t WHERE id IN (%s, %s) AND name = 'x'"),
+                         query_shape("SELECT 2 FROM t WHERE id IN (%s) AND name = 'y'"))
+        with self.assertRaises(QueryBudgetExceeded):
+            with assert_query_budget(max_queries=100, max_repeats=2):
+                for stock in Stock.objects.all():
+                    Watchlist.objects.filter(user=self.user, stocks=stock).exists()
+        
+        with self.assertLogs('api.query_budget', level='WARNING') as logs:
+            with override_settings(QUERY_BUDGET={'VIEWS': {'stocks:search': {'MAX_QUERIES': 1}}}):
+                self.search()
+        self.assertIn('stocks:search', logs.output[0])
+    
+    def test_search_pages_by_cursor(self):
+        for i in range(10, 15):
+            Stock.objects.create(symbol=f'TECH{i}', name=f'Tech Company {i}')
+        first = self.search().json()
+        self.assertTrue(first['has_next'])
+        response = self.client.get(reverse('stocks:search'), {'q': 'TECH', 'cursor': first['next_cursor'], 'count': 1},
+                                   HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        second = response.json()
+        self.assertEqual(len(second['stocks']), 5)
+        self.assertFalse(second['has_next'])
+        self.assertEqual(second['count_estimate'], 15)
+        self.assertFalse({s['symbol'] for s in first['stocks']} & {s['symbol'] for s in second['stocks']})
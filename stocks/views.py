@@ -3,15 +3,15 @@ from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
 from .models import Stock, Watchlist
 from api.angel_api import AngelBrokingAPI
-from django.core.paginator import Paginator
+from api.pagination import keyset_page, estimate_count
 from django.db.models import Q
 import json
 
 @login_required
 def search_stocks(request):
     query = request.GET.get('q', '')
-    page = request.GET.get('page', 1)
-    stocks = []
+    cursor = request.GET.get('cursor')
+    stocks = Stock.objects.none()
     
     if query:
         # Search in local database first
@@ -21,7 +21,7 @@ def search_stocks(request):
         )
         
         # If no results or less than 5 results, search via API
-        if len(stocks) < 5:
+        if len(stocks[:5]) < 5:
             api = AngelBrokingAPI()
             api_results = api.search_stocks(query)
             
@@ -37,37 +37,38 @@ def search_stocks(request):
                         'change_percent': stock_data.get('change_percent')
                     }
                 )
-                
-            # Refresh queryset with new data
-            stocks = Stock.objects.filter(
-                Q(symbol__icontains=query) | 
-                Q(name__icontains=query)
-            )
     
-    # Pagination
-    paginator = Paginator(stocks, 10)
-    stocks_page = paginator.get_page(page)
+    # Keyset pagination on the unique symbol index: no COUNT(*) and no OFFSET
+    stocks_page = keyset_page(stocks, ['symbol'], cursor, page_size=10)
     
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        # One lookup for the whole page instead of one per result
+        watched_ids = set(Watchlist.objects.filter(
+            user=request.user, stocks__in=[stock.id for stock in stocks_page.items]
+        ).values_list('stocks', flat=True))
         stock_list = [{
             'symbol': stock.symbol,
             'name': stock.name,
             'current_price': float(stock.current_price) if stock.current_price else None,
             'change': float(stock.change) if stock.change else None,
             'change_percent': float(stock.change_percent) if stock.change_percent else None,
-            'in_watchlist': Watchlist.objects.filter(user=request.user, stocks=stock).exists()
-        } for stock in stocks_page]
+            'in_watchlist': stock.id in watched_ids
+        } for stock in stocks_page.items]
         
-        return JsonResponse({
+        data = {
             'stocks': stock_list,
-            'has_next': stocks_page.has_next(),
-            'has_previous': stocks_page.has_previous(),
-            'total_pages': paginator.num_pages
-        })
+            'next_cursor': stocks_page.next_cursor,
+            'has_next': stocks_page.next_cursor is not None,
+            'has_previous': bool(cursor)
+        }
+        if request.GET.get('count'):
+            data['count_estimate'] = estimate_count(stocks)
+        return JsonResponse(data)
     
     context = {
         'query': query,
-        'stocks': stocks_page
+        'stocks': stocks_page.items,
+        'next_cursor': stocks_page.next_cursor
     }
     
     return render(request, 'stocks/search.html', context)
@@ -0,0 +1,98 @@
+import time
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Whether reads in the current request or block may go to a replica
+_replica_reads = ContextVar('replica_reads', default=False)
+# Set by the first write in the current request or block; later reads stay on the primary
+_wrote = ContextVar('wrote', default=False)
+
+STICKY_SESSION_KEY = '_primary_until'
+
+def replica_aliases():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+def replica_alias():
+    """
+    Database alias reads may use right now
+
+    A replica when replica reads are enabled and nothing has been written in
+    this context (and no transaction is open), the primary otherwise.
+    """
+    replicas = replica_aliases()
+    if (not replicas or not _replica_reads.get() or _wrote.get()
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+        return DEFAULT_DB_ALIAS
+    return random.choice(replicas)
+
+@contextmanager
+def read_from_replica():
+    """Send reads in this block to a replica, until the block writes"""
+    reads_token = _replica_reads.set(True)
+    wrote_token = _wrote.set(False)
+    try:
+        yield
+    finally:
+        _wrote.reset(wrote_token)
+        _replica_reads.reset(reads_token)
+
+class PrimaryReplicaRouter:
+    """
+    Routes reads to settings.DATABASE_REPLICAS inside replica-read contexts
+
+    All writes and migrations go to the primary. Replicas must hold a copy of
+    the primary, so relations between any of the aliases are allowed.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = replica_alias()
+        return None if alias == DEFAULT_DB_ALIAS else alias
+
+    def db_for_write(self, model, **hints):
+        _wrote.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, *replica_aliases()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in replica_aliases():
+            return False
+        return None
+
+class ReplicaRoutingMiddleware:
+    """
+    Enables replica reads for safe requests to the views in REPLICA_READ_VIEWS
+
+    A request that writes pins its session to the primary for
+    REPLICA_STICKY_SECONDS, so the user reads their own writes while the
+    replicas catch up. Must come after the session middleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        wrote_token = _wrote.set(False)
+        try:
+            response = self.get_response(request)
+            if _wrote.get() and hasattr(request, 'session'):
+                request.session[STICKY_SESSION_KEY] = time.time() + getattr(settings, 'REPLICA_STICKY_SECONDS', 5)
+            return response
+        finally:
+            if getattr(request, '_replica_reads_token', None) is not None:
+                _replica_reads.reset(request._replica_reads_token)
+            _wrote.reset(wrote_token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (request.method in ('GET', 'HEAD')
+                and request.resolver_match.view_name in getattr(settings, 'REPLICA_READ_VIEWS', [])
+                and request.session.get(STICKY_SESSION_KEY, 0) < time.time()):
+            request._replica_reads_token = _replica_reads.set(True)
+        return None
@@ -25,10 +25,12 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.query_budget.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'tradeicon.db_router.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -53,12 +55,99 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'tradeicon.wsgi.application'
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Database profile, selected with DATABASE_ENGINE=sqlite (default) or postgresql
+DATABASE_ENGINE = os.environ.get('DATABASE_ENGINE', 'sqlite')
+
+if DATABASE_ENGINE == 'postgresql':
+    DATABASE_POOL_SIZE = int(os.environ.get('DATABASE_POOL_SIZE', '0'))
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DATABASE_NAME', 'tradeicon'),
+            'USER': os.environ.get('DATABASE_USER', 'tradeicon'),
+            'PASSWORD': os.environ.get('DATABASE_PASSWORD', ''),
+            'HOST': os.environ.get('DATABASE_HOST', 'localhost'),
+            'PORT': os.environ.get('DATABASE_PORT', '5432'),
+            # Keep connections open between requests and verify them before reuse
+            'CONN_MAX_AGE': int(os.environ.get('DATABASE_CONN_MAX_AGE', '600')),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
+    }
+    if DATABASE_POOL_SIZE:
+        # psycopg 3 connection pool; Django requires CONN_MAX_AGE = 0 with pooling
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': min(2, DATABASE_POOL_SIZE),
+            'max_size': DATABASE_POOL_SIZE,
+            'timeout': 10,
+            'max_idle': 300,
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DATABASE_NAME', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                # WAL lets readers run alongside the quote-refresh writer; NORMAL
+                # sync is durable across application crashes in WAL mode
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'
+                    'PRAGMA mmap_size=268435456;'
+                    'PRAGMA busy_timeout=5000;'
+                    'PRAGMA temp_store=MEMORY;'
+                ),
+                # Take the write lock up front instead of failing on lock upgrade
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': 5,
+            },
+        }
+    }
+
+# Read replicas: comma-separated SQLite files (DATABASE_REPLICA_NAMES) or
+# PostgreSQL hosts (DATABASE_REPLICA_HOSTS) with the primary's other settings
+if DATABASE_ENGINE == 'postgresql':
+    _replicas = {'HOST': os.environ.get('DATABASE_REPLICA_HOSTS', '')}
+else:
+    _replicas = {'NAME': os.environ.get('DATABASE_REPLICA_NAMES', '')}
+for _key, _values in _replicas.items():
+    for _i, _value in enumerate(filter(None, _values.split(',')), start=1):
+        DATABASES[f'replica{_i}'] = {**DATABASES['default'], _key: _value.strip(), 'TEST': {'MIRROR': 'default'}}
+
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['tradeicon.db_router.PrimaryReplicaRouter']
+# Read-only views whose GET requests may be served from a replica
+REPLICA_READ_VIEWS = [
+    'dashboard:dashboard',
+    'dashboard:stock_detail',
+    'dashboard:watchlist',
+    'dashboard:portfolio',
+    'dashboard:news',
+    'api:watchlist',
+    'api:portfolio',
+]
+# Seconds a session reads from the primary after writing, to cover replication lag
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', '5'))
+
+# Cache shared by every worker and management command: quotes, upstream
+# circuit breakers and stale fallbacks, the movers lists and dashboard
+# fragment generations. Without REDIS_URL each process keeps a private
+# local-memory cache, which is only correct for a single-process dev server.
+REDIS_URL = os.environ.get('REDIS_URL', '')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
     }
-}
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -86,6 +175,79 @@ STATICFILES_DIRS = [
 ]
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Per-symbol prediction feature arrays, appended to as new bars arrive
+FEATURE_STORE_DIR = BASE_DIR / 'feature_store'
+
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+        'api.renderers.ColumnarMsgpackRenderer',
+    ],
+}
+
+# Retention: rollups to coarser granularity, then per-model cutoffs. Archived
+# rows are written to ARCHIVE_DIR as gzip-compressed JSON lines before deletion.
+RETENTION = {
+    'BATCH_SIZE': 1000,
+    'ARCHIVE_DIR': BASE_DIR / 'archive',
+    'ROLLUPS': {
+        'INTRADAY_BARS_DAYS': 30,
+        'PREDICTIONS_DAYS': 90,
+    },
+    'POLICIES': {
+        'stocks.StockPrediction': {'field': 'created_at', 'days': 730, 'archive': True},
+        'stocks.TradeSignal': {'field': 'created_at', 'days': 365, 'archive': True},
+        'stocks.StockNews': {'field': 'published_at', 'days': 180, 'archive': True},
+        'stocks.Job': {'field': 'created_at', 'days': 7, 'archive': False},
+    },
+}
+
+# Per-request SQL budget enforced by api.query_budget.QueryBudgetMiddleware
+QUERY_BUDGET = {
+    'MAX_QUERIES': 30,
+    'MAX_SQL_MS': 250,
+    'MAX_REPEATS': 5,
+    'RAISE': False,
+    'VIEWS': {},
+}
+
+# Live quote stream (api.live): per-client batch rate, cross-process poll and keepalive, in seconds
+LIVE_QUOTES = {
+    'MIN_INTERVAL': 1.0,
+    'POLL_INTERVAL': 2.0,
+    'HEARTBEAT': 15.0,
+}
+
+# Background jobs for strategy and prediction requests (api.jobs): a local
+# process pool, per-user active job limit, and when lost jobs are recovered
+JOBS = {
+    'MODE': 'process',
+    'WORKERS': 2,
+    'MAX_ACTIVE_PER_USER': 2,
+    'STALE_AFTER': 15 * 60,
+    'REDISPATCH_AFTER': 60,
+    'MAX_ATTEMPTS': 3,
+    'STREAM_POLL': 0.5,
+}
+
+# Upstream market data calls (api.upstream): per-provider circuit breaker,
+# request deadline and retry backoff in seconds, and how long cached results
+# remain available as a stale fallback
+UPSTREAM = {
+    'FAILURE_THRESHOLD': 5,
+    'RESET_TIMEOUT': 30.0,
+    'DEADLINE': 8.0,
+    'MAX_RETRIES': 2,
+    'BACKOFF': 0.5,
+    'MAX_BACKOFF': 4.0,
+    'STALE_FOR': 24 * 60 * 60,
+    'THREADS': 16,
+}
+
+# NewsAPI key for the ingest_news command; an offline fake client is used when unset
+NEWS_API_KEY = os.environ.get('NEWS_API_KEY', '')
+
 
 # Login/Logout URLs
 LOGIN_URL = 'users:login'